@@ -6,12 +6,22 @@ Rob Zinke 2019-2021
 '''
 
 ### IMPORT MODULES ---
+import os
+import sys
+import json
+import pickle
+import time
+import warnings
 import numpy as np
 from slipRateObjects import incrSlipRate
+from dataLoading import inputHashes
+from pickStore import pickStore, storedPicks, streamPercentiles
+from rateAccumulators import rateAccumulators
 
 
-### RESAMPLING FUNCTION ---
+### RESAMPLING FUNCTIONS ---
 def MCMCresample(DspAgeData, Nsamples, condition='standard', maxRate=None, bound=None, seedValue=0,
+    settings=None, accumulators=None, reservoir=None, replay=None, rng=None, counters=None,
     verbose=False, outName=None):
     '''
     This method uses the inverse transform sampling method (see Zinke et al., 2017; 2019) to
@@ -30,7 +40,26 @@ def MCMCresample(DspAgeData, Nsamples, condition='standard', maxRate=None, bound
          this rate, they will be discarded.
         bound is the upper limit of sampling. Once this limit is exceeded,
          the loop will break no matter what. If unspecified, the default value
-         is set to four times the desired number of samples.
+         is set to four times the desired number of samples. The outputs are
+         trimmed to the number of picks achieved.
+        seedValue is the seed for the random number generator, either an
+         integer or an array of integers (see randomGenerator)
+        settings is a samplerSettings instance with the options of the
+         sampler (block mode, pruning, convergence tolerance, time budget,
+         checkpoints, pick store, picks kept, and rate constraints). If
+         unspecified, the default options are used.
+        accumulators is a rateAccumulators instance, updated with the rate
+         picks of each batch as sampling proceeds
+        reservoir is a pickReservoir instance, which keeps a uniform random
+         subset of the picks as sampling proceeds, e.g., for plotting
+        replay is a replayLog instance, which records the generator state of
+         each batch of candidates and the accepted candidates, from which the
+         picks can be regenerated (see regeneratePicks). If given, the picks
+         are not saved to file.
+        rng is the np.random.Generator from which uniform random numbers are
+         drawn. If unspecified, a PCG64 generator is seeded with seedValue.
+        counters is a dictionary in which the numbers of 'picks' and
+         'candidates' evaluated are accumulated, e.g., for shards
     OUTPUTS
         AgePicks is an (m x n) matrix of valid age sample values
         DspPicks is an (m x n) matrix of valid displacement sample values
@@ -42,100 +71,2031 @@ def MCMCresample(DspAgeData, Nsamples, condition='standard', maxRate=None, bound
 
     Nsamples = int(Nsamples)  # ensure integer value
 
+    # Sampler options
+    if settings is None: settings = samplerSettings()
+    blockSize, prune, sampler = settings.blockSize, settings.prune, settings.sampler
+    tolerance, confidence, timeBudget = settings.tolerance, settings.confidence, settings.timeBudget
+    checkpointName, checkpointInterval, resume = settings.checkpointName, settings.checkpointInterval, settings.resume
+    storeName, chunkSize = settings.storeName, settings.chunkSize
+    keepPicks, pickType, constraints = settings.keepPicks, settings.pickType, settings.constraints
+
     # Bayesian condition
     if verbose == True: print('Condition: {}'.format(condition))
 
-    if condition == 'standard':
-        condition = lambda ageDiffs, dspDiffs: ageDiffs.min()>=0 and dspDiffs.min()>=0
+    if condition == 'standard':
+        condition = standardCondition
+
+    # Other conditions
+    if maxRate == None:
+        maxRate = np.Inf  # max possible rate to be considered
+
+    if bound == None and timeBudget is not None:
+        bound = sys.maxsize  # time budget limits sampling instead
+    elif bound == None:
+        bound = 4*Nsamples  # default is four times the desired number of samples
+
+    # Feasible windows
+    windows = None
+    if prune == True:
+        windows = feasibleWindows(DspAgeData, maxRate, verbose=verbose)
+
+    # Arrays to fill in
+    m = len(DspAgeData.keys())  # number of measurements
+    randAges = np.zeros(m)
+    randDsps = np.zeros(m)
+
+    # Or write picks to disk
+    store = None
+    if storeName is not None:
+        storeMode = 'r' if resume == True and os.path.exists('{:s}_PickStore'.format(storeName)) else 'w'
+        store = pickStore(storeName, m, chunkSize, mode=storeMode, kinds=keptKinds(keepPicks), dtype=pickType)
+
+    # Destination of accepted picks
+    recorder = pickRecorder(m, Nsamples, keepPicks=keepPicks, pickType=pickType, store=store,
+        accumulators=accumulators, reservoir=reservoir, replay=replay)
+    if tolerance is not None and recorder.RatePicks is None:
+        print('Convergence tolerance requires picks to be held in memory')
+        exit()
+
+    # Random number generator
+    if sampler.lower() != 'random' and blockSize is None:
+        blockSize = 2**14  # quasi-random points are generated in blocks
+    if tolerance is not None and blockSize is None:
+        blockSize = 10000  # convergence is checked between blocks
+    uniforms = uniformSampler(m, method=sampler, seedValue=seedValue, blockSize=blockSize, rng=rng)
+
+    # Checkpoints
+    checkpoint = None
+    if checkpointInterval is not None or resume == True:
+        if checkpointName is None: checkpointName = outName
+        runSettings = {'Nsamples': Nsamples, 'markers': list(DspAgeData.keys()), 'maxRate': maxRate,
+            'bound': bound, 'seedValue': np.asarray(seedValue).tolist(), 'blockSize': blockSize,
+            'prune': prune, 'sampler': sampler, 'tolerance': tolerance, 'pickStore': storeName is not None,
+            'keepPicks': keptKinds(keepPicks), 'pickType': pickType, 'accumulators': accumulators is not None, 'reservoir': reservoir is not None,
+            'replay': replay is not None, 'bitGenerator': type(uniforms.rng.bit_generator).__name__,
+            'constraints': constraints.describe() if constraints is not None else []}
+        checkpoint = runCheckpoint(checkpointName, checkpointInterval, runSettings)
+
+
+    ## Monte Carlo sampling
+    # Initialize
+    tossed = 0  # toss counter
+    successes = 0  # success counter
+    startTime = time.time()  # start clock
+
+    # Continue from checkpoint
+    if resume == True:
+        successes, tossed = checkpoint.load(recorder, uniforms)
+        if verbose == True: print('Resuming from checkpoint after {:d} successes'.format(successes))
+
+    if verbose == True: print('Progress:')
+
+    # Block sampling mode
+    if blockSize is not None:
+        successes, tossed = blockResample(DspAgeData, recorder,
+            condition, maxRate, bound, int(blockSize), uniforms, windows, tolerance, confidence,
+            timeBudget, checkpoint, successes, tossed, constraints=constraints, verbose=verbose)
+
+    # Otherwise, loop through runs one at a time
+    else:
+        candidateBlock = 1000  # number of candidates for which random numbers are drawn at once
+        column = candidateBlock  # next candidate within block
+        while successes < Nsamples:
+            # Pick random numbers from uniform distribution, one block of candidates at a time
+            if column == candidateBlock:
+                if replay is not None: replay.startBatch(uniforms, candidateBlock)
+                a_block, d_block = uniforms.draw(candidateBlock)  # random uniform numbers for ages and disps
+                column = 0
+            a_rand = a_block[:,column]; d_rand = d_block[:,column]
+            column += 1
+
+            # Limit to feasible windows
+            if windows is not None:
+                a_rand, d_rand = scaleUniforms(a_rand, d_rand, windows)
+
+            # Interpolate CDF to get random age or disp, and check against conditions
+            rates = screenCandidate(DspAgeData, a_rand, d_rand, randAges, randDsps, condition, maxRate, constraints)
+            if rates is None:
+                # If condition not met, try again
+                tossed += 1
+                if replay is not None: replay.record([False])
+            else:
+                # If condition is met, record values and advance counter
+                recorder.record(successes, randAges[:,np.newaxis], randDsps[:,np.newaxis],
+                    rates[:,np.newaxis], defer=True)
+                successes += 1
+                if replay is not None: replay.record([True])
+
+            # Report progress
+            if verbose == True:
+                if 100*successes/Nsamples % 10 == 0:
+                    print('{:.0f} %'.format(100*successes/Nsamples))
+
+            # Check against bound
+            if (successes+tossed) > bound:
+                print('WARNING! Maximum sample limit exceeded ({:d}); {:d} of {:d} picks.'.\
+                    format(bound, successes, Nsamples))
+                break
+
+            # Check against time budget
+            if timeBudget is not None and (time.time()-startTime) > timeBudget:
+                print('WARNING! Time budget exceeded ({:.1f} s); {:d} of {:d} picks.'.\
+                    format(timeBudget, successes, Nsamples))
+                break
+
+            # Write deferred picks once the block of random numbers is used
+            if column == candidateBlock:
+                recorder.flush()
+
+            # Save checkpoint once the block of random numbers is used
+            if checkpoint is not None and column == candidateBlock and checkpoint.due():
+                checkpoint.save(recorder, successes, tossed, uniforms)
+
+
+    ## Finishing
+    elapsed = time.time()-startTime
+    if verbose == True:
+        print('Finished')
+        print('\tN successes: {:d}'.format(successes))
+        print('\tN tossed: {:d}'.format(tossed))
+        print('\tElapsed time: {:.1f} s ({:.0f} picks/s)'.format(elapsed, successes/max(elapsed, 1E-9)))
+
+    # Count picks and candidates
+    if counters is not None:
+        counters['picks'] = counters.get('picks', 0)+successes
+        counters['candidates'] = counters.get('candidates', 0)+successes+tossed
+
+    # Checkpoint is no longer needed once the run is complete
+    if checkpoint is not None and settings.keepCheckpoint == True:
+        checkpoint.save(recorder, successes, tossed, uniforms)
+    elif checkpoint is not None:
+        checkpoint.remove()
+
+    # Trim to achieved number of picks, however sampling stopped
+    AgePicks, DspPicks, RatePicks = recorder.outputs(successes)
+
+    # Save picks to file, unless they can be regenerated
+    if outName and store is None and len(keptKinds(keepPicks)) > 0 and replay is None:
+        savePicks(outName, AgePicks, DspPicks, RatePicks)
+
+    return AgePicks, DspPicks, RatePicks
+
+
+def parallelResample(DspAgeData, Nsamples, workers, condition='standard', maxRate=None, bound=None,
+    seedValue=0, settings=None, accumulators=None, reservoir=None, replay=None, rng=None, counters=None,
+    verbose=False, outName=None):
+    '''
+    Split the MCMCresample workload across a pool of processes.
+    Each worker receives an independent random number generator spawned
+     from rng (see spawnGenerators), and a share of Nsamples (and bound)
+     as even as possible. The worker picks are concatenated in worker order,
+     so that results are reproducible for a given seed and number of
+     workers. If a convergence tolerance is given, each worker stops once
+     its own standard error falls below tolerance x sqrt(workers), such that
+     the standard error of the merged picks is approximately the tolerance.
+     A time budget applies to each worker, since workers run concurrently.
+     Each worker writes its own checkpoint, <checkpointName>_worker<i>.
+     If a pick store is used, each worker writes its own store within the
+     store directory, and the worker stores are merged into the main index.
+     Accumulators are updated by each worker, and merged in worker order.
+     Each worker keeps its own reservoir, with a stream spawned from its own
+     seed, and the reservoirs are merged into a uniform subset of all picks.
+     Each worker keeps its own replay log, and the logs are concatenated in
+     worker order. Counters are summed over workers.
+    Inputs and outputs are the same as for MCMCresample.
+    '''
+    from multiprocessing import Pool
+
+    # Parameters
+    Nsamples = int(Nsamples)
+    workers = int(workers)
+    if settings is None: settings = samplerSettings()
+
+    if verbose == True:
+        print('*'*32)
+        print('Distributing Monte Carlo sampling across {:d} workers'.format(workers))
+
+    # Split samples and bound among workers
+    workerSamples = [len(ndx) for ndx in np.array_split(np.arange(Nsamples), workers)]
+    if bound is None:
+        workerBounds = [None]*workers
+    else:
+        workerBounds = [int(np.ceil(bound*n/Nsamples)) for n in workerSamples]
+
+    # Independent random number streams
+    if rng is None: rng = randomGenerator(seedValue)
+    workerRngs, workerSeeds = spawnGenerators(rng, workers)
+
+    # Convergence tolerance of each worker
+    tolerance = settings.tolerance
+    workerTolerance = tolerance*np.sqrt(workers) if tolerance is not None else None
+
+    # Checkpoint of each worker
+    checkpointName = settings.checkpointName if settings.checkpointName is not None else outName
+    if checkpointName is not None:
+        workerCheckpoints = ['{:s}_worker{:d}'.format(checkpointName, i) for i in range(workers)]
+    else:
+        workerCheckpoints = [None]*workers
+
+    # Pick store of each worker
+    storeName, keepPicks = settings.storeName, settings.keepPicks
+    if storeName is not None:
+        store = pickStore(storeName, len(DspAgeData.keys()), settings.chunkSize, mode='w',
+            kinds=keptKinds(keepPicks), dtype=settings.pickType)
+        workerStores = [os.path.join(store.dirName, 'worker{:d}'.format(i)) for i in range(workers)]
+    else:
+        workerStores = [None]*workers
+
+    # Sample in parallel
+    workerSettings = [settings.copy(tolerance=workerTolerance, checkpointName=workerCheckpoints[i],
+        keepCheckpoint=True, storeName=workerStores[i]) for i in range(workers)]
+    with Pool(workers) as pool:
+        workerAccumulators = accumulators.emptyCopy() if accumulators is not None else None
+        workerReservoirs = [reservoir.emptyCopy(workerSeeds[i]) if reservoir is not None else None
+            for i in range(workers)]
+        workerReplay = replay.emptyCopy() if replay is not None else None
+        results = pool.starmap(resampleWorker, [(DspAgeData, workerSamples[i], condition, maxRate,
+            workerBounds[i], workerSeeds[i], workerSettings[i], workerAccumulators, workerReservoirs[i],
+            workerReplay, workerRngs[i]) for i in range(workers)])
+
+    # Sum counters
+    if counters is not None:
+        for key in ['picks', 'candidates']:
+            counters[key] = counters.get(key, 0)+sum([result[7][key] for result in results])
+
+    # Merge accumulators in worker order
+    if accumulators is not None:
+        for result in results:
+            accumulators.merge(result[3])
+
+    # Merge reservoirs
+    if reservoir is not None:
+        reservoir.merge([result[4] for result in results])
+
+    # Concatenate replay logs in worker order
+    if replay is not None:
+        replay.merge([result[5] for result in results])
+
+    # Remove worker checkpoints once all workers are complete
+    if settings.checkpointInterval is not None or settings.resume == True:
+        for workerCheckpoint in workerCheckpoints:
+            runCheckpoint(workerCheckpoint).remove()
+
+    # Merge stores in worker order
+    if storeName is not None:
+        store.merge([pickStore(workerStore, mode='r') for workerStore in workerStores])
+        if verbose == True:
+            print('Finished')
+            print('\tN picks: {:d}'.format(store.nPicks))
+        return store.view('Age'), store.view('Dsp'), store.view('Rate')
+
+    # Picks not held in memory
+    if len(keptKinds(keepPicks)) == 0:
+        return None, None, None
+
+    # Merge picks in worker order
+    AgePicks, DspPicks, RatePicks = [np.concatenate([result[k] for result in results], axis=1)
+        if results[0][k] is not None else None for k in range(3)]
+
+    if verbose == True:
+        print('Finished')
+        print('\tN picks: {:d}'.format(sum([result[6] for result in results])))
+
+    # Save picks to file, unless they can be regenerated
+    if outName and replay is None: savePicks(outName, AgePicks, DspPicks, RatePicks)
+
+    return AgePicks, DspPicks, RatePicks
+
+
+def resampleWorker(DspAgeData, Nsamples, condition, maxRate, bound, seedValue, settings, accumulators,
+    reservoir, replay, rng):
+    '''
+    Run MCMCresample in a worker process. Accumulators, reservoirs, and
+     replay logs are updated within the worker, and so are returned along
+     with the picks, the number of picks, and the counters.
+    '''
+    counters = {}
+    AgePicks, DspPicks, RatePicks = MCMCresample(DspAgeData, Nsamples, condition=condition, maxRate=maxRate,
+        bound=bound, seedValue=seedValue, settings=settings, accumulators=accumulators, reservoir=reservoir,
+        replay=replay, rng=rng, counters=counters)
+
+    nPicks = max([picks.shape[1] if picks is not None else 0 for picks in [AgePicks, DspPicks, RatePicks]])
+    if accumulators is not None: nPicks = max(nPicks, accumulators.shape[1])
+
+    return AgePicks, DspPicks, RatePicks, accumulators, reservoir, replay, nPicks, counters
+
+
+def savePicks(outName, AgePicks, DspPicks, RatePicks):
+    '''
+    Save age, displacement, and rate picks to a numpy .npz file. Picks that
+     are None (not kept) are omitted.
+    '''
+    savename = '{:s}_Picks'.format(outName)
+    picks = {'AgePicks': AgePicks, 'DspPicks': DspPicks, 'RatePicks': RatePicks}
+    np.savez(savename, **{name: picks[name] for name in picks.keys() if picks[name] is not None})
+
+
+
+### SAMPLER SETTINGS ---
+class samplerSettings:
+    '''
+    Options of the rejection samplers (MCMCresample, parallelResample,
+     blockwiseResample, pilotRun), grouped such that they are passed on to
+     workers and marker blocks as a single object. Options not given take
+     their default values.
+
+    OPTIONS
+        blockSize is the number of candidate histories drawn at once in block
+         sampling mode. If unspecified, candidates are drawn one at a time.
+         In block mode, the inverse CDFs are evaluated for all candidates in
+         a single vectorized call per marker, and a custom condition must
+         accept (m-1 x blockSize) arrays of differences.
+        prune determines whether uniform random numbers are drawn only within
+         the feasible window of each marker PDF (see feasibleWindows). The
+         posterior is unchanged, but fewer candidates are rejected.
+        sampler is the method used to generate uniform random numbers (see
+         uniformSampler). Quasi-random samplers require block mode; if no
+         block size is specified, a default of 2^14 is used.
+        tolerance is the Monte Carlo standard error (in rate units) below
+         which sampling stops early. The median and confidence bounds of every
+         interval are checked after every block using running batch means
+         (see batchMeansMonitor), as picks accumulate. Nsamples is then the
+         maximum number of picks, and the outputs are trimmed to the number
+         of picks achieved. Requires block mode; if no block size is
+         specified, a default of 10,000 is used.
+        confidence is the confidence range (percent) checked for convergence
+        timeBudget is the wall-clock time (seconds) after which sampling stops,
+         as an alternative to bound. If given and bound is unspecified, the
+         number of candidates is not limited. The outputs are trimmed to the
+         number of picks achieved.
+        checkpointName is the head name of the checkpoint file (see
+         runCheckpoint). If unspecified, outName is used.
+        checkpointInterval is the wall-clock time (seconds) between
+         checkpoints. If unspecified, no checkpoints are written.
+        resume determines whether sampling continues from the checkpoint.
+         The results are identical to those of an uninterrupted run.
+        keepCheckpoint determines whether the final state is saved to the
+         checkpoint, instead of deleting it, once the run is complete
+         (e.g., for workers of a larger run).
+        storeName is the head name of a pickStore to which picks are written
+         in chunks of chunkSize picks as sampling proceeds, instead of being
+         held in memory. The outputs are then storedPicks views of the store.
+         Not compatible with a convergence tolerance.
+        keepPicks determines which picks are held in memory (or written to
+         the pick store), either True (all), False (none), or a list of the
+         kinds 'Age', 'Dsp', and 'Rate'. The outputs of the kinds not kept
+         are None, and if no picks are kept, the results are available only
+         from the accumulators.
+        pickType is the floating point type in which picks are held and
+         saved, e.g., 'float32' to halve memory and disk use
+        constraints is a rateConstraints instance. Candidates that satisfy the
+         condition and maximum rate are discarded unless they also satisfy
+         the constraints.
+    '''
+    defaults = {'blockSize': None, 'prune': False, 'sampler': 'random', 'tolerance': None,
+        'confidence': 68.27, 'timeBudget': None, 'checkpointName': None, 'checkpointInterval': None,
+        'resume': False, 'keepCheckpoint': False, 'storeName': None, 'chunkSize': 100000, 'keepPicks': True,
+        'pickType': 'float64', 'constraints': None}
+
+    def __init__(self, **options):
+        # Check options
+        for name in options.keys():
+            if name not in samplerSettings.defaults.keys():
+                print('Sampler option {:s} not recognized. Options are: {:s}'.\
+                    format(name, ', '.join(samplerSettings.defaults.keys())))
+                exit()
+
+        # Set options
+        for name in samplerSettings.defaults.keys():
+            setattr(self, name, options.get(name, samplerSettings.defaults[name]))
+
+    def copy(self, **options):
+        '''
+        Return a copy of the settings, with the given options replaced, e.g.,
+         for the workers of a parallel run.
+        '''
+        newOptions = {name: getattr(self, name) for name in samplerSettings.defaults.keys()}
+        newOptions.update(options)
+
+        return samplerSettings(**newOptions)
+
+
+
+### PICK RECORDING ---
+class pickRecorder:
+    '''
+    Destination of the picks accepted during sampling: (m x Nsamples) pick
+     arrays held in memory, a pickStore on disk, rateAccumulators, and/or a
+     pickReservoir. A replayLog is held by the recorder for checkpointing,
+     but is updated by the sampling loops, which know the generator state.
+    Picks recorded one at a time may be deferred, in which case they are
+     written to the store, accumulators, and reservoir together on flush.
+    '''
+    def __init__(self, m, Nsamples, keepPicks=True, pickType='float64', store=None, accumulators=None,
+        reservoir=None, replay=None):
+        self.Nsamples = Nsamples
+        self.store = store
+        self.accumulators = accumulators
+        self.reservoir = reservoir
+        self.replay = replay
+        self.deferred = []  # picks not yet written to the store, accumulators, and reservoir
+
+        # Arrays to fill in, for the kinds of picks kept
+        kinds = keptKinds(keepPicks) if store is None else []
+        self.AgePicks = np.zeros((m, Nsamples), dtype=pickType) if 'Age' in kinds else None
+        self.DspPicks = np.zeros((m, Nsamples), dtype=pickType) if 'Dsp' in kinds else None
+        self.RatePicks = np.zeros((m-1, Nsamples), dtype=pickType) if 'Rate' in kinds else None
+
+    def record(self, successes, ages, dsps, rates, defer=False):
+        '''
+        Record (m x n) ages and displacements, and (m-1 x n) rates, following
+         the given number of successes. If defer is True, the picks are only
+         written to the store, accumulators, and reservoir on flush.
+        '''
+        n = ages.shape[1]
+
+        if self.AgePicks is not None:
+            self.AgePicks[:,successes:successes+n] = ages
+        if self.DspPicks is not None:
+            self.DspPicks[:,successes:successes+n] = dsps
+        if self.RatePicks is not None:
+            self.RatePicks[:,successes:successes+n] = rates
+
+        if defer == True:
+            self.deferred.append((ages.copy(), dsps.copy(), rates.copy()))
+        else:
+            self.flush()
+            self.stream(ages, dsps, rates)
+
+    def flush(self):
+        '''
+        Write the deferred picks to the store, accumulators, and reservoir.
+        '''
+        if len(self.deferred) == 0: return
+
+        ages, dsps, rates = [np.concatenate(picks, axis=1) for picks in zip(*self.deferred)]
+        self.deferred = []
+        self.stream(ages, dsps, rates)
+
+    def stream(self, ages, dsps, rates):
+        '''
+        Write picks to the store, accumulators, and reservoir.
+        '''
+        if self.store is not None:
+            self.store.append(ages, dsps, rates)
+
+        if self.accumulators is not None:
+            self.accumulators.update(rates)
+
+        if self.reservoir is not None:
+            self.reservoir.update(ages, dsps)
+
+    def keptPicks(self):
+        '''
+        Return a dictionary of the (m x Nsamples) pick arrays held in memory,
+         by kind ('Age', 'Dsp', 'Rate').
+        '''
+        picks = {'Age': self.AgePicks, 'Dsp': self.DspPicks, 'Rate': self.RatePicks}
+
+        return {kind: picks[kind] for kind in picks.keys() if picks[kind] is not None}
+
+    def getState(self):
+        '''
+        Return the state of the store, accumulators, reservoir, and replay
+         log, e.g., for checkpointing. The pick arrays held in memory are not
+         included (see keptPicks), since runCheckpoint writes them
+         incrementally.
+        '''
+        self.flush()
+
+        state = {}
+        if self.store is not None:
+            state['store'] = self.store.getState()
+        if self.accumulators is not None:
+            state['accumulators'] = pickle.dumps(self.accumulators)
+        if self.reservoir is not None:
+            state['reservoir'] = pickle.dumps(self.reservoir)
+        if self.replay is not None:
+            state['replay'] = pickle.dumps(self.replay)
+
+        return state
+
+    def setState(self, state):
+        '''
+        Restore a state returned by getState.
+        '''
+        if self.store is not None:
+            self.store.setState(state['store'])
+        if self.accumulators is not None:
+            self.accumulators.__dict__.update(pickle.loads(state['accumulators']).__dict__)
+        if self.reservoir is not None:
+            self.reservoir.__dict__.update(pickle.loads(state['reservoir']).__dict__)
+        if self.replay is not None:
+            self.replay.__dict__.update(pickle.loads(state['replay']).__dict__)
+
+    def outputs(self, successes):
+        '''
+        Return the recorded age, displacement, and rate picks, trimmed to the
+         number of successes, or views of the pickStore.
+        '''
+        self.flush()
+
+        if self.store is not None:
+            self.store.close()
+            return self.store.view('Age'), self.store.view('Dsp'), self.store.view('Rate')
+
+        picks = [self.AgePicks, self.DspPicks, self.RatePicks]
+
+        return tuple([kindPicks[:,:successes] if kindPicks is not None else None for kindPicks in picks])
+
+
+def keptKinds(keepPicks):
+    '''
+    List of the kinds of picks kept, given keepPicks as True (all), False
+     (none), or a list of the kinds 'Age', 'Dsp', and 'Rate'.
+    '''
+    if keepPicks is True:
+        return list(pickStore.kinds)
+    elif keepPicks is False:
+        return []
+
+    for kind in keepPicks:
+        if kind not in pickStore.kinds:
+            print('Kinds of picks kept must be among: {:s}'.format(', '.join(pickStore.kinds)))
+            exit()
+
+    return [kind for kind in pickStore.kinds if kind in keepPicks]
+
+
+
+### CHECKPOINTS ---
+class runCheckpoint:
+    '''
+    Periodic checkpoint of an MCMCresample run, written to
+     <name>_checkpoint.pkl. The checkpoint holds the success and toss
+     counters, the state of the uniform random number generator, and the
+     state of the pickRecorder, such that a resumed run draws exactly the
+     same candidates as an uninterrupted run.
+    The picks held in memory are appended to one binary file per kind,
+     <name>_checkpoint_<kind>Picks.bin, such that each save only writes the
+     picks accepted since the previous save (as for a pickStore).
+    The sampling settings are stored with the checkpoint, and must match
+     those of the resumed run.
+    '''
+    def __init__(self, name, interval=None, settings={}):
+        if name is None:
+            print('Output name must be specified to write or resume from checkpoints')
+            exit()
+
+        self.name = name
+        self.fname = '{:s}_checkpoint.pkl'.format(name)
+        self.interval = interval
+        self.settings = settings
+        self.lastSave = time.time()
+        self.nSaved = 0  # number of picks written to the pick files
+
+    def picksFile(self, kind):
+        '''
+        Name of the file to which picks of the given kind are appended.
+        '''
+        return '{:s}_checkpoint_{:s}Picks.bin'.format(self.name, kind)
+
+    def due(self):
+        '''
+        Check whether the checkpoint interval has elapsed since the last save.
+        '''
+        return self.interval is not None and (time.time()-self.lastSave) >= self.interval
+
+    def save(self, recorder, successes, tossed, uniforms):
+        '''
+        Append the picks accepted since the last save to the pick files, then
+         write the counters, generator state, and recorder state (see
+         pickRecorder.getState). The state file is replaced only once fully
+         written, so that an interrupted save does not corrupt the previous
+         checkpoint; picks appended beyond the number of successes of the
+         state file are discarded on loading.
+        '''
+        # Append new picks, one row per pick
+        for kind, picks in recorder.keptPicks().items():
+            with open(self.picksFile(kind), 'ab' if self.nSaved > 0 else 'wb') as picksFile:
+                picksFile.write(np.ascontiguousarray(picks[:,self.nSaved:successes].T).tobytes())
+        self.nSaved = successes
+
+        state = {'settings': self.settings,
+            'picks': recorder.getState(),
+            'successes': successes,
+            'tossed': tossed,
+            'sampler': uniforms.getState()}
+
+        with open(self.fname+'.tmp', 'wb') as checkpointFile:
+            pickle.dump(state, checkpointFile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.fname+'.tmp', self.fname)
+
+        self.lastSave = time.time()
+
+    def load(self, recorder, uniforms):
+        '''
+        Restore the recorded picks and the generator state from the
+         checkpoint. Returns the success and toss counters. If no checkpoint
+         was written before the run was interrupted, sampling starts over.
+        '''
+        if not os.path.exists(self.fname):
+            print('WARNING! No checkpoint found ({:s}). Starting from the beginning.'.format(self.fname))
+            if recorder.store is not None: recorder.store.setState({'nChunks': 0, 'buffered': {}})
+            return 0, 0
+
+        with open(self.fname, 'rb') as checkpointFile:
+            state = pickle.load(checkpointFile)
+
+        # Check consistency of settings
+        for key in self.settings.keys():
+            if state['settings'].get(key) != self.settings[key]:
+                print('Checkpoint setting {:s} ({}) does not match current run ({})'.\
+                    format(key, state['settings'].get(key), self.settings[key]))
+                exit()
+
+        # Restore picks, discarding any appended after the state file was written
+        successes = state['successes']
+        for kind, picks in recorder.keptPicks().items():
+            m = picks.shape[0]
+            os.truncate(self.picksFile(kind), successes*m*picks.itemsize)
+            picks[:,:successes] = np.fromfile(self.picksFile(kind), dtype=picks.dtype).reshape(successes, m).T
+        self.nSaved = successes
+
+        # Restore recorder and generator
+        recorder.setState(state['picks'])
+        uniforms.setState(state['sampler'])
+
+        return successes, state['tossed']
+
+    def remove(self):
+        '''
+        Delete the checkpoint and pick files, e.g., once the run is complete.
+        '''
+        for fname in [self.fname]+[self.picksFile(kind) for kind in pickStore.kinds]:
+            if os.path.exists(fname):
+                os.remove(fname)
+
+
+
+def blockResample(DspAgeData, recorder, condition, maxRate, bound, blockSize, uniforms, windows=None,
+    tolerance=None, confidence=68.27, timeBudget=None, checkpoint=None, successes=0, tossed=0,
+    constraints=None, verbose=False):
+    '''
+    Vectorized form of the rejection sampling loop in MCMCresample.
+    Candidate histories are drawn as (m x blockSize) arrays of uniform random
+     numbers, and the surviving columns are recorded in order by the
+     pickRecorder. The number of candidates evaluated never exceeds bound + 1,
+     consistent with the one-at-a-time loop. Uniform random numbers are
+     drawn from the uniformSampler instance uniforms. If rateConstraints are
+     given, they are evaluated on all candidates of the block that satisfy
+     the condition and maximum rate at once.
+    If a tolerance is given, sampling stops once the Monte Carlo standard
+     error of the rate percentiles falls below the tolerance. Convergence is
+     checked after every block, using running batch means (see
+     batchMeansMonitor), such that each check only reads the new picks.
+    If a time budget (seconds) is given, sampling stops after the first
+     block that ends beyond the budget.
+    If a runCheckpoint is given, it is saved between blocks whenever the
+     checkpoint interval has elapsed. The counters may be initialized from a
+     checkpoint to resume sampling.
+    Returns the number of successes and tossed candidates.
+    '''
+    # Parameters
+    Nsamples = recorder.Nsamples
+    replay = recorder.replay
+
+    # Initialize
+    startTime = time.time()  # start clock
+
+    # Convergence monitor
+    monitor = batchMeansMonitor(confidence) if tolerance is not None else None
+
+    # Loop through blocks
+    while successes < Nsamples:
+        # Number of candidates in this block
+        nCandidates = min(blockSize, bound+1-(successes+tossed))
+
+        # Generator state for seed replay
+        if replay is not None: replay.startBatch(uniforms, nCandidates)
+
+        # Pick random numbers from uniform distribution
+        a_rand, d_rand = uniforms.draw(nCandidates)  # random uniform numbers for ages and disps
+
+        # Limit to feasible windows
+        if windows is not None:
+            a_rand, d_rand = scaleUniforms(a_rand, d_rand, windows)
+
+        # Standard condition - screen candidates marker by marker
+        if condition is standardCondition:
+            randAges, randDsps, valid = screenMarkers(DspAgeData, a_rand, d_rand, maxRate)
+
+            # Rates of surviving candidates
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rates = np.diff(randDsps, axis=0)/np.diff(randAges, axis=0)
+
+        # Other conditions - evaluate all markers before checking
+        else:
+            # Interpolate CDFs to get random ages and disps
+            randAges, randDsps = sampleMarkers(DspAgeData, a_rand, d_rand)
+
+            # Differences
+            ageDiffs = np.diff(randAges, axis=0)
+            dspDiffs = np.diff(randDsps, axis=0)
+
+            # Check against condition
+            valid = np.asarray(condition(ageDiffs, dspDiffs), dtype=bool)
+
+            # Check max rate
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rates = dspDiffs/ageDiffs
+            valid[valid] = ~(rates[:,valid].max(axis=0) > maxRate)
+
+        # Check constraints
+        if constraints is not None and valid.any():
+            valid[valid] = constraints.mask(randAges[:,valid], randDsps[:,valid], rates[:,valid])
+
+        # Keep only the candidates needed to complete the sample set
+        acceptedNdx = np.flatnonzero(valid)[:Nsamples-successes]
+        nAccepted = len(acceptedNdx)
+
+        # Candidates beyond the last required success are not counted
+        if successes+nAccepted == Nsamples:
+            nCandidates = acceptedNdx[-1]+1
+
+        # Record values and advance counters
+        recorder.record(successes, randAges[:,acceptedNdx], randDsps[:,acceptedNdx], rates[:,acceptedNdx])
+        if replay is not None: replay.record(np.isin(np.arange(len(valid)), acceptedNdx))
+        successes += nAccepted
+        tossed += nCandidates-nAccepted
+
+        # Report progress
+        if verbose == True:
+            print('{:.0f} %'.format(100*successes/Nsamples))
+
+        # Check against bound
+        if (successes+tossed) > bound:
+            print('WARNING! Maximum sample limit exceeded ({:d}); {:d} of {:d} picks.'.\
+                format(bound, successes, Nsamples))
+            break
+
+        # Check convergence
+        if monitor is not None:
+            monitor.update(recorder.RatePicks, successes)
+            MCerror = monitor.error()
+            if MCerror is not None and verbose == True:
+                print('\tMax. standard error after {:d} picks: {:.5f}'.format(successes, MCerror.max()))
+            if MCerror is not None and MCerror.max() <= tolerance:
+                if verbose == True: print('Converged to tolerance {:f}'.format(tolerance))
+                break
+
+        # Check against time budget
+        if timeBudget is not None and (time.time()-startTime) > timeBudget:
+            if successes < Nsamples:
+                print('WARNING! Time budget exceeded ({:.1f} s); {:d} of {:d} picks.'.\
+                    format(timeBudget, successes, Nsamples))
+            break
+
+        # Save checkpoint
+        if checkpoint is not None and checkpoint.due():
+            checkpoint.save(recorder, successes, tossed, uniforms)
+
+    return successes, tossed
+
+
+def sampleMarkers(DspAgeData, a_rand, d_rand):
+    '''
+    Interpolate the inverse CDF of each marker age and displacement at the
+     given (m x n) arrays of uniform random numbers, in one call per marker.
+    '''
+    randAges = np.empty(a_rand.shape)
+    randDsps = np.empty(d_rand.shape)
+
+    for j, datumName in enumerate(DspAgeData.keys()):
+        # Age and displacement objects for each datum
+        Age = DspAgeData[datumName]['Age']
+        Dsp = DspAgeData[datumName]['Dsp']
+        # Random samples
+        randAges[j] = Age.InvCDF(a_rand[j])
+        randDsps[j] = Dsp.InvCDF(d_rand[j])
+
+    return randAges, randDsps
+
+
+def screenMarkers(DspAgeData, a_rand, d_rand, maxRate):
+    '''
+    Interpolate the inverse CDFs marker by marker, as in sampleMarkers, but
+     drop candidates as soon as an adjacent pair violates the standard
+     condition or the maximum rate, so that the inverse CDFs of the
+     remaining markers are only evaluated for surviving candidates.
+    Returns the (m x n) ages and displacements (NaN where not evaluated),
+     and a boolean array indicating the valid candidates.
+    '''
+    randAges = np.full(a_rand.shape, np.nan)
+    randDsps = np.full(d_rand.shape, np.nan)
+    alive = np.arange(a_rand.shape[1])  # indices of surviving candidates
+
+    for j, datumName in enumerate(DspAgeData.keys()):
+        # Age and displacement objects for each datum
+        Age = DspAgeData[datumName]['Age']
+        Dsp = DspAgeData[datumName]['Dsp']
+        # Random samples
+        randAges[j,alive] = Age.InvCDF(a_rand[j,alive])
+        randDsps[j,alive] = Dsp.InvCDF(d_rand[j,alive])
+
+        # Drop candidates that violate the condition
+        if j > 0:
+            alive = alive[pairCondition(randAges[j,alive]-randAges[j-1,alive],
+                randDsps[j,alive]-randDsps[j-1,alive], maxRate)]
+
+    # Valid candidates
+    valid = np.zeros(a_rand.shape[1], dtype=bool)
+    valid[alive] = True
+
+    return randAges, randDsps, valid
+
+
+def screenCandidate(DspAgeData, a_rand, d_rand, randAges, randDsps, condition, maxRate, constraints=None):
+    '''
+    Evaluate a single candidate, as in the one-at-a-time loop of
+     MCMCresample. The inverse CDFs are interpolated marker by marker into
+     the (m) arrays randAges and randDsps, stopping as soon as an adjacent
+     pair violates the standard condition or the maximum rate; any other
+     condition, the maximum rate, and the rate constraints are then checked.
+    Returns the (m-1) rates of an accepted candidate, or None.
+    '''
+    screenPairs = condition is standardCondition  # standard condition is checked pair by pair
+
+    for j, datumName in enumerate(DspAgeData.keys()):
+        # Age and displacement objects for each datum
+        Age = DspAgeData[datumName]['Age']
+        Dsp = DspAgeData[datumName]['Dsp']
+        # Random samples
+        randAges[j] = Age.InvCDF(a_rand[j])
+        randDsps[j] = Dsp.InvCDF(d_rand[j])
+
+        # Stop as soon as an adjacent pair violates the standard condition (scalar check)
+        if screenPairs == True and j > 0:
+            ageDiff = randAges[j]-randAges[j-1]
+            dspDiff = randDsps[j]-randDsps[j-1]
+            if ageDiff < 0 or dspDiff < 0 or dspDiff > maxRate*ageDiff:
+                return None
+
+    # Differences
+    ageDiffs = np.diff(randAges)
+    dspDiffs = np.diff(randDsps)
+
+    # Check against condition, unless already checked pair by pair
+    if screenPairs == False and condition(ageDiffs, dspDiffs) == False:
+        return None
+
+    # Check max rate and constraints
+    rates = dspDiffs/ageDiffs
+    if rates.max() > maxRate or (constraints is not None and \
+        constraints.mask(randAges[:,np.newaxis], randDsps[:,np.newaxis], rates[:,np.newaxis])[0] == False):
+        return None
+
+    return rates
+
+
+
+### FEASIBLE SUPPORT PRUNING ---
+def feasibleWindows(DspAgeData, maxRate=None, maxIterations=100, verbose=False):
+    '''
+    Find the window of each marker PDF that can satisfy the standard
+     condition (see feasibleBounds).
+    Values outside the windows have zero joint posterior probability, so
+     limiting the samples to the windows does not change the posterior.
+    Returns the (m x 2) lower and upper CDF levels of the age and
+     displacement windows.
+    '''
+    dataNames = list(DspAgeData.keys())
+    m = len(dataNames)
+
+    # Bounds of feasible values
+    minAge, maxAge, minDsp, maxDsp = feasibleBounds(DspAgeData, maxRate, maxIterations)
+
+    # Check that windows are valid
+    if np.any(minAge > maxAge) or np.any(minDsp > maxDsp):
+        print('No history can satisfy the Bayesian condition. Check that markers are ordered youngest to oldest.')
+        exit()
+
+    # Convert windows to CDF levels
+    ageLevels = np.zeros((m, 2))
+    dspLevels = np.zeros((m, 2))
+    for j, datumName in enumerate(dataNames):
+        ageLevels[j] = DspAgeData[datumName]['Age'].CDF([minAge[j], maxAge[j]])
+        dspLevels[j] = DspAgeData[datumName]['Dsp'].CDF([minDsp[j], maxDsp[j]])
+
+    # Report if requested
+    if verbose == True:
+        print('Feasible windows (fraction of probability mass retained):')
+        for j, datumName in enumerate(dataNames):
+            print('\t{:s}: age {:.5f}-{:.5f} ({:.3f}); dsp {:.5f}-{:.5f} ({:.3f})'.format(datumName,
+                minAge[j], maxAge[j], np.diff(ageLevels[j])[0],
+                minDsp[j], maxDsp[j], np.diff(dspLevels[j])[0]))
+
+    return ageLevels, dspLevels
+
+
+def feasibleBounds(DspAgeData, maxRate=None, maxIterations=100):
+    '''
+    Bounds of the ages and displacements of each marker that can satisfy the
+     standard condition.
+    Lower bounds on age and displacement are propagated forward (each marker
+     must be at least as old and offset as the previous one), and upper
+     bounds are propagated backward (each marker must be no older or more
+     offset than the next one). If a maximum rate is specified, the minimum
+     age difference and maximum displacement difference implied by that
+     rate are propagated as well. The propagation is repeated until the
+     bounds no longer change.
+    If any lower bound exceeds the upper bound, no history can satisfy the
+     condition.
+    Returns the arrays minAge, maxAge, minDsp, maxDsp.
+    '''
+    if maxRate == None:
+        maxRate = np.Inf  # max possible rate to be considered
+
+    dataNames = list(DspAgeData.keys())
+    m = len(dataNames)
+
+    # Initial bounds are the full supports
+    minAge = np.array([DspAgeData[name]['Age'].ages.min() for name in dataNames])
+    maxAge = np.array([DspAgeData[name]['Age'].ages.max() for name in dataNames])
+    minDsp = np.array([DspAgeData[name]['Dsp'].dsps.min() for name in dataNames])
+    maxDsp = np.array([DspAgeData[name]['Dsp'].dsps.max() for name in dataNames])
+
+    # Propagate bounds
+    for i in range(maxIterations):
+        previousBounds = np.concatenate([minAge, maxAge, minDsp, maxDsp])
+
+        # Lower bounds forward
+        for j in range(1, m):
+            minDsp[j] = max(minDsp[j], minDsp[j-1])
+            minAge[j] = max(minAge[j], minAge[j-1] + max(0, minDsp[j]-maxDsp[j-1])/maxRate)
+            if np.isfinite(maxRate):
+                maxDsp[j] = min(maxDsp[j], maxDsp[j-1] + maxRate*(maxAge[j]-minAge[j-1]))
+
+        # Upper bounds backward
+        for j in range(m-2, -1, -1):
+            maxDsp[j] = min(maxDsp[j], maxDsp[j+1])
+            maxAge[j] = min(maxAge[j], maxAge[j+1] - max(0, minDsp[j+1]-maxDsp[j])/maxRate)
+            if np.isfinite(maxRate):
+                minDsp[j] = max(minDsp[j], minDsp[j+1] - maxRate*(maxAge[j+1]-minAge[j]))
+
+        # Check convergence
+        if np.allclose(previousBounds, np.concatenate([minAge, maxAge, minDsp, maxDsp])):
+            break
+
+    return minAge, maxAge, minDsp, maxDsp
+
+
+def scaleUniforms(a_rand, d_rand, windows):
+    '''
+    Rescale uniform random numbers on [0, 1) to lie within the CDF levels of
+     the feasible window of each marker. The random numbers may be given for
+     a single candidate (m) or a block of candidates (m x n).
+    '''
+    ageLevels, dspLevels = windows
+
+    a_rand = (ageLevels[:,0] + (ageLevels[:,1]-ageLevels[:,0])*a_rand.T).T
+    d_rand = (dspLevels[:,0] + (dspLevels[:,1]-dspLevels[:,0])*d_rand.T).T
+
+    return a_rand, d_rand
+
+
+
+### UNIFORM RANDOM NUMBERS ---
+class uniformSampler:
+    '''
+    Source of uniform random numbers for the ages and displacements of m
+     markers. Methods are:
+        random - pseudo-random numbers from the np.random.Generator rng, or
+         from a PCG64 generator seeded with seedValue if unspecified
+        sobol - scrambled Sobol' quasi-random points in 2m dimensions
+         (scipy.stats.qmc). Points have the best uniformity when drawn in
+         blocks whose size is a power of 2.
+        lhs - Latin hypercube points in 2m dimensions (scipy.stats.qmc). Each
+         marker age and displacement is stratified across every block of n
+         candidates, such that each of the n equal-probability strata of
+         every marker PDF is represented once per block.
+    The quasi-random engines are scrambled or randomized using rng.
+    '''
+    def __init__(self, m, method='random', seedValue=0, blockSize=None, rng=None):
+        self.m = m
+        self.method = method.lower()
+        self.rng = rng if rng is not None else randomGenerator(seedValue)
+
+        if self.method in ['sobol']:
+            from scipy.stats import qmc
+            self.engine = qmc.Sobol(d=2*m, scramble=True, seed=self.rng)
+
+            if blockSize is not None and (int(blockSize) & (int(blockSize)-1)) != 0:
+                print('WARNING! Block size should be a power of 2 for Sobol\' sampling.')
+
+        elif self.method in ['lhs', 'latin']:
+            from scipy.stats import qmc
+            self.engine = qmc.LatinHypercube(d=2*m, seed=self.rng)
+
+        elif self.method not in ['random']:
+            print('Choose uniform sampling method: \'random\'/\'sobol\'/\'lhs\'')
+            exit()
+
+    def draw(self, n):
+        '''
+        Draw (m x n) uniform random numbers for the ages and displacements.
+        '''
+        if self.method in ['random']:
+            points = self.rng.random((2*self.m, n))  # random uniform numbers for ages and disps
+            a_rand = points[:self.m]
+            d_rand = points[self.m:]
+
+        else:
+            # Quasi-random points, one dimension per marker age and disp
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', UserWarning)  # balance warnings reported on setup
+                points = self.engine.random(n)
+            a_rand = points[:,:self.m].T
+            d_rand = points[:,self.m:].T
+
+        return a_rand, d_rand
+
+    def getState(self):
+        '''
+        Return the generator state, e.g., for checkpointing.
+        '''
+        if self.method in ['random']:
+            return self.rng.bit_generator.state
+        else:
+            return pickle.dumps(self.engine)
+
+    def setState(self, state):
+        '''
+        Restore a generator state returned by getState.
+        '''
+        if self.method in ['random']:
+            if state['bit_generator'] != type(self.rng.bit_generator).__name__:
+                self.rng = np.random.Generator(getattr(np.random, state['bit_generator'])())
+            self.rng.bit_generator.state = state
+        else:
+            self.engine = pickle.loads(state)
+
+
+
+### SEED REPLAY ---
+class replayLog:
+    '''
+    Record from which the picks of a run can be regenerated, in place of the
+     picks themselves. Candidates are grouped in segments of at least
+     segmentSize candidates. For each segment, the state of the
+     uniformSampler before the segment was drawn, the sizes of the draws,
+     and the indices of the accepted candidates are kept. Since the inverse
+     CDFs are deterministic, replaying the draws of a segment reproduces its
+     picks exactly.
+    Indices are stored as gaps between accepted candidates, in the smallest
+     unsigned integer type that holds the largest gap.
+
+    INPUTS
+        markers is the list of marker names
+        maxRate is the maximum rate used in sampling
+        prune determines whether draws were limited to the feasible windows
+        sampler is the uniform sampling method
+        dataFile is the YAML data file, from which the markers are loaded if
+         not given when the picks are regenerated
+        segmentSize is the number of candidates after which the generator
+         state is kept again
+    '''
+    def __init__(self, markers, maxRate=None, prune=False, sampler='random', dataFile=None, segmentSize=100000):
+        self.markers = list(markers)
+        self.maxRate = maxRate
+        self.prune = prune
+        self.sampler = sampler
+        self.dataFile = dataFile
+        self.segmentSize = segmentSize
+        self.segments = []
+
+    def emptyCopy(self):
+        '''
+        Return an empty log with the same settings, e.g., for a worker.
+        '''
+        return replayLog(self.markers, self.maxRate, self.prune, self.sampler, self.dataFile, self.segmentSize)
+
+    def startBatch(self, uniforms, drawSize):
+        '''
+        Add a draw of drawSize candidates to the current segment, keeping the
+         generator state if a new segment is started.
+        '''
+        if len(self.segments) == 0 or self.segments[-1]['nDrawn'] >= self.segmentSize:
+            self.segments.append({'state': uniforms.getState(), 'draws': [], 'nDrawn': 0, 'accepted': []})
+
+        # Run-length encoded draw sizes
+        draws = self.segments[-1]['draws']
+        if len(draws) > 0 and draws[-1][0] == drawSize:
+            draws[-1][1] += 1
+        else:
+            draws.append([drawSize, 1])
+
+    def record(self, accepted):
+        '''
+        Add the boolean mask of the candidates drawn since startBatch.
+        '''
+        segment = self.segments[-1]
+        segment['accepted'].extend((np.flatnonzero(accepted)+segment['nDrawn']).tolist())
+        segment['nDrawn'] += len(accepted)
+
+    def merge(self, logs):
+        '''
+        Append the segments of other logs (e.g., of workers) in order.
+        '''
+        for log in logs:
+            self.segments += log.segments
+
+    @property
+    def nPicks(self):
+        return sum([len(segment['accepted']) for segment in self.segments])
+
+    def __getstate__(self):
+        # Encode accepted indices as gaps when pickled
+        state = self.__dict__.copy()
+        state['segments'] = []
+        for segment in self.segments:
+            gaps = np.diff(segment['accepted'], prepend=-1).astype(np.int64)
+            gaps = gaps.astype(np.min_scalar_type(gaps.max() if len(gaps) > 0 else 0))
+            state['segments'].append(dict(segment, accepted=gaps))
+        return state
+
+    def __setstate__(self, state):
+        # Decode accepted indices
+        for segment in state['segments']:
+            segment['accepted'] = (np.cumsum(segment['accepted'], dtype=np.int64)-1).tolist()
+        self.__dict__.update(state)
+
+    def save(self, outName):
+        '''
+        Save the log to <outName>_Replay.pkl.
+        '''
+        with open('{:s}_Replay.pkl'.format(outName), 'wb') as replayFile:
+            pickle.dump(self, replayFile, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def regeneratePicks(runFile, DspAgeData=None, picks=None):
+    '''
+    Regenerate the picks of a run from its replay log (see replayLog), by
+     restoring the generator state of each segment, redrawing its uniform
+     random numbers, and evaluating the inverse CDFs of the accepted
+     candidates. Only the segments holding the requested picks are replayed.
+
+    INPUTS
+        runFile is the <outName>_Replay.pkl file written by the run
+        DspAgeData is the dictionary of markers used in the run. If
+         unspecified, the markers are loaded from the data file of the run.
+        picks is an array of the indices of the picks to regenerate. If
+         unspecified, all picks are regenerated.
+    OUTPUTS
+        AgePicks, DspPicks, and RatePicks for the requested picks, in the
+         order requested
+    '''
+    with open(runFile, 'rb') as replayFile:
+        replay = pickle.load(replayFile)
+
+    # Markers
+    if DspAgeData is None:
+        from dataLoading import loadDspAgeInputs
+        DspAgeData = loadDspAgeInputs(replay.dataFile)
+    if list(DspAgeData.keys()) != replay.markers:
+        print('Markers do not match those of the run')
+        exit()
+    m = len(replay.markers)
+
+    # Feasible windows
+    windows = None
+    if replay.prune == True:
+        windows = feasibleWindows(DspAgeData, replay.maxRate)
+
+    # Requested picks
+    nAccepted = [len(segment['accepted']) for segment in replay.segments]
+    firstPick = np.concatenate([[0], np.cumsum(nAccepted)]).astype(int)
+    if picks is None:
+        picks = np.arange(firstPick[-1])
+    picks = np.asarray(picks, dtype=int)
+    if picks.size > 0 and (picks.min() < 0 or picks.max() >= firstPick[-1]):
+        print('Pick indices must be between 0 and {:d}'.format(firstPick[-1]-1))
+        exit()
+
+    AgePicks = np.zeros((m, len(picks)))
+    DspPicks = np.zeros((m, len(picks)))
+
+    # Replay segments holding requested picks
+    pickSegments = np.searchsorted(firstPick, picks, side='right')-1
+    uniforms = uniformSampler(m, method=replay.sampler)
+    for i in np.unique(pickSegments):
+        segment = replay.segments[i]
+
+        # Redraw uniform random numbers
+        uniforms.setState(segment['state'])
+        draws = [uniforms.draw(drawSize) for drawSize, count in segment['draws'] for j in range(count)]
+        a_rand = np.concatenate([draw[0] for draw in draws], axis=1)
+        d_rand = np.concatenate([draw[1] for draw in draws], axis=1)
+        if windows is not None:
+            a_rand, d_rand = scaleUniforms(a_rand, d_rand, windows)
+
+        # Evaluate requested candidates
+        requested = np.flatnonzero(pickSegments == i)
+        candidates = np.array(segment['accepted'])[picks[requested]-firstPick[i]]
+        AgePicks[:,requested], DspPicks[:,requested] = sampleMarkers(DspAgeData,
+            a_rand[:,candidates], d_rand[:,candidates])
+
+    RatePicks = np.diff(DspPicks, axis=0)/np.diff(AgePicks, axis=0)
+
+    return AgePicks, DspPicks, RatePicks
+
+
+
+## Random number generators
+bitGenerators = {'pcg64': np.random.PCG64, 'philox': np.random.Philox}
+
+def randomGenerator(seedValue=0, bitGenerator='PCG64'):
+    '''
+    Return a np.random.Generator using the bit generator 'PCG64' or
+     'Philox', seeded through np.random.SeedSequence with seedValue, either
+     an integer or an array of integers.
+    '''
+    if bitGenerator.lower() not in bitGenerators.keys():
+        print('Choose bit generator: \'PCG64\'/\'Philox\'')
+        exit()
+
+    seedSequence = np.random.SeedSequence(np.atleast_1d(seedValue).astype(np.int64).tolist())
+
+    return np.random.Generator(bitGenerators[bitGenerator.lower()](seedSequence))
+
+
+def spawnGenerators(rng, n):
+    '''
+    Spawn n independent generators from the seed sequence of rng, using the
+     same bit generator, e.g., for workers. Returns the generators and the
+     seeds of their streams (arrays of uint32 values).
+    '''
+    seedSequences = rng.bit_generator.seed_seq.spawn(n)
+    rngs = [np.random.Generator(type(rng.bit_generator)(seedSequence)) for seedSequence in seedSequences]
+    seeds = [seedSequence.generate_state(4) for seedSequence in seedSequences]
+
+    return rngs, seeds
+
+
+
+### CANDIDATE POOL ---
+def savePool(outName, DspAgeData, AgePicks, DspPicks, dataFile=None):
+    '''
+    Save a pool of candidate histories that satisfy the standard (no negative
+     rate) condition, sampled without a maximum rate or rate constraints, to
+     <outName>_Pool.npz. Any maximum rate and constraints can then be applied
+     to the pool with filterPool, without sampling the priors again.
+    The hashes of the data file and PDF files (see inputHashes) are saved
+     with the pool.
+    '''
+    savename = '{:s}_Pool'.format(outName)
+    hashes = inputHashes(dataFile) if dataFile is not None else {}
+    np.savez(savename, AgePicks=AgePicks, DspPicks=DspPicks, markers=np.array(list(DspAgeData.keys())),
+        dataFile=np.array(dataFile if dataFile is not None else ''), hashes=np.array(json.dumps(hashes)))
+
+
+def loadPool(poolFile, DspAgeData, dataFile=None):
+    '''
+    Load the age and displacement picks of a candidate pool saved by
+     savePool, checking that its markers are those of DspAgeData. If the
+     data file is given, the hashes of the data file and PDF files must also
+     match those saved with the pool, so that a pool sampled from edited
+     inputs is not reused.
+    '''
+    with np.load(poolFile) as pool:
+        if pool['markers'].tolist() != list(DspAgeData.keys()):
+            print('Markers do not match those of the candidate pool')
+            exit()
+        if dataFile is not None and ('hashes' not in pool.files or \
+            json.loads(pool['hashes'].item()) != inputHashes(dataFile)):
+            print('Inputs of {:s} differ from those of the candidate pool; sample the pool again'.format(dataFile))
+            exit()
+        AgePicks = pool['AgePicks']
+        DspPicks = pool['DspPicks']
+
+    return AgePicks, DspPicks
+
+
+def filterPool(AgePicks, DspPicks, maxRate=None, constraints=None, chunkSize=100000):
+    '''
+    Apply a maximum rate and rate constraints to a pool of candidates that
+     satisfy the standard condition, i.e., reject against the pool instead of
+     the priors. The rates are computed chunkSize candidates at a time.
+
+    INPUTS
+        AgePicks, DspPicks are (m x N) matrices of pool candidates
+        maxRate is the maximum slip rate; candidates with higher rates are
+         discarded
+        constraints is a rateConstraints instance
+    OUTPUTS
+        AgePicks, DspPicks, RatePicks of the n accepted candidates
+    '''
+    if maxRate is None: maxRate = np.Inf
+
+    N = AgePicks.shape[1]
+    valid = np.zeros(N, dtype=bool)
+    for start in range(0, N, chunkSize):
+        ages = AgePicks[:,start:start+chunkSize]
+        dsps = DspPicks[:,start:start+chunkSize]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.diff(dsps, axis=0)/np.diff(ages, axis=0)
+            valid[start:start+chunkSize] = ~np.any(rates > maxRate, axis=0)
+        if constraints is not None:
+            valid[start:start+chunkSize] &= constraints.mask(ages, dsps, rates)
+
+    AgePicks = AgePicks[:,valid]
+    DspPicks = DspPicks[:,valid]
+    RatePicks = np.diff(DspPicks, axis=0)/np.diff(AgePicks, axis=0)
+
+    return AgePicks, DspPicks, RatePicks
+
+
+
+### BAYESIAN CONDITIONS ---
+def standardCondition(ageDiffs, dspDiffs):
+    '''
+    No negative slip rates, i.e., ages and displacements must increase
+     monotonically from one marker to the next. Differences may be given for
+     a single candidate (m-1) or a block of candidates (m-1 x n).
+    '''
+    return (np.min(ageDiffs, axis=0)>=0) & (np.min(dspDiffs, axis=0)>=0)
+
+
+def pairCondition(ageDiff, dspDiff, maxRate):
+    '''
+    Standard condition and maximum rate for a single pair of adjacent
+     markers. Differences may be scalars or arrays of candidates.
+    '''
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (ageDiff>=0) & (dspDiff>=0) & ~(dspDiff/ageDiff > maxRate)
+
+
+
+### PILOT RUN ---
+def pilotRun(DspAgeData, Nsamples, maxRate=None, bound=None, pilotSize=10000, workers=1, seedValue=0,
+    settings=None, rng=None):
+    '''
+    Draw a short pilot sample of candidate histories to estimate the
+     acceptance rate and cost of a full MCMCresample run, e.g., for
+     scheduling batch jobs.
+    Candidates are classified as accepted, rejected by the standard
+     (ordering) condition, rejected by the maximum rate, or rejected by the
+     rateConstraints (if any). The evaluation
+     rate is timed using the same mode as the full run: block mode if a
+     block size is given (or implied by the sampler or tolerance);
+     otherwise the scalar loop of one candidate at a time (on up to 1,000
+     candidates). For Sobol' sampling, the pilot size is rounded up to a
+     power of 2.
+
+    INPUTS
+        Inputs are the same as for MCMCresample
+        pilotSize is the number of candidates in the pilot sample
+        workers is the number of processes used for the full run
+        Of the settings, the block size, pruning, sampler, and rate
+         constraints apply. The time budget (seconds) replaces the default
+         bound with the number of candidates expected to be evaluated within
+         the budget.
+    OUTPUTS
+        pilot is a dictionary with the following entries:
+         nCandidates, acceptanceRate, orderingRejectRate, maxRateRejectRate,
+         constraintRejectRate, candidatesPerSecond, expectedCandidates, expectedTime (seconds),
+         bound, boundExhausted, expectedSuccesses (within bound), timeBudget
+    '''
+    # Parameters
+    Nsamples = int(Nsamples)
+    pilotSize = int(pilotSize)
+    m = len(DspAgeData.keys())  # number of measurements
+    if settings is None: settings = samplerSettings()
+    blockSize, prune, sampler = settings.blockSize, settings.prune, settings.sampler
+    timeBudget, constraints = settings.timeBudget, settings.constraints
 
-    # Other conditions
     if maxRate == None:
         maxRate = np.Inf  # max possible rate to be considered
 
-    if bound == None:
+    # Block mode of the full run (see MCMCresample)
+    blockMode = blockSize is not None or sampler.lower() != 'random' or settings.tolerance is not None
+
+    # Pilot candidates
+    if sampler.lower() in ['sobol']:
+        pilotSize = 2**int(np.ceil(np.log2(pilotSize)))  # balance properties of Sobol' points
+    a_uniform, d_uniform = uniformSampler(m, method=sampler, seedValue=seedValue, blockSize=pilotSize,
+        rng=rng).draw(pilotSize)
+    windows = feasibleWindows(DspAgeData, maxRate) if prune == True else None
+    if windows is not None:
+        a_rand, d_rand = scaleUniforms(a_uniform, d_uniform, windows)
+    else:
+        a_rand, d_rand = a_uniform, d_uniform
+
+    # Classify candidates
+    randAges, randDsps = sampleMarkers(DspAgeData, a_rand, d_rand)
+    ageDiffs = np.diff(randAges, axis=0)
+    dspDiffs = np.diff(randDsps, axis=0)
+    ordered = standardCondition(ageDiffs, dspDiffs)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = dspDiffs/ageDiffs
+        tooFast = rates.max(axis=0) > maxRate
+    constrained = np.ones(pilotSize, dtype=bool)
+    if constraints is not None:
+        constrained[ordered & ~tooFast] = constraints.mask(randAges[:,ordered & ~tooFast],
+            randDsps[:,ordered & ~tooFast], rates[:,ordered & ~tooFast])
+    nAccepted = np.sum(ordered & ~tooFast & constrained)
+
+    # Time the evaluation of candidates
+    if blockMode == True:
+        nTimed = pilotSize
+        startTime = time.time()
+        screenMarkers(DspAgeData, a_rand, d_rand, maxRate)
+    else:
+        nTimed = min(pilotSize, 1000)
+        scalarAges = np.zeros(m)
+        scalarDsps = np.zeros(m)
+        startTime = time.time()
+        for k in range(nTimed):
+            a_k, d_k = a_uniform[:,k], d_uniform[:,k]
+            if windows is not None:
+                a_k, d_k = scaleUniforms(a_k, d_k, windows)
+            screenCandidate(DspAgeData, a_k, d_k, scalarAges, scalarDsps, standardCondition, maxRate, constraints)
+    elapsed = max(time.time()-startTime, 1E-9)
+
+    # Pilot statistics
+    pilot = {}
+    pilot['nCandidates'] = pilotSize
+    pilot['acceptanceRate'] = nAccepted/pilotSize
+    pilot['orderingRejectRate'] = np.sum(~ordered)/pilotSize
+    pilot['maxRateRejectRate'] = np.sum(ordered & tooFast)/pilotSize
+    pilot['constraintRejectRate'] = np.sum(~constrained)/pilotSize
+    pilot['candidatesPerSecond'] = workers*nTimed/elapsed
+
+    if bound == None and timeBudget is not None:
+        bound = int(timeBudget*pilot['candidatesPerSecond'])  # candidates evaluated within budget
+    elif bound == None:
         bound = 4*Nsamples  # default is four times the desired number of samples
 
+    # Predictions for the full run
+    if nAccepted > 0:
+        pilot['expectedCandidates'] = Nsamples/pilot['acceptanceRate']
+    else:
+        pilot['expectedCandidates'] = np.inf
+    pilot['expectedTime'] = min(pilot['expectedCandidates'], bound+1)/pilot['candidatesPerSecond']
+    pilot['bound'] = bound
+    pilot['boundExhausted'] = pilot['expectedCandidates'] > bound+1
+    pilot['expectedSuccesses'] = min(Nsamples, pilot['acceptanceRate']*(bound+1))
+    pilot['timeBudget'] = timeBudget
+
+    return pilot
+
+
+def reportPilot(pilot, txtFile=None, verbose=False):
+    '''
+    Report the results of a pilot run to the screen and text file. A warning
+     is always printed if the sampling bound is expected to be exhausted.
+    '''
+    pilotStr = 'Pilot run of {:d} candidates:\n'.format(pilot['nCandidates'])
+    pilotStr += '\tacceptance rate: {:.4f}\n'.format(pilot['acceptanceRate'])
+    pilotStr += '\trejected by ordering condition: {:.4f}\n'.format(pilot['orderingRejectRate'])
+    pilotStr += '\trejected by max rate: {:.4f}\n'.format(pilot['maxRateRejectRate'])
+    if pilot['constraintRejectRate'] > 0:
+        pilotStr += '\trejected by constraints: {:.4f}\n'.format(pilot['constraintRejectRate'])
+    pilotStr += '\tcandidates per second: {:.0f}\n'.format(pilot['candidatesPerSecond'])
+    pilotStr += '\texpected candidates: {:.0f} (bound {:d})\n'.format(pilot['expectedCandidates'], pilot['bound'])
+    pilotStr += '\texpected wall time: {:.1f} s\n'.format(pilot['expectedTime'])
+
+    if verbose == True:
+        print('*'*32)
+        print(pilotStr, end='')
+
+    if pilot['boundExhausted'] == True and pilot['timeBudget'] is not None:
+        print('WARNING! Time budget ({:.1f} s) is expected to be exhausted after approximately {:.0f} successes.'.\
+            format(pilot['timeBudget'], pilot['expectedSuccesses']))
+    elif pilot['boundExhausted'] == True:
+        print('WARNING! Sampling bound ({:d}) is expected to be exhausted after approximately {:.0f} successes. \
+Consider increasing the bound.'.format(pilot['bound'], pilot['expectedSuccesses']))
+
+    if txtFile is not None:
+        txtFile.append('\n'+pilotStr)
+
+
+
+### BLOCK DECOMPOSITION ---
+def findMarkerBlocks(DspAgeData, maxRate=None):
+    '''
+    Split the sequence of markers into independent blocks.
+    The standard condition only couples adjacent markers. If the full
+     (0-100 %) supports of two adjacent markers do not overlap in age or in
+     displacement, and the largest possible rate between them does not
+     exceed maxRate, no pair of picks from those markers can be rejected,
+     and the markers on either side may be sampled separately.
+    Returns a list of blocks, each of which is a list of marker names.
+    '''
+    if maxRate == None:
+        maxRate = np.Inf  # max possible rate to be considered
+
+    dataNames = list(DspAgeData.keys())
+
+    blocks = [[dataNames[0]]]
+    for i in range(len(dataNames)-1):
+        # Younger and older markers
+        younger = DspAgeData[dataNames[i]]
+        older = DspAgeData[dataNames[i+1]]
+
+        # Minimum age difference and maximum displacement difference
+        minAgeDiff = older['Age'].ages.min() - younger['Age'].ages.max()
+        maxDspDiff = older['Dsp'].dsps.max() - younger['Dsp'].dsps.min()
+        minDspDiff = older['Dsp'].dsps.min() - younger['Dsp'].dsps.max()
+
+        # Check whether the pair can ever be rejected
+        independent = (minAgeDiff >= 0) and (minDspDiff >= 0) and (maxDspDiff <= maxRate*minAgeDiff)
+
+        if independent == True:
+            blocks.append([dataNames[i+1]])  # start new block
+        else:
+            blocks[-1].append(dataNames[i+1])  # extend current block
+
+    return blocks
+
+
+def blockwiseResample(DspAgeData, Nsamples, blocks, maxRate=None, bound=None, seedValue=0, settings=None,
+    accumulators=None, reservoir=None, rng=None, workers=1, verbose=False, outName=None):
+    '''
+    Sample each independent block of markers (see findMarkerBlocks)
+     separately, in parallel if more than one worker is specified, and
+     stitch the blocks together into full histories. Blocks consisting of a
+     single marker are sampled directly, without rejection. Each block
+     receives an independent random number generator spawned from rng (see
+     spawnGenerators). If a time budget is given, it is shared between the
+     rounds of blocks sampled one after the other (one round per block if
+     sampled serially), and all blocks are trimmed to the smallest number of
+     picks achieved. Each
+     block writes its own checkpoint, <checkpointName>_block<i>.
+     Blocks are stitched in memory, after which the accumulators and
+     reservoir (if any) are updated, and only the picks kept are returned.
+     Of the settings, only the block size, pruning, sampler, time budget,
+     checkpoints, and picks kept apply; the convergence tolerance and rate
+     constraints, which concern the rates between blocks, do not.
+    Outputs are the same as for MCMCresample.
+    '''
+    from multiprocessing import Pool
+
+    Nsamples = int(Nsamples)
+    if settings is None: settings = samplerSettings()
+
+    if verbose == True:
+        print('*'*32)
+        print('Sampling {:d} independent blocks of markers'.format(len(blocks)))
+        for block in blocks:
+            print('\t{:s}'.format(', '.join(block)))
+
+    # Independent random number streams
+    if rng is None: rng = randomGenerator(seedValue)
+    blockRngs, blockSeeds = spawnGenerators(rng, len(blocks))
+
+    # Checkpoint of each block
+    checkpointName = settings.checkpointName if settings.checkpointName is not None else outName
+    if checkpointName is not None:
+        blockCheckpoints = ['{:s}_block{:d}'.format(checkpointName, i) for i in range(len(blocks))]
+    else:
+        blockCheckpoints = [None]*len(blocks)
+
+    # Time budget of each block, sampled in rounds of parallel workers
+    blockBudget = None
+    if settings.timeBudget is not None:
+        nRounds = int(np.ceil(len(blocks)/min(max(workers, 1), len(blocks))))
+        blockBudget = settings.timeBudget/nRounds
+
+    # Sample each block, keeping all picks in memory for stitching
+    blockSettings = [samplerSettings(blockSize=settings.blockSize, prune=settings.prune, sampler=settings.sampler,
+        timeBudget=blockBudget, checkpointName=blockCheckpoints[i],
+        checkpointInterval=settings.checkpointInterval, resume=settings.resume, keepCheckpoint=True)
+        for i in range(len(blocks))]
+    blockArgs = [({name: DspAgeData[name] for name in block}, Nsamples, maxRate, bound, blockSeeds[i],
+        blockSettings[i], blockRngs[i]) for i, block in enumerate(blocks)]
+    if workers > 1:
+        with Pool(min(workers, len(blocks))) as pool:
+            results = pool.starmap(resampleMarkerBlock, blockArgs)
+    else:
+        results = [resampleMarkerBlock(*blockArg) for blockArg in blockArgs]
+
+    # Remove block checkpoints once all blocks are complete
+    if settings.checkpointInterval is not None or settings.resume == True:
+        for blockCheckpoint in blockCheckpoints:
+            runCheckpoint(blockCheckpoint).remove()
+
+    # Trim to the smallest number of picks achieved
+    nPicks = min([result[0].shape[1] for result in results])
+    results = [[picks[:,:nPicks] for picks in result] for result in results]
+
+    # Stitch blocks into full histories
+    AgePicks = np.concatenate([result[0] for result in results], axis=0)
+    DspPicks = np.concatenate([result[1] for result in results], axis=0)
+
+    # Rates within blocks, and between the last and first markers of adjacent blocks
+    ratePicks = [results[0][2]]
+    for k in range(1, len(blocks)):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            boundaryRates = (results[k][1][0]-results[k-1][1][-1])/(results[k][0][0]-results[k-1][0][-1])
+        ratePicks.extend([boundaryRates[np.newaxis,:], results[k][2]])
+    RatePicks = np.concatenate(ratePicks, axis=0)
+
+    # Update accumulators with the stitched histories
+    if accumulators is not None:
+        accumulators.update(RatePicks)
+    if reservoir is not None:
+        reservoir.update(AgePicks, DspPicks)
+
+    # Picks not held in memory
+    kinds = keptKinds(settings.keepPicks)
+    if len(kinds) == 0:
+        return None, None, None
+
+    # Kinds and type of picks kept
+    AgePicks, DspPicks, RatePicks = [picks.astype(settings.pickType) if kind in kinds else None
+        for kind, picks in zip(pickStore.kinds, [AgePicks, DspPicks, RatePicks])]
+
+    # Save picks to file
+    if outName: savePicks(outName, AgePicks, DspPicks, RatePicks)
+
+    return AgePicks, DspPicks, RatePicks
+
+
+def resampleMarkerBlock(DspAgeData, Nsamples, maxRate, bound, seedValue, settings, rng):
+    '''
+    Sample a single block of markers. Returns the age, displacement, and
+     rate picks.
+    '''
+    # Single markers do not require rejection
+    if len(DspAgeData) == 1:
+        a_rand, d_rand = uniformSampler(1, method=settings.sampler, seedValue=seedValue, rng=rng).draw(Nsamples)
+        AgePicks, DspPicks = sampleMarkers(DspAgeData, a_rand, d_rand)
+        return AgePicks, DspPicks, np.zeros((0, Nsamples))
+
+    return MCMCresample(DspAgeData, Nsamples, maxRate=maxRate, bound=bound,
+        seedValue=seedValue, settings=settings, rng=rng)
+
+
+
+### SEQUENTIAL IMPORTANCE SAMPLING ---
+def SISresample(DspAgeData, Nsamples, maxRate=None, Nhistories=None, resample=True, seedValue=0,
+    blockSize=None, rng=None, constraints=None, verbose=False, outName=None):
+    '''
+    Sequential importance sampling (SIS) of the marker PDFs.
+    Rather than drawing all markers independently and rejecting histories
+     that violate the standard condition, each marker is drawn in order
+     from its inverse CDF, truncated to the region above the previous
+     marker. The displacement is drawn first, above the previous
+     displacement; the age is then drawn above the previous age plus the
+     minimum age difference allowed by maxRate. Every history is therefore
+     valid, and carries an importance weight equal to the product of the
+     truncated probability masses. Histories that do not satisfy the
+     rateConstraints (if any) are given zero weight.
+    Optionally, the weighted histories are resampled (systematic
+     resampling) to Nsamples equally weighted picks, which can be treated
+     the same as the outputs of MCMCresample.
+
+    INPUTS
+        DspAgeData is a dictionary with one entry per displacement-age datum.
+         Each entry has an 'Age' entry (ageDatum) and 'Dsp' entry (dspDatum).
+        Nsamples is the number of picks returned after resampling
+        maxRate is the maximum slip rate to be considered
+        Nhistories is the number of weighted histories drawn. If unspecified,
+         the default value is set to four times the desired number of samples.
+        resample determines whether the weighted histories are resampled
+        seedValue is the seed for the random number generator
+        blockSize is the number of histories drawn at once
+        rng is the np.random.Generator used. If unspecified, a PCG64
+         generator is seeded with seedValue.
+        constraints is a rateConstraints instance
+    OUTPUTS
+        AgePicks is an (m x n) matrix of age sample values
+        DspPicks is an (m x n) matrix of displacement sample values
+        RatePicks is an (m-1 x n) matrix of slip rate values
+        weights is the normalized importance weight of each history,
+         returned only if resample is False
+    '''
+    ## Setup
+    if verbose == True:
+        print('*'*32)
+        print('Initializing sequential importance sampling')
+
+    Nsamples = int(Nsamples)  # ensure integer value
+
+    if maxRate == None:
+        maxRate = np.Inf  # max possible rate to be considered
+
+    if Nhistories == None:
+        Nhistories = 4*Nsamples  # default is four times the desired number of samples
+    Nhistories = int(Nhistories)
+
+    if blockSize == None:
+        blockSize = Nhistories
+    blockSize = int(blockSize)
+
     # Random number generator
-    np.random.seed(seedValue)  # seed random number generator for consistency
+    if rng is None: rng = randomGenerator(seedValue)
 
     # Arrays to fill in
     m = len(DspAgeData.keys())  # number of measurements
-    randAges = np.zeros(m)
-    randDsps = np.zeros(m)
-    AgePicks = np.zeros((m, Nsamples))
-    DspPicks = np.zeros((m, Nsamples))
-    RatePicks = np.zeros((m-1, Nsamples))
+    AgePicks = np.zeros((m, Nhistories))
+    DspPicks = np.zeros((m, Nhistories))
+    logWeights = np.zeros(Nhistories)
 
 
-    ## Monte Carlo sampling
-    # Initialize
-    tossed = 0  # toss counter
-    successes = 0  # success counter
-    if verbose == True: print('Progress:')
+    ## Sequential sampling
+    for start in range(0, Nhistories, blockSize):
+        stop = min(start+blockSize, Nhistories)
 
-    # Loop through runs
-    while successes < Nsamples:
         # Pick random numbers from uniform distribution
-        a_rand=np.random.uniform(0, 1, (m))  # random uniform numbers for ages
-        d_rand=np.random.uniform(0, 1, (m))  # random uniform numbers for disps
-
-        # Interpolate CDF to get random age or disp
-        for j, datumName in enumerate(DspAgeData.keys()):
-            # Age and displacement objects for each datum
-            Age = DspAgeData[datumName]['Age']
-            Dsp = DspAgeData[datumName]['Dsp']
-            # Random samples
+        a_rand = rng.random((m, stop-start))  # random uniform numbers for ages
+        d_rand = rng.random((m, stop-start))  # random uniform numbers for disps
+
+        # Draw each marker in order
+        randAges, randDsps, logWeights[start:stop] = sequentialMarkers(DspAgeData, a_rand, d_rand,
+            maxRate)
+        AgePicks[:,start:stop] = randAges
+        DspPicks[:,start:stop] = randDsps
+
+    # Slip rates
+    with np.errstate(divide='ignore', invalid='ignore'):
+        RatePicks = np.diff(DspPicks, axis=0)/np.diff(AgePicks, axis=0)
+
+    # Zero weight for histories that violate the constraints
+    if constraints is not None:
+        valid = np.isfinite(logWeights)
+        valid[valid] = constraints.mask(AgePicks[:,valid], DspPicks[:,valid], RatePicks[:,valid])
+        logWeights[~valid] = -np.inf
+
+    # Normalize weights
+    if np.isinf(logWeights.max()):
+        print('No valid histories could be drawn. Check that markers are ordered youngest to oldest.')
+        exit()
+    weights = np.exp(logWeights-logWeights.max())
+    weights /= weights.sum()
+
+    # Effective sample size
+    ESS = 1/np.sum(weights**2)
+
+    if verbose == True:
+        print('Finished')
+        print('\tN histories: {:d}'.format(Nhistories))
+        print('\tEffective sample size: {:.0f}'.format(ESS))
+
+    if ESS < Nsamples:
+        print('WARNING! Effective sample size ({:.0f}) is less than the number of samples ({:d}). \
+Consider increasing the number of histories.'.format(ESS, Nsamples))
+
+
+    ## Resampling
+    if resample == False:
+        return AgePicks, DspPicks, RatePicks, weights
+
+    # Systematic resampling
+    positions = (rng.random()+np.arange(Nsamples))/Nsamples
+    resampleNdx = np.searchsorted(np.cumsum(weights), positions)
+    resampleNdx = np.minimum(resampleNdx, Nhistories-1)  # guard against round-off
+
+    AgePicks = AgePicks[:,resampleNdx]
+    DspPicks = DspPicks[:,resampleNdx]
+    RatePicks = RatePicks[:,resampleNdx]
+
+    # Save picks to file
+    if outName: savePicks(outName, AgePicks, DspPicks, RatePicks)
+
+    return AgePicks, DspPicks, RatePicks
+
+
+def sequentialMarkers(DspAgeData, a_rand, d_rand, maxRate):
+    '''
+    Draw (m x n) ages and displacements marker by marker, with each draw
+     truncated to the region allowed by the previous marker. Returns the
+     ages, displacements, and log importance weights.
+    '''
+    randAges = np.empty(a_rand.shape)
+    randDsps = np.empty(d_rand.shape)
+    logWeights = np.zeros(a_rand.shape[1])
+
+    for j, datumName in enumerate(DspAgeData.keys()):
+        # Age and displacement objects for each datum
+        Age = DspAgeData[datumName]['Age']
+        Dsp = DspAgeData[datumName]['Dsp']
+
+        # First marker is not truncated
+        if j == 0:
             randAges[j] = Age.InvCDF(a_rand[j])
             randDsps[j] = Dsp.InvCDF(d_rand[j])
+            continue
 
-        # Differences
-        ageDiffs = np.diff(randAges)
-        dspDiffs = np.diff(randDsps)
+        # Displacement must exceed previous displacement
+        dspLevel = Dsp.CDF(randDsps[j-1])
+        randDsps[j] = truncatedInvCDF(Dsp, dspLevel, Dsp.cdf[-1], d_rand[j])
 
-        # Check against condition
-        if condition(ageDiffs, dspDiffs) == False:
-            # If condition not met, try again
-            tossed += 1
-        else:
-            # Check max rate
-            rates = dspDiffs/ageDiffs
-            if rates.max() > maxRate:
-                tossed += 1
-            else:
-                # If condition is met, record values and advance counter
-                AgePicks[:,successes] = randAges
-                DspPicks[:,successes] = randDsps
-                RatePicks[:,successes] = rates
-                successes += 1
+        # Age must exceed previous age by enough to respect max rate
+        minAge = randAges[j-1] + (randDsps[j]-randDsps[j-1])/maxRate
+        ageLevel = Age.CDF(minAge)
+        randAges[j] = truncatedInvCDF(Age, ageLevel, Age.cdf[-1], a_rand[j])
 
-        # Report progress
-        if verbose == True:
-            if 100*successes/Nsamples % 10 == 0:
-                print('{:.0f} %'.format(100*successes/Nsamples))
+        # Update weights with truncated masses
+        with np.errstate(divide='ignore'):
+            logWeights += np.log(Dsp.cdf[-1]-dspLevel) + np.log(Age.cdf[-1]-ageLevel)
 
-        # Check against bound
-        if (successes+tossed) > bound:
-            print('WARNING! Maximum sample limit exceeded ({:d}).'.format(bound))
-            break
+    return randAges, randDsps, logWeights
 
 
-    ## Finishing
+def truncatedInvCDF(datum, lowerLevel, upperLevel, u):
+    '''
+    Interpolate the inverse CDF of an age or displacement datum at uniform
+     random numbers u rescaled to lie between two CDF levels.
+    '''
+    levels = lowerLevel + (upperLevel-lowerLevel)*u
+    levels = np.clip(levels, datum.cdf[0], datum.cdf[-1])  # guard against round-off
+
+    return datum.InvCDF(levels)
+
+
+### GIBBS SAMPLING ---
+def GibbsResample(DspAgeData, Nsamples, maxRate=None, Nchains=8, burnIn=500, thin=1, seedValue=0,
+    rng=None, verbose=False, outName=None):
+    '''
+    Gibbs sampling of the ordered marker ages and displacements.
+    Each sweep updates every marker's age, then its displacement, by drawing
+     from the marker PDF truncated to lie between the current values of the
+     neighboring markers (and within the limits imposed by maxRate). The
+     truncated draws use the inverse CDF between the two CDF levels, so
+     every state of the chain satisfies the standard condition, and the
+     cost per pick does not grow with the amount of overlap between markers.
+    All chains are updated simultaneously. Each chain is initialized with a
+     valid history drawn by sequential sampling, and the first burnIn
+     sweeps are discarded.
+
+    INPUTS
+        DspAgeData is a dictionary with one entry per displacement-age datum.
+         Each entry has an 'Age' entry (ageDatum) and 'Dsp' entry (dspDatum).
+        Nsamples is the total number of picks to return
+        maxRate is the maximum slip rate to be considered
+        Nchains is the number of independent chains
+        burnIn is the number of sweeps discarded at the start of each chain
+        thin is the number of sweeps between recorded picks
+        seedValue is the seed for the random number generator
+        rng is the np.random.Generator used. If unspecified, a PCG64
+         generator is seeded with seedValue.
+    OUTPUTS
+        AgePicks is an (m x n) matrix of age sample values
+        DspPicks is an (m x n) matrix of displacement sample values
+        RatePicks is an (m-1 x n) matrix of slip rate values
+    '''
+    ## Setup
+    if verbose == True:
+        print('*'*32)
+        print('Initializing Gibbs sampling')
+
+    Nsamples = int(Nsamples)  # ensure integer value
+    Nchains = int(Nchains)
+    thin = max(int(thin), 1)
+
+    if maxRate == None:
+        maxRate = np.Inf  # max possible rate to be considered
+
+    # Number of picks per chain
+    nKeep = int(np.ceil(Nsamples/Nchains))
+    nSweeps = int(burnIn) + nKeep*thin
+
     if verbose == True:
+        print('\tN chains: {:d}'.format(Nchains))
+        print('\tBurn-in: {:d} sweeps'.format(int(burnIn)))
+        print('\tThinning: every {:d} sweeps'.format(thin))
+
+    # Random number generator
+    if rng is None: rng = randomGenerator(seedValue)
+
+    # Initial values
+    m = len(DspAgeData.keys())  # number of measurements
+    ages, dsps = initialGibbsState(DspAgeData, Nchains, maxRate, rng)
+
+    # Arrays to fill in
+    AgePicks = np.zeros((m, Nchains, nKeep))
+    DspPicks = np.zeros((m, Nchains, nKeep))
+
+
+    ## Gibbs sampling
+    if verbose == True: print('Progress:')
+
+    k = 0  # pick counter
+    for sweep in range(nSweeps):
+        # Update each marker
+        GibbsSweep(DspAgeData, ages, dsps, maxRate, rng)
+
+        # Record picks after burn-in
+        if sweep >= burnIn and (sweep-burnIn+1) % thin == 0:
+            AgePicks[:,:,k] = ages
+            DspPicks[:,:,k] = dsps
+            k += 1
+
+            # Report progress
+            if verbose == True and (10*k) % nKeep < 10:
+                print('{:.0f} %'.format(100*k/nKeep))
+
+    # Slip rates
+    with np.errstate(divide='ignore', invalid='ignore'):
+        RatePicks = np.diff(DspPicks, axis=0)/np.diff(AgePicks, axis=0)
+
+    # Convergence diagnostic
+    if verbose == True and Nchains > 1:
         print('Finished')
-        print('\tN successes: {:d}'.format(successes))
-        print('\tN tossed: {:d}'.format(tossed))
+        print('\tGelman-Rubin statistic (R-hat) per interval:')
+        for Rhat in GelmanRubin(RatePicks):
+            print('\t{:.3f}'.format(Rhat))
+
+    # Concatenate chains
+    AgePicks = AgePicks.reshape(m, -1)[:,:Nsamples]
+    DspPicks = DspPicks.reshape(m, -1)[:,:Nsamples]
+    RatePicks = RatePicks.reshape(m-1, -1)[:,:Nsamples]
 
     # Save picks to file
-    if outName:
-        savename = '{:s}_Picks'.format(outName)
-        np.savez(savename,
-            AgePicks=AgePicks,
-            DspPicks=DspPicks,
-            RatePicks=RatePicks)
+    if outName: savePicks(outName, AgePicks, DspPicks, RatePicks)
 
     return AgePicks, DspPicks, RatePicks
 
 
+def initialGibbsState(DspAgeData, Nchains, maxRate, rng, maxAttempts=100):
+    '''
+    Draw one valid history per chain by sequential sampling, discarding
+     histories that have zero weight.
+    '''
+    m = len(DspAgeData.keys())  # number of measurements
+
+    for attempt in range(maxAttempts):
+        a_rand = rng.random((m, 4*Nchains))
+        d_rand = rng.random((m, 4*Nchains))
+        ages, dsps, logWeights = sequentialMarkers(DspAgeData, a_rand, d_rand, maxRate)
+
+        validNdx = np.flatnonzero(np.isfinite(logWeights))
+        if len(validNdx) >= Nchains:
+            validNdx = validNdx[:Nchains]
+            return ages[:,validNdx], dsps[:,validNdx]
+
+    print('Could not initialize Gibbs chains. Check that markers are ordered youngest to oldest.')
+    exit()
+
+
+def GibbsSweep(DspAgeData, ages, dsps, maxRate, rng):
+    '''
+    Update the (m x Nchains) ages and displacements in place, one marker at
+     a time. The uniform random numbers of the sweep are drawn at once.
+    '''
+    m, Nchains = ages.shape
+    rateLimited = np.isfinite(maxRate)
+    a_rand, d_rand = rng.random((2, m, Nchains))
+
+    for j, datumName in enumerate(DspAgeData.keys()):
+        # Age and displacement objects for each datum
+        Age = DspAgeData[datumName]['Age']
+        Dsp = DspAgeData[datumName]['Dsp']
+
+        # Age limits from neighboring markers
+        lowerAge = np.full(Nchains, -np.inf)
+        upperAge = np.full(Nchains, np.inf)
+        if j > 0:
+            lowerAge = ages[j-1].copy()
+            if rateLimited: lowerAge += (dsps[j]-dsps[j-1])/maxRate
+        if j < m-1:
+            upperAge = ages[j+1].copy()
+            if rateLimited: upperAge -= (dsps[j+1]-dsps[j])/maxRate
+
+        # Update age
+        ages[j] = truncatedInvCDF(Age, Age.CDF(lowerAge), Age.CDF(upperAge), a_rand[j])
+
+        # Displacement limits from neighboring markers
+        lowerDsp = np.full(Nchains, -np.inf)
+        upperDsp = np.full(Nchains, np.inf)
+        if j > 0:
+            lowerDsp = dsps[j-1].copy()
+            if rateLimited: upperDsp = dsps[j-1] + maxRate*(ages[j]-ages[j-1])
+        if j < m-1:
+            upperDsp = np.minimum(upperDsp, dsps[j+1])
+            if rateLimited: lowerDsp = np.maximum(lowerDsp, dsps[j+1] - maxRate*(ages[j+1]-ages[j]))
+
+        # Update displacement
+        dsps[j] = truncatedInvCDF(Dsp, Dsp.CDF(lowerDsp), Dsp.CDF(upperDsp), d_rand[j])
+
+
+def GelmanRubin(RatePicks):
+    '''
+    Compute the potential scale reduction factor (R-hat) of each interval
+     from an (m-1 x Nchains x n) array of rate picks.
+    '''
+    n = RatePicks.shape[2]
+
+    chainMeans = RatePicks.mean(axis=2)
+    B = n*chainMeans.var(axis=1, ddof=1)  # between-chain variance
+    W = RatePicks.var(axis=2, ddof=1).mean(axis=1)  # within-chain variance
+    varEst = (n-1)/n*W + B/n
+
+    return np.sqrt(varEst/W)
+
+
 
 ### CONVERT PICKS TO PDF ---
 def picks2PDF(DspAgeData, RatePicks, method, stepSize, smoothingKernel=None, kernelWidth=2, verbose=False):
@@ -161,14 +2121,120 @@ def picks2PDF(DspAgeData, RatePicks, method, stepSize, smoothingKernel=None, ker
         # Create slip rate object
         Rates[intvl] = incrSlipRate(name=intvl)
 
-        # Convert picks to PDF
-        Rates[intvl].picks2PDF(RatePicks[i,:], method, stepSize, smoothingKernel, kernelWidth)
+        # Convert picks to PDF, reading stored picks chunk by chunk, or from accumulators
+        if isinstance(RatePicks, rateAccumulators):
+            Rates[intvl].rates, Rates[intvl].probs = RatePicks.PDF(i, method, smoothingKernel, kernelWidth)
+        elif isinstance(RatePicks, storedPicks):
+            Rates[intvl].chunks2PDF(RatePicks.rowChunks(i), *RatePicks.range(i),
+                method, stepSize, smoothingKernel, kernelWidth)
+        else:
+            Rates[intvl].picks2PDF(RatePicks[i,:], method, stepSize, smoothingKernel, kernelWidth)
 
     return Rates
 
 
 
 ### STATISTICAL FUNCTIONS ---
+def batchMeansError(RatePicks, confidence=68.27, nBatches=20):
+    '''
+    Estimate the Monte Carlo standard error of the lower, median, and upper
+     percentiles of each interval using batch means. The picks are split into
+     nBatches consecutive batches, the percentiles are computed for each
+     batch, and the standard error is the standard deviation of the batch
+     percentiles divided by sqrt(nBatches). With fewer than 2 x nBatches
+     picks, the number of batches is reduced so that each batch holds at
+     least two picks.
+    Returns a (3 x m-1) array of standard errors, or None if there are fewer
+     than four picks.
+    '''
+    # Parameters
+    m, Nsamples = RatePicks.shape  # nb intervals
+    percentiles = [50-confidence/2, 50, 50+confidence/2]
+    nBatches = min(nBatches, Nsamples//2)
+    if nBatches < 2:
+        return None
+    batchLen = Nsamples//nBatches
+
+    # Percentiles of each batch
+    batches = RatePicks[:,:nBatches*batchLen].reshape(m, nBatches, batchLen)
+    batchPercentiles = np.percentile(batches, percentiles, axis=2)
+
+    return batchPercentiles.std(axis=2, ddof=1)/np.sqrt(nBatches)
+
+
+class batchMeansMonitor:
+    '''
+    Running form of batchMeansError, for checking convergence as picks
+     accumulate. The picks are split into consecutive batches of batchLen
+     picks, and the percentiles of each batch are computed once, when the
+     batch is complete, so that each check only reads the picks added since
+     the last. Once there are 2 x nBatches batches, adjacent batches are
+     merged by doubling batchLen, and the percentiles of the merged batches
+     are computed again; the total cost therefore grows linearly with the
+     number of picks. The batches depend only on the number of picks, so the
+     estimate is the same for a run resumed from a checkpoint.
+    '''
+    def __init__(self, confidence=68.27, nBatches=20, batchLen=50):
+        self.percentiles = [50-confidence/2, 50, 50+confidence/2]
+        self.nBatches = nBatches
+        self.batchLen = batchLen
+        self.batchPercentiles = np.zeros((3, 0, 0))  # (3 x m-1 x batches) percentiles of complete batches
+
+    def update(self, RatePicks, successes):
+        '''
+        Compute the percentiles of the batches completed within the first
+         successes picks of the (m-1 x N) rate picks.
+        '''
+        m = RatePicks.shape[0]  # nb intervals
+
+        # Merge batches once there are too many
+        while successes//self.batchLen >= 2*self.nBatches:
+            self.batchLen *= 2
+            self.batchPercentiles = np.zeros((3, m, 0))
+
+        # Percentiles of newly completed batches
+        done = self.batchPercentiles.shape[2]
+        nNew = successes//self.batchLen-done
+        if nNew > 0:
+            batches = RatePicks[:,done*self.batchLen:(done+nNew)*self.batchLen].reshape(m, nNew, self.batchLen)
+            self.batchPercentiles = np.concatenate([self.batchPercentiles.reshape(3, m, done),
+                np.percentile(batches, self.percentiles, axis=2)], axis=2)
+
+    def error(self):
+        '''
+        Return the (3 x m-1) array of standard errors, or None until there
+         are nBatches complete batches.
+        '''
+        nBatches = self.batchPercentiles.shape[2]
+        if nBatches < self.nBatches:
+            return None
+
+        return self.batchPercentiles.std(axis=2, ddof=1)/np.sqrt(nBatches)
+
+
+def reportMCerror(DspAgeData, RatePicks, txtFile, confidence=68.27, verbose=False):
+    '''
+    Report the Monte Carlo standard error of the slip rate percentiles.
+    '''
+    # Parameters
+    dataNames = list(DspAgeData.keys())
+    MCerror = batchMeansError(RatePicks, confidence)
+
+    # Write to text file
+    reportStr = '\nMonte Carlo standard error of percentiles (batch means; lower, median, upper):\n'
+    if MCerror is None:
+        reportStr += 'Not estimated from {:d} picks\n'.format(RatePicks.shape[1])
+    else:
+        for i in range(RatePicks.shape[0]):
+            intvl = '{:s}-{:s}'.format(dataNames[i], dataNames[i+1])
+            reportStr += '{0:s}: {1:.4f} {2:.4f} {3:.4f}\n'.format(intvl, *MCerror[:,i])
+
+    txtFile.append(reportStr)
+
+    # Report if requested
+    if verbose == True: print(reportStr.strip())
+
+
 def rawPercentiles(DspAgeData, RatePicks, txtFile, confidence=68.27, verbose=False):
     '''
     Compute the percentiles of slip rate picks.
@@ -191,8 +2257,13 @@ def rawPercentiles(DspAgeData, RatePicks, txtFile, confidence=68.27, verbose=Fal
         # Formulate interval name
         intvl = '{:s}-{:s}'.format(dataNames[i], dataNames[i+1])
 
-        # Calculate percentile
-        pct = np.percentile(RatePicks[i,:], percentiles)
+        # Calculate percentile, reading stored picks chunk by chunk, or from accumulators
+        if isinstance(RatePicks, rateAccumulators):
+            pct = RatePicks.percentiles(i, percentiles)
+        elif isinstance(RatePicks, storedPicks):
+            pct = streamPercentiles(RatePicks.rowChunks(i), *RatePicks.range(i), percentiles)
+        else:
+            pct = np.percentile(RatePicks[i,:], percentiles)
         median = pct[1]
         high_err = pct[2]-pct[1]
         low_err = pct[1]-pct[0]
@@ -273,4 +273,28 @@ def smoothPDF(x, px, ktype, kwidth):
     P = np.trapz(px,x)
     px /= P
 
-    return px
\ No newline at end of file
+    return px
+
+
+## Smooth function on a fixed grid
+def smoothFunction(px, smoothingKernel, kernelWidth=2, verbose=False):
+    '''
+    Convolve a function with a moving mean or Gaussian kernel, and set the
+     ends back to zero.
+    '''
+    if verbose == True:
+        print('Applying smoothing kernel:\n\ttype: {}\twidth: {}'.format(smoothingKernel, kernelWidth))
+
+    # Moving mean smoothing
+    if smoothingKernel.lower() in ['mean']:
+        K=np.ones(kernelWidth)  # boxcar kernel
+
+    # Gaussian window smoothing
+    elif smoothingKernel.lower() in ['gauss', 'gaussian']:
+        K=gauss_kernel(kernelWidth)  # Gaussian kernel
+
+    # Apply smoothing
+    px=np.convolve(px, K, 'same')  # apply via convolution
+    px[0] = 0; px[-1] = 0  # set ends back to zero
+
+    return px
@@ -9,7 +9,7 @@ Rob Zinke 2019-2021
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.stats import gaussian_kde
-from slipRateObjects import gauss_kernel
+from PDFanalysis import smoothFunction
 
 
 
@@ -54,20 +54,7 @@ def arrayHist(V, stepsize, smoothingKernel=None, kernelWidth=2, verbose=False, p
 
     # Smooth if requested
     if smoothingKernel:
-        if verbose == True:
-            print('Applying smoothing kernel:\n\ttype: {}\twidth: {}'.format(smoothingKernel, kernelWidth))
-
-        # Moving mean smoothing
-        if smoothingKernel.lower() in ['mean']:
-            K=np.ones(kernelWidth)  # boxcar kernel
-
-        # Gaussian window smoothing
-        elif smoothingKernel.lower() in ['gauss', 'gaussian']:
-            K=gauss_kernel(kernelWidth)  # Gaussian kernel
-
-        # Apply smoothing
-        H=np.convolve(H,K,'same')  # apply via convolution
-        H[0] = 0; H[-1] = 0  # set ends back to zero
+        H = smoothFunction(H, smoothingKernel, kernelWidth, verbose)
 
     # Normalize area to 1.0
     Area = np.trapz(H, Hcntrs)  # find area
@@ -124,20 +111,7 @@ def arrayKDE(V, stepsize, smoothingKernel=None, kernelWidth=2, verbose=False, pl
 
     # Smooth if requested
     if smoothingKernel:
-        if verbose == True:
-            print('Applying smoothing kernel:\n\ttype: {}\twidth: {}'.format(smoothingKernel, kernelWidth))
-
-        # Moving mean smoothing
-        if smoothingKernel.lower() in ['mean']:
-            K=np.ones(kernelWidth)  # boxcar kernel
-
-        # Gaussian window smoothing
-        elif smoothingKernel.lower() in ['gauss','gaussian']:
-            K=gauss_kernel(kernelWidth)  # Gaussian kernal
-
-        # Apply smoothing
-        Kde=np.convolve(Kde, K, 'same')  # apply via convolution
-        Kde[0] = 0; Kde[-1]= 0  # set ends back to zero
+        Kde = smoothFunction(Kde, smoothingKernel, kernelWidth, verbose)
 
     # Normalize area to 1.0
     Area = np.trapz(Kde, x)  # find area
@@ -152,4 +126,113 @@ def arrayKDE(V, stepsize, smoothingKernel=None, kernelWidth=2, verbose=False, pl
         fig, ax = plt.subplots()
         ax.plot(x, px, 'k', linewidth=1)
 
-    return x, px
\ No newline at end of file
+    return x, px
+
+
+### CHUNKED CONVERSION FUNCTIONS ---
+## Histogram method
+def streamHist(chunks, vmin, vmax, stepsize, smoothingKernel=None, kernelWidth=2, verbose=False):
+    '''
+    Convert to PDF using histogram, as in arrayHist, with the values read in
+     chunks, such that the full array is never held in memory. The result
+     is identical to arrayHist.
+    INPUTS:
+        chunks is a function returning an iterator over 1D arrays of values
+        vmin, vmax are the minimum and maximum values
+        Other inputs are the same as for arrayHist
+    OUTPUTS:
+        x is the values
+        px is the probability of occurrence
+    '''
+    if verbose == True:
+        print('Converting chunked array to histogram')
+
+    # Histogram bin edges/independent axis
+    bins = np.arange(vmin, vmax+stepsize, stepsize)
+
+    # Accumulate histogram
+    H = np.zeros(len(bins)-1)
+    for V in chunks():
+        H += np.histogram(V, bins=bins)[0]
+    Hcntrs = (bins[:-1]+bins[1:])/2  # centers of bins
+
+    # Taper histogram edges
+    Hcntrs = np.pad(Hcntrs, (1,1), 'constant', constant_values=(bins[0], bins[-1]))
+    H = np.pad(H, (1,1), 'constant')
+
+    # Smooth if requested
+    if smoothingKernel:
+        H = smoothFunction(H, smoothingKernel, kernelWidth, verbose)
+
+    # Normalize area to 1.0
+    Area = np.trapz(H, Hcntrs)  # find area
+    H = H/Area  # normalize area
+
+    return Hcntrs, H
+
+
+## KDE method
+def streamKDE(chunks, vmin, vmax, stepsize, smoothingKernel=None, kernelWidth=2, verbose=False,
+    binsPerStep=4):
+    '''
+    Convert to PDF using kernel density estimation, with the values read in
+     chunks, such that the full array is never held in memory.
+    The first pass accumulates the count, mean, and variance of the values,
+     which set the Gaussian kernel bandwidth by Scott's rule (as in
+     gaussian_kde). The second pass counts the values in bins binsPerStep
+     times finer than the step size, and the KDE is the sum of the kernels
+     centered on the bins, weighted by the bin counts. The binning error is
+     small compared with the bandwidth.
+    INPUTS:
+        chunks is a function returning an iterator over 1D arrays of values
+        vmin, vmax are the minimum and maximum values
+        Other inputs are the same as for arrayKDE
+    OUTPUTS:
+        x is the values
+        px is the probability of occurrence
+    '''
+    if verbose == True:
+        print('Converting chunked array to KDE')
+
+    # First pass - count, mean, and variance (Chan et al. parallel update)
+    n = 0; mean = 0.; M2 = 0.
+    for V in chunks():
+        nV = len(V); meanV = np.mean(V); M2V = np.sum((V-meanV)**2)
+        delta = meanV-mean
+        mean += delta*nV/(n+nV)
+        M2 += M2V + delta**2*n*nV/(n+nV)
+        n += nV
+
+    # Scott's rule bandwidth
+    std = np.sqrt(M2/(n-1))
+    bandwidth = std*n**(-1/5)
+
+    # Independent axis
+    x = np.arange(vmin, vmax+stepsize, stepsize)
+
+    # Second pass - fine bin counts
+    fineBins = np.linspace(vmin, vmax, binsPerStep*len(x)+1)
+    counts = np.zeros(len(fineBins)-1)
+    for V in chunks():
+        counts += np.histogram(V, bins=fineBins)[0]
+    fineCntrs = (fineBins[:-1]+fineBins[1:])/2
+
+    # Sum kernels centered on bins
+    Kde = np.zeros(len(x))
+    for start in range(0, len(x), 1000):
+        xBlock = x[start:start+1000]
+        kernels = np.exp(-0.5*((xBlock[:,np.newaxis]-fineCntrs)/bandwidth)**2)
+        Kde[start:start+1000] = kernels.dot(counts)
+
+    # Set to zero at edges
+    Kde[0] = 0; Kde[-1] = 0
+
+    # Smooth if requested
+    if smoothingKernel:
+        Kde = smoothFunction(Kde, smoothingKernel, kernelWidth, verbose)
+
+    # Normalize area to 1.0
+    Area = np.trapz(Kde, x)  # find area
+    Kde = Kde/Area  # normalize area
+
+    return x, Kde
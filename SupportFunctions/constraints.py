@@ -0,0 +1,222 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Constraints on the incremental slip rates of candidate histories, in addition
+ to the standard (no negative rate) condition and the maximum rate. The
+ constraints are compiled into vectorized masks, evaluated on whole blocks of
+ candidates.
+
+Constraints are declared as a list of dictionaries, either under the key
+ 'constraints' of the YAML data file, e.g.,
+  constraints:
+   - {type: rate, interval: 0, min: 0.5, max: 4.0}
+   - {type: ratio, interval: 1, max: 3.0}
+   - {type: custom, function: siteConstraints.slowingOnly}
+ or on the command line, in the same (YAML flow) format.
+Types are:
+    rate - minimum and/or maximum rate of an interval
+    ratio - maximum ratio of the larger to the smaller rate of the interval
+     and the next (older) interval
+    custom - function of the (m x n) age and displacement picks and the
+     (m-1 x n) rate picks, returning a boolean array of the n candidates
+     that satisfy the constraint. Functions are given as module.function,
+     where the module is importable or is a .py file in the working
+     directory.
+Intervals are numbered from 0, youngest first.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import importlib
+import importlib.util
+import yaml
+import numpy as np
+
+
+### LOADING ---
+def loadConstraints(fname):
+    '''
+    Read the list of constraints under the key 'constraints' of a YAML data
+     file. Returns an empty list if none are declared.
+    '''
+    with open(fname, 'r') as inputFile:
+        data = yaml.load(inputFile, Loader=yaml.FullLoader)
+
+    constraints = data.get('constraints', [])
+    if constraints is None: constraints = []
+
+    return list(constraints)
+
+
+def parseConstraints(constraintStrs):
+    '''
+    Parse constraints given as strings in YAML flow format, e.g., from the
+     command line: "{type: rate, interval: 0, max: 4}".
+    '''
+    if constraintStrs is None:
+        return []
+
+    return [yaml.safe_load(constraintStr) for constraintStr in constraintStrs]
+
+
+def importFunction(name):
+    '''
+    Import a function given as module.function. If the module cannot be
+     imported, it is loaded from <module>.py in the working directory.
+    '''
+    if '.' not in name:
+        print('Custom constraint functions must be given as module.function: {:s}'.format(name))
+        exit()
+    moduleName, functionName = name.rsplit('.', 1)
+
+    try:
+        module = importlib.import_module(moduleName)
+    except ImportError:
+        fname = os.path.abspath(moduleName.replace('.', os.sep)+'.py')
+        if not os.path.exists(fname):
+            print('Could not import constraint function module: {:s}'.format(moduleName))
+            exit()
+        spec = importlib.util.spec_from_file_location(moduleName, fname)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+
+    return getattr(module, functionName)
+
+
+
+### CONSTRAINTS ---
+class rateConstraints:
+    '''
+    Set of constraints on the rates of m markers, compiled into arrays of
+     per-interval rate limits and ratio limits, and a list of custom
+     functions.
+
+    INPUTS
+        constraints is a list of constraint dictionaries (see above).
+         Custom functions may also be given directly as callables.
+        m is the number of markers
+    '''
+    types = ['rate', 'ratio', 'custom']
+
+    def __init__(self, constraints, m):
+        self.constraints = [dict(constraint) for constraint in constraints]
+        self.m = m
+
+        # Check constraints
+        for constraint in self.constraints:
+            self.checkConstraint(constraint)
+
+        self.compile()
+
+    def checkConstraint(self, constraint):
+        '''
+        Check that a constraint is of a known type, and refers to a valid
+         interval.
+        '''
+        if constraint.get('type') not in self.types:
+            print('Choose constraint type: {:s}'.format('/'.join(['\'{:s}\''.format(t) for t in self.types])))
+            exit()
+
+        if constraint['type'] == 'rate':
+            nIntervals = self.m-1
+        elif constraint['type'] == 'ratio':
+            nIntervals = self.m-2
+        else:
+            if 'function' not in constraint.keys():
+                print('Custom constraints must specify a function')
+                exit()
+            return
+
+        if constraint.get('interval') not in range(nIntervals):
+            print('Constraint interval must be between 0 and {:d}: {}'.format(nIntervals-1, constraint))
+            exit()
+
+    def compile(self):
+        '''
+        Build the arrays of limits and resolve the custom functions.
+        '''
+        self.minRates = np.full(self.m-1, -np.inf)
+        self.maxRates = np.full(self.m-1, np.inf)
+        self.maxRatios = np.full(max(self.m-2, 0), np.inf)
+        self.functions = []
+
+        for constraint in self.constraints:
+            if constraint['type'] == 'rate':
+                k = constraint['interval']
+                self.minRates[k] = max(self.minRates[k], constraint.get('min', -np.inf))
+                self.maxRates[k] = min(self.maxRates[k], constraint.get('max', np.inf))
+
+            elif constraint['type'] == 'ratio':
+                k = constraint['interval']
+                self.maxRatios[k] = min(self.maxRatios[k], constraint['max'])
+
+            elif constraint['type'] == 'custom':
+                function = constraint['function']
+                if isinstance(function, str):
+                    function = importFunction(function)
+                self.functions.append(function)
+
+        # Intervals with finite limits
+        self.rateLimited = np.flatnonzero(np.isfinite(self.minRates) | np.isfinite(self.maxRates))
+        self.ratioLimited = np.flatnonzero(np.isfinite(self.maxRatios))
+
+    def __len__(self):
+        return len(self.constraints)
+
+    def mask(self, ages, dsps, rates):
+        '''
+        Evaluate the constraints on (m x n) ages and displacements, and
+         (m-1 x n) rates. Returns a boolean array of the n candidates that
+         satisfy all constraints.
+        '''
+        valid = np.ones(rates.shape[1], dtype=bool)
+
+        # Per-interval rate limits
+        if len(self.rateLimited) > 0:
+            k = self.rateLimited
+            valid &= np.all((rates[k] >= self.minRates[k,np.newaxis]) & (rates[k] <= self.maxRates[k,np.newaxis]),
+                axis=0)
+
+        # Ratios of adjacent rates
+        if len(self.ratioLimited) > 0:
+            k = self.ratioLimited
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratios = np.maximum(rates[k], rates[k+1])/np.minimum(rates[k], rates[k+1])
+            valid &= np.all(ratios <= self.maxRatios[k,np.newaxis], axis=0)
+
+        # Custom functions
+        for function in self.functions:
+            valid &= np.asarray(function(ages, dsps, rates), dtype=bool)
+
+        return valid
+
+    def describe(self):
+        '''
+        List of strings describing the constraints, e.g., for reports and
+         checkpoint settings.
+        '''
+        descriptions = []
+        for constraint in self.constraints:
+            if constraint['type'] == 'rate':
+                descriptions.append('interval {:d}: rate between {} and {}'.format(constraint['interval'],
+                    constraint.get('min', '-inf'), constraint.get('max', 'inf')))
+            elif constraint['type'] == 'ratio':
+                descriptions.append('intervals {:d}-{:d}: rate ratio at most {}'.format(constraint['interval'],
+                    constraint['interval']+1, constraint['max']))
+            else:
+                function = constraint['function']
+                descriptions.append('custom: {:s}'.format(function if isinstance(function, str) \
+                    else getattr(function, '__name__', repr(function))))
+
+        return descriptions
+
+    def __getstate__(self):
+        # Functions named by string are imported again when unpickled, e.g., in workers
+        state = self.__dict__.copy()
+        state['functions'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compile()
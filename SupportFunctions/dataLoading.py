@@ -9,6 +9,7 @@ Rob Zinke 2019-2021
 ### IMPORT MODULES ---
 import sys
 import os
+import hashlib
 try:
     import yaml
 except:
@@ -23,11 +24,7 @@ def checkVersion():
     Confirm Python v3.6+ is used due to the necessity of orderered
      dictionary keys.
     '''
-    Vs = sys.version_info
-    VsMajor = Vs[0]
-    VsMinor = Vs[1]
-    Vs = float('{}.{}'.format(VsMajor, VsMinor))
-    if Vs < 3.6:
+    if sys.version_info[:2] < (3, 6):
         print('Python version must be 3.6+ to use loadInputs function due to \
 the necessity of ordered dictionary keys. Please upgrade to v. 3.6 or higher.')
         exit()
@@ -36,7 +33,7 @@ the necessity of ordered dictionary keys. Please upgrade to v. 3.6 or higher.')
 
 ### LOADING FUNCTIONS ---
 ## Load displacement-age inputs from YAML file for slip rate analysis
-def loadDspAgeInputs(fname, verbose=False, printDetails=False, plotInputs=False):
+def loadDspAgeInputs(fname, verbose=False, printDetails=False, plotInputs=False, workDir=None):
     '''
     Load age and displacement data based on YAML inputs.
     Inputs should be specified as one input per line.
@@ -46,6 +43,9 @@ def loadDspAgeInputs(fname, verbose=False, printDetails=False, plotInputs=False)
     Returns a dictionary of displacement-age markers, where each marker has
      an associated age PDF ("Age") and displacement PDF ("Dsp"). The PDFs
      are loaded as ageDatum and dspDatum objects, respectively.
+    Relative paths to the PDF files are resolved from the working directory,
+     or from workDir if given (e.g., the working directory of the shards of
+     a run).
 
     NOTE: This function should only be used with Python v.s 3.6 or higher
      due to the necessity of ordered dictionary keys.
@@ -63,6 +63,9 @@ def loadDspAgeInputs(fname, verbose=False, printDetails=False, plotInputs=False)
         # Parse data within file
         DspAgeData = yaml.load(inputFile, Loader=yaml.FullLoader)
 
+        # Rate constraints are not markers (see constraints.loadConstraints)
+        DspAgeData.pop('constraints', None)
+
         # Check there are two or more markers given
         if len(DspAgeData) < 2:
             print('More than one marker must be specified for incremental slip rate calculation.')
@@ -73,10 +76,10 @@ def loadDspAgeInputs(fname, verbose=False, printDetails=False, plotInputs=False)
             # Dictionary entry
             datum = DspAgeData[datumName]
 
-            ageFile = datum['ageFile']
+            ageFile = inputPath(datum['ageFile'], workDir)
             ageName = os.path.basename(ageFile).split('.')[0]
 
-            dspFile = datum['dspFile']
+            dspFile = inputPath(datum['dspFile'], workDir)
             dspName = os.path.basename(dspFile).split('.')[0]
 
             # Report if requested
@@ -98,4 +101,49 @@ def loadDspAgeInputs(fname, verbose=False, printDetails=False, plotInputs=False)
             datum['Dsp'].format(verbose = printDetails)
             if plotInputs == True: datum['Dsp'].plot()
 
-    return DspAgeData
\ No newline at end of file
+    return DspAgeData
+
+
+def inputPath(fname, workDir=None):
+    '''
+    Resolve a relative input file path from workDir, if given.
+    '''
+    if workDir is None:
+        return fname
+
+    return os.path.join(workDir, fname)
+
+
+
+### INPUT HASHES ---
+def fileHash(fname, blockSize=2**20):
+    '''
+    SHA-256 hash of a file, read blockSize bytes at a time.
+    '''
+    sha = hashlib.sha256()
+    with open(fname, 'rb') as hashFile:
+        for block in iter(lambda: hashFile.read(blockSize), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+def inputHashes(dataFile, workDir=None):
+    '''
+    Hashes of the data file and of the age and displacement PDF files of
+     each marker, keyed by marker name rather than path, so that shards may
+     read the same files from different mount points. Used to check that
+     saved results (shards, candidate pools) were sampled from the same
+     inputs. Relative paths to the PDF files are resolved as in
+     loadDspAgeInputs.
+    '''
+    with open(dataFile, 'r') as inputFile:
+        data = yaml.load(inputFile, Loader=yaml.FullLoader)
+
+    hashes = {'dataFile': fileHash(dataFile)}
+    for datumName in data.keys():
+        if datumName == 'constraints': continue
+        for fileKey in ['ageFile', 'dspFile']:
+            hashes['{:s} {:s}'.format(datumName, fileKey)] = fileHash(inputPath(data[datumName][fileKey], workDir))
+
+    return hashes
@@ -0,0 +1,227 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Jackknife (leave-one-marker-out) analysis of the influence of each marker on
+ the incremental slip rates. A single set of inverse CDF draws of every
+ marker is shared by the full data set and all m variants with one marker
+ dropped. The condition of each pair of adjacent markers is evaluated once
+ per candidate, so that each variant only re-evaluates the new pair of
+ markers on either side of the dropped marker.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import numpy as np
+from MCresampling import sampleMarkers, pairCondition, picks2PDF, randomGenerator
+
+
+### SAMPLING ---
+def jackknifeResample(DspAgeData, Nsamples, maxRate=None, bound=None, blockSize=10000, seedValue=0, rng=None,
+    verbose=False):
+    '''
+    Rejection sampling of the full data set and of each leave-one-marker-out
+     variant, with common candidates. Candidates are drawn in blocks; for
+     each block, the standard condition and max rate are evaluated for every
+     pair of adjacent markers, and for every pair of markers on either side
+     of a marker. A variant dropping marker k accepts the candidates for
+     which all pairs not involving marker k are valid, and the new pair
+     (k-1, k+1) is valid. Each variant keeps its first Nsamples accepted
+     candidates.
+
+    INPUTS
+        DspAgeData is the dictionary of (at least three) markers
+        Nsamples is the number of picks of each variant
+        maxRate is the maximum slip rate to be considered
+        bound is the maximum number of candidates drawn. If unspecified, the
+         default value is four times the desired number of samples.
+        blockSize is the number of candidates drawn at once
+        seedValue, rng are as for MCMCresample
+    OUTPUTS
+        results is a list of m+1 dictionaries, for the full data set then
+         each variant, with the entries 'dropped' (name of the dropped
+         marker, or None), 'AgePicks', 'DspPicks', 'RatePicks', and
+         'nCandidates', the number of candidates evaluated for the variant
+    '''
+    ## Setup
+    markers = list(DspAgeData.keys())
+    m = len(markers)
+    if m < 3:
+        print('At least three markers are needed for the jackknife analysis')
+        exit()
+
+    if verbose == True:
+        print('*'*32)
+        print('Jackknife sampling of {:d} leave-one-marker-out variants'.format(m))
+
+    Nsamples = int(Nsamples)
+    blockSize = int(blockSize)
+    if maxRate is None: maxRate = np.Inf
+    if bound is None: bound = 4*Nsamples
+    if rng is None: rng = randomGenerator(seedValue)
+
+    # Variants, by dropped marker (None for the full data set)
+    dropped = [None]+list(range(m))
+    keptMarkers = [np.arange(m) if k is None else np.delete(np.arange(m), k) for k in dropped]
+
+    V = len(dropped)
+    picks = [{'Age': [], 'Dsp': []} for v in range(V)]
+    successes = np.zeros(V, dtype=int)
+    nCandidates = np.zeros(V, dtype=int)
+
+
+    ## Monte Carlo sampling
+    drawn = 0  # candidates drawn
+    while np.any(successes < Nsamples) and drawn < bound:
+        n = min(blockSize, bound-drawn)
+
+        # Inverse CDFs of all markers
+        a_rand = rng.random((m, n))
+        d_rand = rng.random((m, n))
+        ages, dsps = sampleMarkers(DspAgeData, a_rand, d_rand)
+        drawn += n
+
+        # Conditions of adjacent pairs, and of pairs on either side of a marker
+        adjacentFails = ~pairCondition(np.diff(ages, axis=0), np.diff(dsps, axis=0), maxRate)
+        skipValid = pairCondition(ages[2:]-ages[:-2], dsps[2:]-dsps[:-2], maxRate)
+        nFails = adjacentFails.sum(axis=0)
+
+        for v, k in enumerate(dropped):
+            if successes[v] >= Nsamples: continue
+
+            if k is None:
+                valid = (nFails == 0)
+            else:
+                # Failures of pairs not involving the dropped marker
+                otherFails = nFails.copy()
+                if k > 0: otherFails -= adjacentFails[k-1]
+                if k < m-1: otherFails -= adjacentFails[k]
+                valid = (otherFails == 0)
+
+                # New pair of markers
+                if 0 < k < m-1: valid &= skipValid[k-1]
+
+            # Keep up to Nsamples picks
+            accepted = np.flatnonzero(valid)[:Nsamples-successes[v]]
+            picks[v]['Age'].append(ages[keptMarkers[v]][:,accepted])
+            picks[v]['Dsp'].append(dsps[keptMarkers[v]][:,accepted])
+            successes[v] += len(accepted)
+            nCandidates[v] += accepted[-1]+1 if successes[v] == Nsamples else n
+
+        if verbose == True:
+            print('{:d} candidates; picks: {:s}'.format(drawn, ', '.join([str(nPicks) for nPicks in successes])))
+
+
+    ## Finishing
+    results = []
+    for v, k in enumerate(dropped):
+        name = markers[k] if k is not None else None
+        label = 'full data set' if k is None else 'variant without {:s}'.format(name)
+        if successes[v] == 0:
+            print('WARNING! No feasible histories for {:s} in {:d} candidates.'.format(label, drawn))
+        elif successes[v] < Nsamples:
+            print('WARNING! Maximum sample limit exceeded ({:d}) for {:s}; {:d} picks.'.\
+                format(bound, label, successes[v]))
+
+        empty = [np.empty((len(keptMarkers[v]), 0))]
+        AgePicks = np.concatenate(picks[v]['Age']+empty, axis=1)
+        DspPicks = np.concatenate(picks[v]['Dsp']+empty, axis=1)
+        RatePicks = np.diff(DspPicks, axis=0)/np.diff(AgePicks, axis=0)
+        results.append({'dropped': name, 'AgePicks': AgePicks, 'DspPicks': DspPicks, 'RatePicks': RatePicks,
+            'nCandidates': int(nCandidates[v])})
+
+    return results
+
+
+def variantData(DspAgeData, dropped):
+    '''
+    Dictionary of the markers of DspAgeData without the dropped marker.
+    '''
+    return {datumName: DspAgeData[datumName] for datumName in DspAgeData.keys() if datumName != dropped}
+
+
+
+### VARIANT RATES ---
+def jackknifeRates(DspAgeData, results, method, stepSize, smoothingKernel=None, kernelWidth=2,
+    analysisMethod='IQR', confidence=68.27, verbose=False, outName=None):
+    '''
+    Convert the rate picks of each leave-one-marker-out variant to PDFs (see
+     picks2PDF) and analyze them. If outName is given, the PDFs are saved to
+     <outName>_Jackknife_<marker>_Incr_slip_rate_<interval>.txt.
+    Returns a list of the dictionaries of incremental slip rates of the
+     variants, in the order of results (None for the full data set, and for
+     variants without feasible histories).
+    '''
+    variantRates = []
+    for result in results:
+        if result['dropped'] is None or result['RatePicks'].shape[1] == 0:
+            variantRates.append(None)
+            continue
+
+        Rates = picks2PDF(variantData(DspAgeData, result['dropped']), result['RatePicks'],
+            method=method, stepSize=stepSize, smoothingKernel=smoothingKernel, kernelWidth=kernelWidth,
+            verbose=verbose)
+
+        for intvl in Rates.keys():
+            Rates[intvl].analyzePDF(method=analysisMethod, confidence=confidence)
+
+            # Save rate PDF to file
+            if outName:
+                pdfName = '{:s}_Jackknife_{:s}_Incr_slip_rate_{:s}'.format(outName,
+                    result['dropped'].replace('/', ''), intvl.replace('/', ''))
+                Rates[intvl].save2txt(pdfName)
+
+        variantRates.append(Rates)
+
+    return variantRates
+
+
+
+### REPORTING ---
+def reportJackknife(Rates, results, variantRates, outName, analysisMethod='IQR', confidence=68.27,
+    rateUnits=None):
+    '''
+    Write the jackknife table to <outName>_Jackknife_Report.txt: the
+     acceptance rate of each variant, and the slip rate of each interval of
+     each variant, with the change from the rate of the full data set for
+     the intervals not affected by the dropped marker.
+    INPUTS
+        Rates is the dictionary of incremental slip rates of the full data
+         set, or None if it has no feasible histories
+        results, variantRates are as returned by jackknifeResample and
+         jackknifeRates
+    Variants without feasible histories are listed as such, and changes are
+     only given when the full data set has feasible histories.
+    '''
+    txtName = '{:s}_Jackknife_Report.txt'.format(outName)
+    valueName = 'median' if analysisMethod.upper() in ['IQR'] else 'mode'
+
+    with open(txtName, 'w') as txtFile:
+        txtFile.write('Jackknife (leave-one-marker-out) incremental slip rates, from common candidates\n')
+        if rateUnits is not None:
+            txtFile.write('Slip rates reported in units of {:s}\n'.format(rateUnits))
+
+        # Acceptance rates
+        txtFile.write('\nDropped marker\tPicks\tCandidates\tAcceptance rate\n')
+        for result in results:
+            nPicks = result['RatePicks'].shape[1]
+            txtFile.write('{:s}\t{:d}\t{:d}\t{:.4f}\n'.format(str(result['dropped']), nPicks,
+                result['nCandidates'], nPicks/max(result['nCandidates'], 1)))
+
+        # Slip rates
+        txtFile.write('\nSlip rates based on PDF analysis ({:s}, {:.2f}% confidence)\n'.\
+            format(analysisMethod, confidence))
+        txtFile.write('Dropped marker\tInterval\tRate\t+\t-\tChange\n')
+        for result, variant in zip(results, variantRates):
+            if result['dropped'] is None: variant = Rates
+            if variant is None:
+                txtFile.write('{:s}\tno feasible histories\n'.format(str(result['dropped'])))
+                continue
+
+            for intvl in variant.keys():
+                value = getattr(variant[intvl], valueName)
+                if Rates is not None and intvl in Rates.keys() and result['dropped'] is not None:
+                    change = '{:+.2f}'.format(value-getattr(Rates[intvl], valueName))
+                else:
+                    change = '-'
+                txtFile.write('{:s}\t{:s}\t{:.2f}\t{:.2f}\t{:.2f}\t{:s}\n'.format(str(result['dropped']), intvl,
+                    value, variant[intvl].upperValue-value, value-variant[intvl].lowerValue, change))
@@ -0,0 +1,398 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Chunked, append-only storage of Monte Carlo picks on disk, such that memory
+ use is bounded by the chunk size rather than the number of picks, and a
+ reservoir of picks for plotting.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import json
+import numpy as np
+
+
+### PICK STORE ---
+class pickStore:
+    '''
+    Age, displacement, and rate picks stored in the directory
+     <name>_PickStore as memory-mappable .npy chunks, one file per kind of
+     pick per chunk, and a JSON index listing the chunks in order. The index
+     also records the minimum and maximum of each row of each chunk, so that
+     the range of values is known without reading the picks.
+    Picks are appended in any number of columns at a time, buffered in
+     memory, and written once the buffer holds chunkSize picks.
+
+    INPUTS
+        name is the head name of the store directory
+        m is the number of markers (required for a new store)
+        chunkSize is the number of picks per chunk
+        mode is 'w' to create a new store, or 'r' to open an existing one
+        kinds is the list of kinds of picks stored (default all)
+        dtype is the floating point type of the stored picks
+    '''
+    kinds = ['Age', 'Dsp', 'Rate']
+
+    def __init__(self, name, m=None, chunkSize=100000, mode='r', kinds=None, dtype='float64'):
+        self.dirName = '{:s}_PickStore'.format(name)
+        self.indexName = os.path.join(self.dirName, 'index.json')
+
+        if mode == 'w':
+            # Create new store
+            if not os.path.exists(self.dirName):
+                os.makedirs(self.dirName)
+
+            if kinds is None: kinds = pickStore.kinds
+            if len(kinds) == 0:
+                print('At least one kind of pick must be stored')
+                exit()
+            self.index = {'m': int(m), 'chunkSize': int(chunkSize), 'kinds': list(kinds),
+                'dtype': np.dtype(dtype).name, 'chunks': []}
+            self.writeIndex()
+
+        elif mode == 'r':
+            # Open existing store
+            if not os.path.exists(self.indexName):
+                print('No pick store found: {:s}'.format(self.dirName))
+                exit()
+
+            with open(self.indexName, 'r') as indexFile:
+                self.index = json.load(indexFile)
+
+        else:
+            print('Choose pick store mode: \'w\'/\'r\'')
+            exit()
+
+        self.m = self.index['m']
+        self.chunkSize = self.index['chunkSize']
+        self.kinds = self.index.get('kinds', pickStore.kinds)
+        self.dtype = self.index.get('dtype', 'float64')
+        self.rows = {'Age': self.m, 'Dsp': self.m, 'Rate': self.m-1}
+
+        # Buffers of picks not yet written
+        self.buffers = None
+        self.nBuffered = 0
+
+    def writeIndex(self):
+        '''
+        Write the index. The file is replaced only once fully written.
+        '''
+        with open(self.indexName+'.tmp', 'w') as indexFile:
+            json.dump(self.index, indexFile)
+        os.replace(self.indexName+'.tmp', self.indexName)
+
+    @property
+    def nPicks(self):
+        '''
+        Number of picks written and buffered.
+        '''
+        return sum([chunk['n'] for chunk in self.index['chunks']]) + self.nBuffered
+
+    def append(self, AgePicks, DspPicks, RatePicks):
+        '''
+        Append (m x n) age and displacement picks and (m-1 x n) rate picks.
+         Picks of kinds not stored may be None.
+        '''
+        if self.buffers is None:
+            self.buffers = {kind: np.empty((self.rows[kind], self.chunkSize), dtype=self.dtype)
+                for kind in self.kinds}
+
+        picks = {'Age': AgePicks, 'Dsp': DspPicks, 'Rate': RatePicks}
+        n = picks[self.kinds[0]].shape[1]
+        start = 0
+        while start < n:
+            # Fill buffers up to chunk size
+            nFill = min(n-start, self.chunkSize-self.nBuffered)
+            for kind in self.kinds:
+                self.buffers[kind][:,self.nBuffered:self.nBuffered+nFill] = picks[kind][:,start:start+nFill]
+            self.nBuffered += nFill
+            start += nFill
+
+            # Write full chunk
+            if self.nBuffered == self.chunkSize:
+                self.flush()
+
+    def flush(self):
+        '''
+        Write the buffered picks as a new chunk and update the index.
+        '''
+        if self.nBuffered == 0:
+            return
+
+        chunkNb = len(self.index['chunks'])
+        chunk = {'n': self.nBuffered, 'files': {}, 'min': {}, 'max': {}}
+        for kind in self.kinds:
+            fname = 'chunk{:05d}_{:s}.npy'.format(chunkNb, kind)
+            picks = self.buffers[kind][:,:self.nBuffered]
+            np.save(os.path.join(self.dirName, fname), picks)
+            chunk['files'][kind] = fname
+            chunk['min'][kind] = picks.min(axis=1).tolist()
+            chunk['max'][kind] = picks.max(axis=1).tolist()
+
+        self.index['chunks'].append(chunk)
+        self.writeIndex()
+        self.nBuffered = 0
+
+    def close(self):
+        '''
+        Write any remaining buffered picks.
+        '''
+        self.flush()
+        self.buffers = None
+
+    def merge(self, stores):
+        '''
+        Append the chunks of other stores, written in subdirectories of this
+         store, to the index of this store, in order.
+        '''
+        for store in stores:
+            subDir = os.path.relpath(store.dirName, self.dirName)
+            for chunk in store.index['chunks']:
+                chunk = dict(chunk)
+                chunk['files'] = {kind: os.path.join(subDir, fname) for kind, fname in chunk['files'].items()}
+                self.index['chunks'].append(chunk)
+
+        self.writeIndex()
+
+    def getState(self):
+        '''
+        Return the number of chunks written and the buffered picks, e.g., for
+         checkpointing.
+        '''
+        buffered = {}
+        if self.buffers is not None:
+            buffered = {kind: self.buffers[kind][:,:self.nBuffered].copy() for kind in self.kinds}
+
+        return {'nChunks': len(self.index['chunks']), 'buffered': buffered}
+
+    def setState(self, state):
+        '''
+        Restore a state returned by getState. Chunks written after the state
+         was recorded are dropped from the index.
+        '''
+        self.index['chunks'] = self.index['chunks'][:state['nChunks']]
+        self.writeIndex()
+
+        self.buffers = None
+        self.nBuffered = 0
+        if len(state['buffered']) > 0:
+            self.append(*[state['buffered'].get(kind) for kind in pickStore.kinds])
+
+    def view(self, kind):
+        '''
+        Return a storedPicks view of one kind of pick, or None if that kind
+         is not stored.
+        '''
+        if kind not in self.kinds:
+            return None
+
+        return storedPicks(self, kind)
+
+
+
+class storedPicks:
+    '''
+    Read-only view of the age, displacement, or rate picks in a pickStore.
+     Chunks are memory-mapped one at a time. Columns can be sliced (e.g.,
+     picks[:,:500]); only the chunks spanning the slice are read.
+    '''
+    def __init__(self, store, kind):
+        self.store = store
+        self.kind = kind
+
+    @property
+    def shape(self):
+        return (self.store.rows[self.kind], self.store.nPicks)
+
+    def chunks(self):
+        '''
+        Iterate over the (rows x n) chunks.
+        '''
+        for chunk in self.store.index['chunks']:
+            yield np.load(os.path.join(self.store.dirName, chunk['files'][self.kind]), mmap_mode='r')
+
+    def rowChunks(self, i):
+        '''
+        Return a function that iterates over the chunks of row i.
+        '''
+        return lambda: (chunk[i] for chunk in self.chunks())
+
+    def range(self, i):
+        '''
+        Minimum and maximum values of row i.
+        '''
+        chunks = self.store.index['chunks']
+        return min([chunk['min'][self.kind][i] for chunk in chunks]), \
+            max([chunk['max'][self.kind][i] for chunk in chunks])
+
+    def __getitem__(self, key):
+        rows, cols = key
+        start, stop, _ = cols.indices(self.shape[1])
+
+        # Read only the chunks spanning the columns
+        picks = []
+        offset = 0
+        for chunk, data in zip(self.store.index['chunks'], self.chunks()):
+            if offset+chunk['n'] > start and offset < stop:
+                picks.append(data[:,max(start-offset, 0):stop-offset])
+            offset += chunk['n']
+
+        if len(picks) == 0:
+            return np.empty((self.shape[0], 0))[rows]
+
+        return np.concatenate(picks, axis=1)[rows]
+
+
+
+### STATISTICS ---
+def streamPercentiles(chunks, vmin, vmax, percentiles, nBins=10000):
+    '''
+    Exact percentiles of values read in chunks, using the same (linear)
+     interpolation as np.percentile. The first pass counts the values in
+     nBins bins between vmin and vmax, to find the bins holding the ranks of
+     the percentiles. The second pass gathers and sorts only the values in
+     those bins. Non-finite values are dropped.
+    INPUTS
+        chunks is a function returning an iterator over 1D arrays of values
+        vmin, vmax are the minimum and maximum values. If either is not
+         finite, the range of the finite values is found in an extra pass.
+        percentiles is a list of percentiles
+    OUTPUTS
+        pct is an array of percentile values
+    '''
+    # Finite values
+    finiteChunks = lambda: (values[np.isfinite(values)] for values in chunks())
+    if not (np.isfinite(vmin) and np.isfinite(vmax)):
+        ranges = [(values.min(), values.max()) for values in finiteChunks() if len(values) > 0]
+        vmin = min([r[0] for r in ranges]); vmax = max([r[1] for r in ranges])
+
+    # Bin of each value
+    binWidth = (vmax-vmin)/nBins if vmax > vmin else 1.0
+    binOf = lambda values: np.clip(((values-vmin)/binWidth).astype(int), 0, nBins-1)
+
+    # First pass - counts per bin
+    counts = np.zeros(nBins, dtype=int)
+    for values in finiteChunks():
+        counts += np.bincount(binOf(values), minlength=nBins)
+    cumCounts = np.cumsum(counts)
+    n = cumCounts[-1]  # number of finite values
+
+    # Ranks needed for interpolation
+    h = (n-1)*np.asarray(percentiles)/100
+    lowerRanks = np.floor(h).astype(int)
+    upperRanks = np.minimum(lowerRanks+1, n-1)
+    ranks = np.unique(np.concatenate([lowerRanks, upperRanks]))
+
+    # Bins holding the ranks
+    rankBins = np.searchsorted(cumCounts, ranks, side='right')
+    neededBins = np.unique(rankBins)
+
+    # Second pass - gather values in the needed bins
+    binValues = {b: [] for b in neededBins}
+    for values in finiteChunks():
+        valueBins = binOf(values)
+        for b in neededBins:
+            binValues[b].append(values[valueBins == b])
+    binValues = {b: np.sort(np.concatenate(binValues[b])) for b in neededBins}
+
+    # Values at the ranks
+    rankValues = {}
+    for rank, b in zip(ranks, rankBins):
+        binStart = cumCounts[b]-counts[b]
+        rankValues[rank] = binValues[b][rank-binStart]
+
+    # Interpolate
+    pct = np.array([rankValues[lo] + (hRank-lo)*(rankValues[hi]-rankValues[lo])
+        for lo, hi, hRank in zip(lowerRanks, upperRanks, h)])
+
+    return pct
+
+
+
+### RESERVOIR ---
+## Entropy word appended to the seed of reservoir streams. Streams spawned
+#  from the seed (see MCresampling.spawnGenerators) keep the entropy of the
+#  seed, so the reservoir stream cannot coincide with any of them.
+reservoirEntropy = 0x72657376
+
+class pickReservoir:
+    '''
+    Uniform random subset of at most size age and displacement picks, kept
+     by reservoir sampling (Vitter, 1985, algorithm R) as picks are
+     recorded, e.g., for plotting. The reservoir has its own random number
+     stream, seeded with the seed and reservoirEntropy, so that it is
+     independent of the sampler stream and of the streams of workers and
+     blocks.
+
+    INPUTS
+        m is the number of markers
+        size is the maximum number of picks kept
+        seedValue is the seed of the sampler, either an integer or an array
+         of integers
+    '''
+    def __init__(self, m, size, seedValue=0):
+        self.m = m
+        self.size = int(size)
+        self.seedValue = seedValue
+        self.rng = np.random.default_rng(np.random.SeedSequence(
+            np.atleast_1d(seedValue).astype(np.int64).tolist()+[reservoirEntropy]))
+        self.AgePicks = np.zeros((m, self.size))
+        self.DspPicks = np.zeros((m, self.size))
+        self.nSeen = 0  # number of picks offered to the reservoir
+
+    def emptyCopy(self, seedValue):
+        '''
+        Return an empty reservoir of the same size with a different seed,
+         e.g., for a worker.
+        '''
+        return pickReservoir(self.m, self.size, seedValue)
+
+    @property
+    def nKept(self):
+        return min(self.nSeen, self.size)
+
+    def update(self, ages, dsps):
+        '''
+        Offer (m x n) age and displacement picks to the reservoir.
+        '''
+        n = ages.shape[1]
+
+        # Fill the reservoir
+        nFill = min(n, max(self.size-self.nSeen, 0))
+        self.AgePicks[:,self.nSeen:self.nSeen+nFill] = ages[:,:nFill]
+        self.DspPicks[:,self.nSeen:self.nSeen+nFill] = dsps[:,:nFill]
+
+        # Replace picks with decreasing probability
+        if nFill < n:
+            positions = self.rng.integers(0, self.nSeen+np.arange(nFill, n)+1)
+            replace = np.flatnonzero(positions < self.size)
+            self.AgePicks[:,positions[replace]] = ages[:,nFill+replace]
+            self.DspPicks[:,positions[replace]] = dsps[:,nFill+replace]
+
+        self.nSeen += n
+
+    def merge(self, reservoirs):
+        '''
+        Combine the reservoirs of disjoint sets of picks (e.g., from workers)
+         into this empty reservoir. The number of picks taken from each is
+         drawn from the multivariate hypergeometric distribution, so that the
+         result is a uniform subset of all picks.
+        '''
+        nSeen = np.array([reservoir.nSeen for reservoir in reservoirs])
+        counts = self.rng.multivariate_hypergeometric(nSeen, min(nSeen.sum(), self.size))
+
+        start = 0
+        for reservoir, count in zip(reservoirs, counts):
+            ndx = self.rng.choice(reservoir.nKept, count, replace=False)
+            self.AgePicks[:,start:start+count] = reservoir.AgePicks[:,ndx]
+            self.DspPicks[:,start:start+count] = reservoir.DspPicks[:,ndx]
+            start += count
+
+        self.nSeen = int(nSeen.sum())
+
+    def picks(self):
+        '''
+        Return the age and displacement picks held in the reservoir.
+        '''
+        return self.AgePicks[:,:self.nKept], self.DspPicks[:,:self.nKept]
@@ -188,14 +188,17 @@ def plotRawData(DspAgeData, figNb, label=False, ageUnits=None, dspUnits=None, ou
 
 
 ## Plot MC results
-def plotMCresults(DspAgeData, AgePicks, DspPicks, figNb, maxPicks=500, ageUnits=None, dspUnits=None, outName=None):
+def plotMCresults(DspAgeData, AgePicks, DspPicks, figNb, maxPicks=500, nTotal=None, ageUnits=None, dspUnits=None,
+    outName=None):
     '''
     Plot valid MC picks in displacement-time space. Draw rectangles representing the 95 %
      confidence bounds using the plotRectangles function.
+    The picks may be a subset (e.g., a pickReservoir) of the nTotal picks sampled.
     '''
 
     # Parameters
     n = AgePicks.shape[1] # number of picks
+    if nTotal is None: nTotal = n
 
     # Plot rectangles
     fig, ax = plotRectangles(DspAgeData)
@@ -223,7 +226,10 @@ def plotMCresults(DspAgeData, AgePicks, DspPicks, figNb, maxPicks=500, ageUnits=
     if dspUnits is not None: yLabel += ' ({:s})'.format(dspUnits)
     ax.set_ylabel(yLabel)
 
-    ax.set_title('MC Picks (N = {:d})'.format(n))
+    if nTotal > n:
+        ax.set_title('MC Picks ({:d} of N = {:d})'.format(n, nTotal))
+    else:
+        ax.set_title('MC Picks (N = {:d})'.format(n))
     fig.tight_layout()
 
     # Save figure
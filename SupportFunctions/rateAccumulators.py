@@ -0,0 +1,259 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Online accumulators of incremental slip rate picks, updated batch by batch as
+ sampling proceeds, from which percentiles and PDFs are computed without
+ storing the picks.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import pickle
+import numpy as np
+from PDFanalysis import smoothFunction
+
+
+### HISTOGRAM ---
+class fixedHistogram:
+    '''
+    Histogram with bin edges fixed at integer multiples of the step size,
+     such that histograms with the same step size can be merged. The range of
+     bins grows as needed.
+    '''
+    def __init__(self, stepSize):
+        self.stepSize = stepSize
+        self.start = 0  # index of first bin (bin k spans k*stepSize to (k+1)*stepSize)
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def extend(self, kMin, kMax):
+        '''
+        Extend the bins to cover bin indices kMin to kMax.
+        '''
+        if len(self.counts) == 0:
+            self.start = kMin
+            self.counts = np.zeros(kMax-kMin+1, dtype=np.int64)
+            return
+
+        stop = self.start+len(self.counts)
+        self.counts = np.pad(self.counts, (max(self.start-kMin, 0), max(kMax+1-stop, 0)), 'constant')
+        self.start = min(self.start, kMin)
+
+    def update(self, values):
+        '''
+        Add an array of values to the histogram.
+        '''
+        values = values[np.isfinite(values)]
+        if len(values) == 0: return
+
+        k = np.floor(values/self.stepSize).astype(np.int64)
+        self.extend(k.min(), k.max())
+        self.counts += np.bincount(k-self.start, minlength=len(self.counts))
+
+    def merge(self, other):
+        '''
+        Add the counts of another histogram with the same step size.
+        '''
+        if other.stepSize != self.stepSize:
+            print('Histograms must have the same step size to be merged')
+            exit()
+        if len(other.counts) == 0: return
+
+        self.extend(other.start, other.start+len(other.counts)-1)
+        self.counts[other.start-self.start:other.start-self.start+len(other.counts)] += other.counts
+
+    @property
+    def edges(self):
+        return (self.start+np.arange(len(self.counts)+1))*self.stepSize
+
+
+
+### QUANTILE SKETCH ---
+class quantileSketch:
+    '''
+    Mergeable quantile sketch with relative accuracy (e.g., Masson et al.,
+     2019, DDSketch). Positive values are counted in logarithmic buckets
+     (gamma^(k-1), gamma^k], where gamma = (1+alpha)/(1-alpha), negative
+     values in the same buckets by magnitude, and zeros separately. Any
+     quantile is returned to within a relative error alpha of the exact
+     value of the same rank.
+    '''
+    def __init__(self, relativeAccuracy=0.0005):
+        self.alpha = relativeAccuracy
+        self.gamma = (1+relativeAccuracy)/(1-relativeAccuracy)
+        self.logGamma = np.log(self.gamma)
+        self.positive = fixedHistogram(1)
+        self.negative = fixedHistogram(1)
+        self.zeros = 0
+        self.n = 0
+
+    def update(self, values):
+        '''
+        Add an array of values to the sketch.
+        '''
+        values = values[np.isfinite(values)]
+        self.n += len(values)
+        self.zeros += np.sum(values == 0)
+        self.positive.update(np.ceil(np.log(values[values > 0])/self.logGamma))
+        self.negative.update(np.ceil(np.log(-values[values < 0])/self.logGamma))
+
+    def merge(self, other):
+        '''
+        Add the counts of another sketch with the same accuracy.
+        '''
+        if other.alpha != self.alpha:
+            print('Sketches must have the same relative accuracy to be merged')
+            exit()
+
+        self.positive.merge(other.positive)
+        self.negative.merge(other.negative)
+        self.zeros += other.zeros
+        self.n += other.n
+
+    def percentiles(self, percentiles):
+        '''
+        Values at the given percentiles, interpolated linearly between the
+         values of adjacent ranks, as for np.percentile.
+        '''
+        # Bucket values and counts in ascending order
+        negValues = -2*self.gamma**(self.negative.start+np.arange(len(self.negative.counts)))/(self.gamma+1)
+        posValues = 2*self.gamma**(self.positive.start+np.arange(len(self.positive.counts)))/(self.gamma+1)
+        values = np.concatenate([negValues[::-1], [0], posValues])
+        cumCounts = np.cumsum(np.concatenate([self.negative.counts[::-1], [self.zeros], self.positive.counts]))
+
+        # Buckets holding the ranks on either side of each percentile
+        ranks = (self.n-1)*np.asarray(percentiles)/100
+        lower = values[np.searchsorted(cumCounts, np.floor(ranks), side='right')]
+        upper = values[np.searchsorted(cumCounts, np.ceil(ranks), side='right')]
+        return lower+(ranks-np.floor(ranks))*(upper-lower)
+
+
+
+### INTERVAL ACCUMULATORS ---
+class rateAccumulators:
+    '''
+    Fixed-edge histogram on the rate step grid, quantile sketch, and moments
+     (count, mean, and sum of squared deviations) of the rate picks of each
+     of m-1 intervals. Accumulators with the same settings can be merged,
+     e.g., across workers and runs.
+    '''
+    def __init__(self, nIntervals, stepSize, relativeAccuracy=0.0005):
+        self.nIntervals = nIntervals
+        self.stepSize = stepSize
+        self.relativeAccuracy = relativeAccuracy
+        self.histograms = [fixedHistogram(stepSize) for i in range(nIntervals)]
+        self.sketches = [quantileSketch(relativeAccuracy) for i in range(nIntervals)]
+        self.n = np.zeros(nIntervals, dtype=np.int64)
+        self.mean = np.zeros(nIntervals)
+        self.M2 = np.zeros(nIntervals)
+
+    @property
+    def shape(self):
+        return (self.nIntervals, int(self.n.max()))
+
+    def emptyCopy(self):
+        '''
+        Return empty accumulators with the same settings, e.g., for a worker.
+        '''
+        return rateAccumulators(self.nIntervals, self.stepSize, self.relativeAccuracy)
+
+    def update(self, RatePicks):
+        '''
+        Add an (m-1 x n) batch of rate picks.
+        '''
+        if RatePicks.shape[1] == 0: return
+
+        for i in range(self.nIntervals):
+            self.histograms[i].update(RatePicks[i])
+            self.sketches[i].update(RatePicks[i])
+
+        # Moments of finite rates, as counted by the histograms and sketches (Chan et al. parallel update)
+        finite = np.isfinite(RatePicks)
+        nBatch = finite.sum(axis=1)
+        meanBatch = np.where(finite, RatePicks, 0).sum(axis=1)/np.maximum(nBatch, 1)
+        M2batch = np.where(finite, (RatePicks-meanBatch[:,np.newaxis])**2, 0).sum(axis=1)
+        self.combineMoments(nBatch, meanBatch, M2batch)
+
+    def combineMoments(self, nOther, meanOther, M2other):
+        nTotal = self.n+nOther
+        weight = nOther/np.maximum(nTotal, 1)
+        delta = meanOther-self.mean
+        self.mean = self.mean + delta*weight
+        self.M2 = self.M2 + M2other + delta**2*self.n*weight
+        self.n = nTotal
+
+    def merge(self, other):
+        '''
+        Add the contents of other accumulators with the same settings.
+        '''
+        if other.nIntervals != self.nIntervals:
+            print('Accumulators must have the same number of intervals to be merged')
+            exit()
+
+        for i in range(self.nIntervals):
+            self.histograms[i].merge(other.histograms[i])
+            self.sketches[i].merge(other.sketches[i])
+
+        if other.n.max() > 0:
+            self.combineMoments(other.n, other.mean, other.M2)
+
+    def percentiles(self, i, percentiles):
+        '''
+        Percentiles of the rates of interval i, from the quantile sketch.
+        '''
+        return self.sketches[i].percentiles(percentiles)
+
+    def PDF(self, i, method, smoothingKernel=None, kernelWidth=2):
+        '''
+        PDF of the rates of interval i, from the histogram (as in arrayHist),
+         or as a KDE with Scott's rule bandwidth (as in gaussian_kde) built
+         from kernels centered on the histogram bins.
+        '''
+        edges = self.histograms[i].edges
+        counts = self.histograms[i].counts
+        cntrs = (edges[:-1]+edges[1:])/2
+
+        # Use histogram method
+        if method.lower() in ['hist', 'histogram']:
+            # Taper histogram edges
+            x = np.pad(cntrs, (1,1), 'constant', constant_values=(edges[0], edges[-1]))
+            px = np.pad(counts.astype(float), (1,1), 'constant')
+
+        # Use kernel density method
+        elif method.lower() in ['kde', 'kernel']:
+            bandwidth = np.sqrt(self.M2[i]/(self.n[i]-1))*self.n[i]**(-1/5)
+            x = np.arange(edges[0], edges[-1]+self.stepSize, self.stepSize)
+            px = np.zeros(len(x))
+            for start in range(0, len(x), 1000):
+                xBlock = x[start:start+1000]
+                kernels = np.exp(-0.5*((xBlock[:,np.newaxis]-cntrs)/bandwidth)**2)
+                px[start:start+1000] = kernels.dot(counts)
+            px[0] = 0; px[-1] = 0  # set to zero at edges
+
+        else:
+            print('Choose PDF conversion method: \'histogram\'/\'kde\'')
+            exit()
+
+        # Smooth if requested
+        if smoothingKernel:
+            px = smoothFunction(px, smoothingKernel, kernelWidth)
+
+        # Normalize area to 1.0
+        px = px/np.trapz(px, x)
+
+        return x, px
+
+    def save(self, outName):
+        '''
+        Save the accumulators to <outName>_Accumulators.pkl.
+        '''
+        with open('{:s}_Accumulators.pkl'.format(outName), 'wb') as accFile:
+            pickle.dump(self, accFile, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loadAccumulators(fname):
+    '''
+    Load accumulators saved with rateAccumulators.save, e.g., to merge the
+     results of several runs.
+    '''
+    with open(fname, 'rb') as accFile:
+        return pickle.load(accFile)
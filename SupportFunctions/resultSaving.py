@@ -37,23 +37,24 @@ def confirmOutputDir(outName, verbose=False):
 
 ### TEXTFILE FUNCTIONS ---
 class slipRateTxtFile:
-    def __init__(self, outName, scheme):
+    def __init__(self, outName, scheme, start=True):
         '''
         Create a text file describing the results of incremental slip rate
-         computations.
+         computations. If start is False, text is appended to the existing
+         file.
         '''
         self.outName = outName
         self.scheme = scheme
 
-        self.__startFile__()
+        # Construct filename
+        self.txtName = '{:s}_Slip_Rate_Report.txt'.format(self.outName)
+
+        if start == True: self.__startFile__()
 
     def __startFile__(self):
         '''
         Ascribe the basic parameters to the text file.
         '''
-        # Construct filename
-        self.txtName = '{:s}_Slip_Rate_Report.txt'.format(self.outName)
-
         # Output string
         openingReport = 'Incremental slip rate based on {:s} ({:s})\n\n'
 
@@ -0,0 +1,460 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Registry of sampling engines used to compute incremental slip rates, with
+ cost-based automatic selection of the engine.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import time
+import numpy as np
+from rateAccumulators import rateAccumulators
+from pickStore import pickReservoir
+from constraints import rateConstraints, loadConstraints, parseConstraints
+from MCresampling import MCMCresample, parallelResample, samplerSettings, SISresample, GibbsResample, \
+    findMarkerBlocks, blockwiseResample, pilotRun, reportPilot, sequentialMarkers, uniformSampler, replayLog, \
+    randomGenerator, savePicks, savePool, loadPool, filterPool
+
+
+### ENGINE REGISTRY ---
+# Every engine is a function with the signature
+#  engine(DspAgeData, args, txtFile)
+#  where args come directly from argparse. Random numbers are drawn from a
+#  np.random.Generator created from args.seed and args.bitGenerator (see
+#  randomGenerator). Engines return a dictionary
+#  with either the entries 'AgePicks', 'DspPicks', and 'RatePicks', or the
+#  entry 'Rates', a dictionary of incrSlipRate objects with rate PDFs.
+#  Engines that update rateAccumulators during sampling also return them as
+#  'Accumulators', in which case the picks may be None. Engines that keep a
+#  pickReservoir for plotting return it as 'Reservoir', and engines that count
+#  the candidates evaluated return the dictionary of 'Counters' (see
+#  MCMCresample). Engines that do not support rate constraints (see
+#  engineConstraints) exit if any are declared.
+engines = {}
+
+def registerEngine(name, engine):
+    '''
+    Add a sampling engine to the registry under the given name.
+    '''
+    engines[name.lower()] = engine
+
+
+## Default block size for vectorized engines
+defaultBlockSize = 10000
+
+
+## Rate constraints
+def engineConstraints(DspAgeData, args):
+    '''
+    Rate constraints declared in the data file and on the command line, as a
+     rateConstraints instance, or None if there are none.
+    '''
+    constraints = loadConstraints(args.dataFile) + parseConstraints(args.constraints)
+    if len(constraints) == 0:
+        return None
+
+    return rateConstraints(constraints, len(DspAgeData.keys()))
+
+
+def reportConstraints(constraints, txtFile):
+    '''
+    Write the rate constraints (if any) to the text file.
+    '''
+    if constraints is None: return
+
+    txtFile.append('\nRate constraints:\n')
+    for description in constraints.describe():
+        txtFile.append('\t{:s}\n'.format(description))
+
+
+
+### ENGINES ---
+def rejectionEngine(DspAgeData, args, txtFile):
+    '''
+    Rejection sampling using MCMCresample. Candidates are drawn one at a
+     time unless a block size is specified.
+    '''
+    return rejectionSampling(DspAgeData, args, txtFile, blockSize=args.blockSize)
+
+
+def vectorizedEngine(DspAgeData, args, txtFile):
+    '''
+    Rejection sampling using MCMCresample in block mode.
+    '''
+    blockSize = args.blockSize if args.blockSize is not None else defaultBlockSize
+
+    return rejectionSampling(DspAgeData, args, txtFile, blockSize=blockSize)
+
+
+def rejectionSampling(DspAgeData, args, txtFile, blockSize):
+    '''
+    Run a pilot (if requested), then rejection sampling, either for all
+     markers at once, split across multiple workers, or by independent
+     blocks of markers.
+    '''
+    # Rate constraints
+    constraints = engineConstraints(DspAgeData, args)
+    reportConstraints(constraints, txtFile)
+
+    # Sample a candidate pool, then apply the max rate and constraints to it
+    if args.savePool == True:
+        return poolSampling(DspAgeData, args, txtFile, blockSize, constraints)
+
+    # Kinds of picks kept in memory or in the pick store
+    keep = parseKeep(args.keep)
+    if 'Rate' not in keep and args.onlineStats == False:
+        print('Rate picks must be kept unless online statistics are used')
+        exit()
+    keepPicks = [] if args.onlineStats == True and args.pickStore == False else keep
+    pickType = 'float32' if args.float32 == True else 'float64'
+
+    # Sampler options
+    settings = samplerSettings(
+        blockSize=blockSize,
+        prune=args.prune,
+        sampler=args.sampler,
+        tolerance=args.mcTolerance, confidence=args.rateConfidence,
+        timeBudget=args.timeBudget,
+        checkpointInterval=args.checkpointInterval, resume=args.resume,
+        storeName=args.outName if args.pickStore == True else None, chunkSize=args.chunkSize,
+        keepPicks=keepPicks, pickType=pickType,
+        constraints=constraints)
+
+    # Estimate acceptance rate and run time
+    if args.pilot == True:
+        pilot = pilotRun(DspAgeData, args.Nsamples,
+            maxRate=args.maxRate, bound=args.MCbound,
+            pilotSize=args.pilotSize,
+            workers=args.workers,
+            seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+            settings=settings.copy(timeBudget=None if args.MCbound is not None else args.timeBudget))
+        reportPilot(pilot, txtFile, verbose=args.verbose)
+
+    # Online accumulators, in place of picks held in memory
+    accumulators = None
+    if args.onlineStats == True:
+        accumulators = rateAccumulators(len(DspAgeData.keys())-1, args.rateStep, args.sketchAccuracy)
+
+    # Uniform subset of picks for plotting
+    reservoir = pickReservoir(len(DspAgeData.keys()), args.maxPicks2plot, seedValue=args.seed)
+
+    # Generator states and accepted candidates, in place of saved picks
+    replay = None
+    if args.seedReplay == True:
+        replay = replayLog(DspAgeData.keys(), maxRate=args.maxRate, prune=args.prune, sampler=args.sampler,
+            dataFile=args.dataFile)
+
+    # Numbers of picks and candidates (not counted with block decomposition)
+    counters = {} if args.decompose == False else None
+
+    startTime = time.time()  # start clock
+
+    if args.decompose == True and args.pickStore == True:
+        print('Pick store cannot be used with block decomposition')
+        exit()
+
+    if args.decompose == True and args.seedReplay == True:
+        print('Seed replay cannot be used with block decomposition')
+        exit()
+
+    if args.decompose == True and constraints is not None:
+        print('Rate constraints cannot be used with block decomposition')
+        exit()
+
+    if args.decompose == True and args.mcTolerance is not None:
+        print('Convergence tolerance cannot be used with block decomposition')
+        exit()
+
+    if args.decompose == True:
+        # Split markers into independent blocks
+        blocks = findMarkerBlocks(DspAgeData, maxRate=args.maxRate)
+        txtFile.append('\nMarkers sampled in {:d} independent blocks:\n'.format(len(blocks)))
+        for block in blocks:
+            txtFile.append('{:s}\n'.format(', '.join(block)))
+
+        AgePicks, DspPicks, RatePicks = blockwiseResample(DspAgeData,
+            Nsamples=args.Nsamples, blocks=blocks,
+            maxRate=args.maxRate, bound=args.MCbound,
+            seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+            settings=settings,
+            accumulators=accumulators, reservoir=reservoir,
+            workers=args.workers,
+            verbose=args.verbose,
+            outName=args.outName)
+    elif args.workers > 1:
+        # Split sampling across multiple processes
+        AgePicks, DspPicks, RatePicks = parallelResample(DspAgeData,
+            Nsamples=args.Nsamples, workers=args.workers, condition='standard',
+            maxRate=args.maxRate, bound=args.MCbound,
+            seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+            settings=settings,
+            accumulators=accumulators, reservoir=reservoir, replay=replay, counters=counters,
+            verbose=args.verbose,
+            outName=args.outName)
+    else:
+        AgePicks, DspPicks, RatePicks = MCMCresample(DspAgeData,
+            Nsamples=args.Nsamples, condition='standard',
+            maxRate=args.maxRate, bound=args.MCbound,
+            seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+            settings=settings,
+            accumulators=accumulators, reservoir=reservoir, replay=replay, counters=counters,
+            verbose=args.verbose,
+            outName=args.outName)
+
+    # Record achieved sample count and throughput
+    if args.timeBudget is not None:
+        elapsed = time.time()-startTime
+        nPicks = RatePicks.shape[1] if RatePicks is not None else accumulators.shape[1]
+        txtFile.append('\nTime-budgeted sampling ({:.1f} s budget): {:d} picks in {:.1f} s ({:.0f} picks/s)\n'.\
+            format(args.timeBudget, nPicks, elapsed, nPicks/max(elapsed, 1E-9)))
+
+    # Save replay log
+    if replay is not None:
+        replay.save(args.outName)
+        txtFile.append('\nPicks not saved; regenerate from {:s}_Replay.pkl with regeneratePicks\n'.\
+            format(args.outName))
+
+    results = {'AgePicks': AgePicks, 'DspPicks': DspPicks, 'RatePicks': RatePicks, 'Reservoir': reservoir}
+    if accumulators is not None:
+        results['Accumulators'] = accumulators
+    if counters is not None:
+        results['Counters'] = counters
+
+    return results
+
+
+def poolSampling(DspAgeData, args, txtFile, blockSize, constraints):
+    '''
+    Rejection sampling of a pool of -n candidates that satisfy the standard
+     condition only, saved to <outName>_Pool.npz (see savePool). The max rate
+     and rate constraints are then applied to the pool, as with --from-pool,
+     such that stricter values can later be tested without sampling again.
+    '''
+    for option, name in [(args.pickStore, 'Pick store'), (args.seedReplay, 'Seed replay'),
+            (args.decompose, 'Block decomposition'), (args.onlineStats, 'Online statistics'),
+            (args.mcTolerance is not None, 'Convergence tolerance')]:
+        if option == True:
+            print('{:s} cannot be used with a candidate pool'.format(name))
+            exit()
+
+    pickType = 'float32' if args.float32 == True else 'float64'
+
+    # Sample pool without max rate and constraints
+    settings = samplerSettings(
+        blockSize=blockSize,
+        prune=args.prune,
+        sampler=args.sampler,
+        timeBudget=args.timeBudget,
+        checkpointName=args.outName, checkpointInterval=args.checkpointInterval, resume=args.resume,
+        keepPicks=['Age', 'Dsp'], pickType=pickType)
+    samplingArgs = dict(Nsamples=args.Nsamples, condition='standard',
+        maxRate=None, bound=args.MCbound,
+        seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+        settings=settings,
+        verbose=args.verbose)
+    if args.workers > 1:
+        AgePicks, DspPicks, _ = parallelResample(DspAgeData, workers=args.workers, **samplingArgs)
+    else:
+        AgePicks, DspPicks, _ = MCMCresample(DspAgeData, **samplingArgs)
+
+    savePool(args.outName, DspAgeData, AgePicks, DspPicks, dataFile=args.dataFile)
+    txtFile.append('\nCandidate pool saved to {:s}_Pool.npz\n'.format(args.outName))
+
+    return poolResults(AgePicks, DspPicks, args, txtFile, constraints)
+
+
+def poolResults(AgePicks, DspPicks, args, txtFile, constraints):
+    '''
+    Apply the max rate and rate constraints to the candidates of a pool,
+     report the fraction accepted, and save the accepted picks.
+    '''
+    nPool = AgePicks.shape[1]
+    AgePicks, DspPicks, RatePicks = filterPool(AgePicks, DspPicks, maxRate=args.maxRate, constraints=constraints,
+        chunkSize=args.chunkSize)
+    nPicks = RatePicks.shape[1]
+
+    poolStr = 'Candidate pool: {:d} of {:d} candidates ({:.1f} %) accepted with max rate {}\n'.\
+        format(nPicks, nPool, 100*nPicks/max(nPool, 1), args.maxRate)
+    if args.verbose == True:
+        print('*'*32)
+        print(poolStr, end='')
+    txtFile.append('\n'+poolStr)
+
+    if nPicks == 0:
+        print('No candidates of the pool satisfy the max rate and rate constraints')
+        exit()
+
+    savePicks(args.outName, AgePicks, DspPicks, RatePicks)
+
+    return {'AgePicks': AgePicks, 'DspPicks': DspPicks, 'RatePicks': RatePicks}
+
+
+def parseKeep(keep):
+    '''
+    Convert a comma-separated list of the picks to keep (ages, dsps, rates)
+     into a list of the kinds of picks 'Age', 'Dsp', and 'Rate'.
+    '''
+    kinds = {'ages': 'Age', 'dsps': 'Dsp', 'rates': 'Rate'}
+
+    keep = [name.strip().lower() for name in keep.split(',') if name.strip() != '']
+    for name in keep:
+        if name not in kinds.keys():
+            print('Choose picks to keep from: ages, dsps, rates')
+            exit()
+
+    return [kinds[name] for name in keep]
+
+
+def sequentialEngine(DspAgeData, args, txtFile):
+    '''
+    Sequential importance sampling using SISresample. Histories that violate
+     the rate constraints are given zero weight.
+    '''
+    constraints = engineConstraints(DspAgeData, args)
+    reportConstraints(constraints, txtFile)
+
+    AgePicks, DspPicks, RatePicks = SISresample(DspAgeData,
+        Nsamples=args.Nsamples,
+        maxRate=args.maxRate, Nhistories=args.MCbound,
+        seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+        constraints=constraints,
+        blockSize=args.blockSize,
+        verbose=args.verbose,
+        outName=args.outName)
+
+    return {'AgePicks': AgePicks, 'DspPicks': DspPicks, 'RatePicks': RatePicks}
+
+
+def poolEngine(DspAgeData, args, txtFile):
+    '''
+    Rejection against a candidate pool saved with --save-pool, instead of
+     the priors, using the max rate and rate constraints of this run (see
+     filterPool). Selected when --from-pool is given.
+    '''
+    if args.fromPool is None:
+        print('Specify the candidate pool file with --from-pool')
+        exit()
+
+    constraints = engineConstraints(DspAgeData, args)
+    reportConstraints(constraints, txtFile)
+
+    AgePicks, DspPicks = loadPool(args.fromPool, DspAgeData, dataFile=args.dataFile)
+    txtFile.append('\nPicks drawn from candidate pool {:s}\n'.format(args.fromPool))
+
+    return poolResults(AgePicks, DspPicks, args, txtFile, constraints)
+
+
+def GibbsEngine(DspAgeData, args, txtFile):
+    '''
+    Gibbs sampling using GibbsResample. Rate constraints are not supported.
+    '''
+    if engineConstraints(DspAgeData, args) is not None:
+        print('Rate constraints are not supported by the Gibbs engine')
+        exit()
+
+    AgePicks, DspPicks, RatePicks = GibbsResample(DspAgeData,
+        Nsamples=args.Nsamples,
+        maxRate=args.maxRate,
+        Nchains=args.Nchains, burnIn=args.burnIn, thin=args.thin,
+        seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+        verbose=args.verbose,
+        outName=args.outName)
+
+    return {'AgePicks': AgePicks, 'DspPicks': DspPicks, 'RatePicks': RatePicks}
+
+
+def gridEngine(DspAgeData, args, txtFile):
+    '''
+    Analytical formulation evaluated on a grid of rate values. Exact only if
+     no pair of adjacent markers can violate the standard condition. Rate
+     constraints are not supported.
+    '''
+    if engineConstraints(DspAgeData, args) is not None:
+        print('Rate constraints are not supported by the grid engine')
+        exit()
+
+    from analyticalSlipRates import analyticalSlipRates
+
+    Rates = analyticalSlipRates(DspAgeData,
+        stepSize=args.rateStep, maxRate=args.maxRate,
+        verbose=args.verbose, printDetails=args.xtrVerbose)
+
+    return {'Rates': Rates}
+
+
+## Register engines
+registerEngine('rejection', rejectionEngine)
+registerEngine('vectorized', vectorizedEngine)
+registerEngine('sequential', sequentialEngine)
+registerEngine('gibbs', GibbsEngine)
+registerEngine('grid', gridEngine)
+registerEngine('pool', poolEngine)
+
+
+
+### AUTOMATIC SELECTION ---
+def selectEngine(DspAgeData, args, txtFile=None, pilotSize=2000, minAcceptance=0.01, minESSfraction=0.1):
+    '''
+    Choose the cheapest engine for the data set, based on the number of
+     markers and their measured overlap:
+        grid - no adjacent markers overlap, so the analytical formulation
+         is exact
+        vectorized - the rejection acceptance rate measured by a pilot run
+         is at least minAcceptance
+        sequential - the effective sample size of a pilot set of sequential
+         histories is at least minESSfraction of the number drawn
+        gibbs - otherwise, since the cost per pick does not grow with the
+         number of overlapping markers
+    If rate constraints are declared, only the engines that support them
+     (vectorized and sequential) are considered.
+    Returns the name of the selected engine.
+    '''
+    m = len(DspAgeData.keys())  # number of measurements
+    constraints = engineConstraints(DspAgeData, args)
+
+    # Overlapping markers
+    blocks = findMarkerBlocks(DspAgeData, maxRate=args.maxRate)
+    largestBlock = max([len(block) for block in blocks])
+
+    # Pilot rejection sampling
+    pilot = pilotRun(DspAgeData, args.Nsamples, maxRate=args.maxRate, bound=args.MCbound,
+        pilotSize=pilotSize, seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+        settings=samplerSettings(blockSize=pilotSize, prune=args.prune, constraints=constraints))
+
+    # Pilot sequential sampling
+    maxRate = args.maxRate if args.maxRate is not None else np.Inf
+    a_rand, d_rand = uniformSampler(m, rng=randomGenerator(args.seed, args.bitGenerator)).draw(pilotSize)
+    _, _, logWeights = sequentialMarkers(DspAgeData, a_rand, d_rand, maxRate)
+    if np.isfinite(logWeights.max()):
+        weights = np.exp(logWeights-logWeights.max())
+        ESSfraction = weights.sum()**2/np.sum(weights**2)/pilotSize
+    else:
+        ESSfraction = 0
+
+    # Select engine
+    if largestBlock == 1 and constraints is None:
+        engineName = 'grid'
+    elif pilot['acceptanceRate'] >= minAcceptance:
+        engineName = 'vectorized'
+    elif ESSfraction >= minESSfraction:
+        engineName = 'sequential'
+    elif constraints is not None:
+        engineName = 'vectorized'
+    else:
+        engineName = 'gibbs'
+
+    # Report
+    selectStr = 'Automatic engine selection: {:s}\n'.format(engineName)
+    selectStr += '\t{:d} markers; largest overlapping block: {:d} markers\n'.format(m, largestBlock)
+    selectStr += '\trejection acceptance rate: {:.4f}\n'.format(pilot['acceptanceRate'])
+    selectStr += '\tsequential effective sample fraction: {:.4f}\n'.format(ESSfraction)
+
+    if args.verbose == True:
+        print('*'*32)
+        print(selectStr, end='')
+
+    if txtFile is not None:
+        txtFile.append('\n'+selectStr)
+
+    return engineName
@@ -0,0 +1,276 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Comparison of alternative marker correlations (scenarios), each given as a
+ YAML data file, using common random numbers. Each distinct age and
+ displacement PDF file is sampled once per candidate, with the same uniform
+ random numbers shared by every scenario, and the condition of each scenario
+ is evaluated on the shared candidate arrays. Differences between scenarios
+ are then not blurred by independent sampling noise, and the cost grows with
+ the number of distinct PDFs rather than with the number of scenarios.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import numpy as np
+from dataLoading import loadDspAgeInputs
+from constraints import rateConstraints, loadConstraints, parseConstraints
+from MCresampling import standardCondition, feasibleBounds, randomGenerator
+
+
+### LOADING ---
+def loadScenarios(fnames, constraintStrs=None, verbose=False):
+    '''
+    Load the markers and rate constraints of each scenario data file.
+     Constraints given as strings (e.g., on the command line) apply to all
+     scenarios.
+    Returns the list of scenario names (file names without extension, made
+     unique), the list of DspAgeData dictionaries, and the list of
+     rateConstraints instances (None where there are no constraints).
+    '''
+    names = []
+    scenarios = []
+    constraints = []
+    for fname in fnames:
+        # Unique name
+        name = os.path.basename(fname).split('.')[0]
+        if name in names:
+            name = '{:s}{:d}'.format(name, len(names))
+        names.append(name)
+
+        # Markers
+        DspAgeData = loadDspAgeInputs(fname, verbose=verbose)
+        scenarios.append(DspAgeData)
+
+        # Constraints
+        scenarioConstraints = loadConstraints(fname) + parseConstraints(constraintStrs)
+        if len(scenarioConstraints) > 0:
+            constraints.append(rateConstraints(scenarioConstraints, len(DspAgeData.keys())))
+        else:
+            constraints.append(None)
+
+    return names, scenarios, constraints
+
+
+def scenarioRows(scenarios):
+    '''
+    Assign a row of shared random draws to each distinct age and displacement
+     PDF file used by the scenarios. A file used by k markers of the same
+     scenario is given k rows, so that those markers are still drawn
+     independently.
+    Returns the lists of the age and displacement datums of the rows, and for
+     each scenario, the arrays of the age and displacement rows of its
+     markers.
+    '''
+    rows = {'Age': {}, 'Dsp': {}}
+    datums = {'Age': [], 'Dsp': []}
+    fileKeys = {'Age': 'ageFile', 'Dsp': 'dspFile'}
+    ageRows = []
+    dspRows = []
+
+    for DspAgeData in scenarios:
+        markerRows = {'Age': [], 'Dsp': []}
+        uses = {}  # number of uses of each file within the scenario
+        for datumName in DspAgeData.keys():
+            for kind in ['Age', 'Dsp']:
+                fname = os.path.abspath(DspAgeData[datumName][fileKeys[kind]])
+                key = (fname, uses.get((kind, fname), 0))
+                uses[(kind, fname)] = key[1]+1
+
+                if key not in rows[kind].keys():
+                    rows[kind][key] = len(datums[kind])
+                    datums[kind].append(DspAgeData[datumName][kind])
+                markerRows[kind].append(rows[kind][key])
+
+        ageRows.append(np.array(markerRows['Age']))
+        dspRows.append(np.array(markerRows['Dsp']))
+
+    return datums['Age'], datums['Dsp'], ageRows, dspRows
+
+
+
+### SAMPLING ---
+def scenarioResample(scenarios, Nsamples, maxRate=None, bound=None, blockSize=10000, constraints=None,
+    seedValue=0, rng=None, verbose=False):
+    '''
+    Rejection sampling of several scenarios with common random numbers.
+     Candidates are drawn in blocks; for each block, the inverse CDF of each
+     distinct PDF file is evaluated once, and the standard condition, max
+     rate, and constraints of each scenario are evaluated on the markers of
+     that scenario. Each scenario keeps its first Nsamples accepted
+     candidates.
+    A scenario whose marker PDFs cannot satisfy the standard condition (see
+     feasibleBounds) is not sampled. The other scenarios are sampled until
+     filled or until the bound is reached, however low their acceptance
+     rate. Scenarios without accepted candidates (no feasible histories)
+     are returned with empty pick arrays.
+
+    INPUTS
+        scenarios is a list of DspAgeData dictionaries
+        Nsamples is the number of picks of each scenario
+        maxRate is the maximum slip rate to be considered
+        bound is the maximum number of candidates drawn. If unspecified, the
+         default value is four times the desired number of samples.
+        blockSize is the number of candidates drawn at once
+        constraints is a list of rateConstraints instances (or None), one
+         per scenario
+        seedValue, rng are as for MCMCresample
+    OUTPUTS
+        results is a list of dictionaries, one per scenario, with the
+         entries 'AgePicks', 'DspPicks', 'RatePicks', and 'nCandidates',
+         the number of candidates evaluated for the scenario
+    '''
+    ## Setup
+    if verbose == True:
+        print('*'*32)
+        print('Sampling {:d} scenarios with common random numbers'.format(len(scenarios)))
+
+    Nsamples = int(Nsamples)
+    blockSize = int(blockSize)
+    if maxRate is None: maxRate = np.Inf
+    if bound is None: bound = 4*Nsamples
+    if constraints is None: constraints = [None]*len(scenarios)
+    if rng is None: rng = randomGenerator(seedValue)
+
+    # Shared rows of random draws
+    ageData, dspData, ageRows, dspRows = scenarioRows(scenarios)
+    if verbose == True:
+        print('\t{:d} distinct age PDFs, {:d} distinct displacement PDFs'.format(len(ageData), len(dspData)))
+
+    S = len(scenarios)
+    picks = [{'Age': [], 'Dsp': [], 'Rate': []} for s in range(S)]
+    successes = np.zeros(S, dtype=int)
+    nCandidates = np.zeros(S, dtype=int)
+
+    # Scenarios that cannot satisfy the standard condition
+    feasible = np.zeros(S, dtype=bool)
+    for s in range(S):
+        minAge, maxAge, minDsp, maxDsp = feasibleBounds(scenarios[s], maxRate)
+        feasible[s] = np.all(minAge <= maxAge) and np.all(minDsp <= maxDsp)
+
+
+    ## Monte Carlo sampling
+    drawn = 0  # candidates drawn
+    while np.any(feasible & (successes < Nsamples)) and drawn < bound:
+        n = min(blockSize, bound-drawn)
+
+        # Inverse CDFs of distinct PDFs
+        a_rand = rng.random((len(ageData), n))
+        d_rand = rng.random((len(dspData), n))
+        ages = np.array([Age.InvCDF(a_rand[i]) for i, Age in enumerate(ageData)])
+        dsps = np.array([Dsp.InvCDF(d_rand[i]) for i, Dsp in enumerate(dspData)])
+        drawn += n
+
+        # Conditions of each scenario
+        for s in range(S):
+            if feasible[s] == False or successes[s] >= Nsamples: continue
+
+            randAges = ages[ageRows[s]]
+            randDsps = dsps[dspRows[s]]
+            ageDiffs = np.diff(randAges, axis=0)
+            dspDiffs = np.diff(randDsps, axis=0)
+
+            valid = standardCondition(ageDiffs, dspDiffs)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rates = dspDiffs/ageDiffs
+                valid &= ~np.any(rates > maxRate, axis=0)
+            if constraints[s] is not None:
+                valid &= constraints[s].mask(randAges, randDsps, rates)
+
+            # Keep up to Nsamples picks
+            accepted = np.flatnonzero(valid)[:Nsamples-successes[s]]
+            picks[s]['Age'].append(randAges[:,accepted])
+            picks[s]['Dsp'].append(randDsps[:,accepted])
+            picks[s]['Rate'].append(rates[:,accepted])
+            successes[s] += len(accepted)
+            nCandidates[s] += accepted[-1]+1 if successes[s] == Nsamples else n
+
+        if verbose == True:
+            print('{:d} candidates; picks: {:s}'.format(drawn, ', '.join([str(nPicks) for nPicks in successes])))
+
+
+    ## Finishing
+    for s in np.flatnonzero(~feasible):
+        print('WARNING! No feasible histories for scenario {:d}: the marker PDFs cannot satisfy the standard '
+            'condition.'.format(s))
+    for s in np.flatnonzero(feasible & (successes == 0)):
+        print('WARNING! No feasible histories for scenario {:d} in {:d} candidates.'.format(s, nCandidates[s]))
+    for s in np.flatnonzero((successes > 0) & (successes < Nsamples)):
+        print('WARNING! Maximum sample limit exceeded ({:d}) for scenario {:d}; {:d} picks.'.\
+            format(bound, s, successes[s]))
+
+    results = []
+    for s in range(S):
+        # Empty picks of scenarios not sampled
+        m = len(scenarios[s].keys())
+        if len(picks[s]['Age']) == 0:
+            picks[s] = {'Age': [np.zeros((m, 0))], 'Dsp': [np.zeros((m, 0))], 'Rate': [np.zeros((m-1, 0))]}
+
+        results.append({'AgePicks': np.concatenate(picks[s]['Age'], axis=1),
+            'DspPicks': np.concatenate(picks[s]['Dsp'], axis=1),
+            'RatePicks': np.concatenate(picks[s]['Rate'], axis=1),
+            'nCandidates': int(nCandidates[s])})
+
+    return results
+
+
+
+### REPORTING ---
+def reportScenarios(names, scenarioRates, results, outName, analysisMethod='IQR', confidence=68.27, rateUnits=None):
+    '''
+    Write a table comparing the scenarios to <outName>_Scenario_Report.txt:
+     the acceptance rate of each scenario, the slip rate of each interval,
+     and for the intervals shared with the first scenario, the difference of
+     the median rate picks from those of the first scenario.
+    Scenarios without picks (scenarioRates entry None) are marked as having
+     no feasible histories.
+    '''
+    txtName = '{:s}_Scenario_Report.txt'.format(outName)
+    level = (100-confidence)/2
+
+    with open(txtName, 'w') as txtFile:
+        txtFile.write('Incremental slip rates of {:d} scenarios sampled with common random numbers\n'.\
+            format(len(names)))
+        if rateUnits is not None:
+            txtFile.write('Slip rates reported in units of {:s}\n'.format(rateUnits))
+
+        # Acceptance rates
+        txtFile.write('\nScenario\tPicks\tCandidates\tAcceptance rate\n')
+        for name, result in zip(names, results):
+            nPicks = result['RatePicks'].shape[1]
+            txtFile.write('{:s}\t{:d}\t{:d}\t{:.4f}\n'.format(name, nPicks, result['nCandidates'],
+                nPicks/max(result['nCandidates'], 1)))
+
+        # Slip rates from PDF analysis
+        txtFile.write('\nSlip rates based on PDF analysis ({:s}, {:.2f}% confidence)\n'.\
+            format(analysisMethod, confidence))
+        txtFile.write('Scenario\tInterval\tRate\t+\t-\n')
+        for name, Rates in zip(names, scenarioRates):
+            if Rates is None:
+                txtFile.write('{:s}\tno feasible histories\n'.format(name))
+                continue
+            for intvl in Rates.keys():
+                Rate = Rates[intvl]
+                value = Rate.median if analysisMethod.upper() in ['IQR'] else Rate.mode
+                txtFile.write('{:s}\t{:s}\t{:.2f}\t{:.2f}\t{:.2f}\n'.format(name, intvl, value,
+                    Rate.upperValue-value, value-Rate.lowerValue))
+
+        # Differences from the first scenario
+        txtFile.write('\nDifferences of rate picks from scenario {:s} (percentiles {:.2f}, 50, {:.2f})\n'.\
+            format(names[0], level, 100-level))
+        if scenarioRates[0] is None:
+            txtFile.write('{:s}\tno feasible histories\n'.format(names[0]))
+            return
+        txtFile.write('Scenario\tInterval\tLower\tMedian\tUpper\n')
+        baseIntervals = list(scenarioRates[0].keys())
+        for s in range(1, len(names)):
+            if scenarioRates[s] is None:
+                txtFile.write('{:s}\tno feasible histories\n'.format(names[s]))
+                continue
+            for k, intvl in enumerate(scenarioRates[s].keys()):
+                if intvl not in baseIntervals: continue
+                base = np.percentile(results[0]['RatePicks'][baseIntervals.index(intvl)], [level, 50, 100-level])
+                scenario = np.percentile(results[s]['RatePicks'][k], [level, 50, 100-level])
+                txtFile.write('{:s}\t{:s}\t{:+.3f}\t{:+.3f}\t{:+.3f}\n'.format(names[s], intvl,
+                    *(scenario-base)))
@@ -0,0 +1,281 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Sharding of large Monte Carlo runs across independent jobs, e.g., on the
+ nodes of a cluster, coordinated only through a shared file system. Shard i
+ of N samples its share of the picks with a random number stream spawned
+ from the seed sequence of the run (as for workers), and writes a
+ self-describing partial result: the sampling settings, hashes of the input
+ files, counters, and its picks file and/or mergeable accumulators and
+ reservoir. mergeShards checks that the shards are consistent, and combines
+ them into the results of a single run.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import copy
+import time
+import pickle
+import argparse
+import numpy as np
+import yaml
+from dataLoading import loadDspAgeInputs, inputHashes
+from resultSaving import confirmOutputDir, slipRateTxtFile
+from rateAccumulators import rateAccumulators
+from pickStore import pickReservoir
+from MCresampling import randomGenerator, spawnGenerators
+
+
+### SETTINGS ---
+## Arguments that must be identical for all shards of a run
+shardSettings = ['Nsamples', 'shards', 'engine', 'maxRate', 'MCbound', 'seed', 'bitGenerator', 'sampler', 'prune',
+    'blockSize', 'decompose', 'mcTolerance', 'keep', 'float32', 'onlineStats', 'sketchAccuracy', 'rateStep',
+    'constraints', 'Nchains', 'burnIn', 'thin']
+
+
+def shardSeed(seedValue, shard, shards):
+    '''
+    Seed of the random number stream of shard i of N, spawned from the seed
+     sequence of seedValue (see spawnGenerators). The stream of a shard does
+     not depend on the bit generator used to spawn it.
+    '''
+    _, seeds = spawnGenerators(randomGenerator(seedValue), shards)
+
+    return seeds[shard]
+
+
+
+### SHARD RUNS ---
+def runShard(args):
+    '''
+    Run shard args.shard of args.shards with the selected engine, and save
+     the partial result to <outName>_Shard<i>_Result.pkl. The shard samples
+     its share of -n picks (and of -b), and its outputs (picks file, report,
+     checkpoints) are named <outName>_Shard<i>.
+    '''
+    from samplingEngines import engines
+
+    ## Checks
+    if args.shards is None or args.shards < 1 or not 0 <= args.shard < args.shards:
+        print('Shard index must be between 0 and --shards - 1')
+        exit()
+
+    engineName = args.engine.lower()
+    if engineName not in engines.keys() or engineName in ['grid', 'pool']:
+        print('Shards require a sampling engine: {:s}'.format('/'.join(['\'{:s}\''.format(name)
+            for name in engines if name not in ['grid', 'pool']])))
+        exit()
+
+    for option, name in [(args.fromPool is not None, 'Candidate pools'), (args.savePool, 'Candidate pools'),
+            (args.pickStore, 'Pick store'), (args.seedReplay, 'Seed replay'),
+            (args.scenarios is not None, 'Scenarios'), (args.jackknife, 'Jackknife analysis')]:
+        if option == True:
+            print('{:s} cannot be used with shards'.format(name))
+            exit()
+
+
+    ## Setup
+    shardName = '{:s}_Shard{:d}'.format(args.outName, args.shard)
+    confirmOutputDir(shardName, verbose=args.verbose)
+
+    # Share of samples and independent stream
+    Nsamples = int(args.Nsamples)
+    shardArgs = copy.copy(args)
+    shardArgs.outName = shardName
+    shardArgs.seed = shardSeed(args.seed, args.shard, args.shards)
+    shardArgs.Nsamples = len(np.array_split(np.arange(Nsamples), args.shards)[args.shard])
+    if args.MCbound is not None:
+        shardArgs.MCbound = int(np.ceil(args.MCbound*shardArgs.Nsamples/Nsamples))
+
+    if args.verbose == True:
+        print('*'*32)
+        print('Shard {:d} of {:d}: {:d} samples'.format(args.shard, args.shards, shardArgs.Nsamples))
+
+    txtFile = slipRateTxtFile(shardName, 'mcmc')
+    txtFile.append('Shard {:d} of {:d} ({:d} samples)\n'.format(args.shard, args.shards, shardArgs.Nsamples))
+
+    DspAgeData = loadDspAgeInputs(args.dataFile, verbose=args.verbose)
+
+
+    ## Sampling
+    startTime = time.time()
+    results = engines[engineName](DspAgeData, shardArgs, txtFile)
+    elapsed = time.time()-startTime
+
+    # Counters
+    counters = dict(results.get('Counters', {}))
+    if 'picks' not in counters.keys():
+        picks = [results[name] for name in ['RatePicks', 'AgePicks', 'DspPicks'] if results[name] is not None]
+        counters['picks'] = picks[0].shape[1] if len(picks) > 0 else results['Accumulators'].shape[1]
+    counters['elapsed'] = elapsed
+
+    # Picks file written by the engine
+    picksFile = '{:s}_Picks.npz'.format(shardName)
+    hasPicks = any([results[name] is not None for name in ['AgePicks', 'DspPicks', 'RatePicks']])
+
+
+    ## Partial result
+    # Data file and working directory (from which relative PDF paths are resolved) as absolute paths, so that the
+    #  shards can be merged from any directory
+    runArgs = dict(vars(args), dataFile=os.path.abspath(args.dataFile), workDir=os.getcwd())
+
+    shardResult = {'shard': args.shard, 'shards': args.shards,
+        'settings': {name: getattr(args, name) for name in shardSettings},
+        'hashes': inputHashes(args.dataFile),
+        'args': runArgs,
+        'markers': list(DspAgeData.keys()),
+        'counters': counters,
+        'picksFile': os.path.basename(picksFile) if hasPicks and os.path.exists(picksFile) else None,
+        'Accumulators': results.get('Accumulators'),
+        'Reservoir': results.get('Reservoir')}
+
+    resultName = '{:s}_Result.pkl'.format(shardName)
+    with open(resultName, 'wb') as resultFile:
+        pickle.dump(shardResult, resultFile, protocol=pickle.HIGHEST_PROTOCOL)
+
+    txtFile.append('\nShard result saved to {:s}: {:d} picks in {:.1f} s\n'.format(os.path.basename(resultName),
+        counters['picks'], elapsed))
+
+    return None
+
+
+
+### MERGING ---
+def loadShards(resultFiles):
+    '''
+    Load the partial results of shards, sorted by shard index. The path of
+     the picks file of each shard is resolved relative to its result file.
+    '''
+    shards = []
+    for resultFile in resultFiles:
+        with open(resultFile, 'rb') as shardFile:
+            shard = pickle.load(shardFile)
+        if shard['picksFile'] is not None:
+            shard['picksFile'] = os.path.join(os.path.dirname(os.path.abspath(resultFile)), shard['picksFile'])
+        shards.append(shard)
+
+    return sorted(shards, key=lambda shard: shard['shard'])
+
+
+def checkShards(shards, dataFile=None, workDir=None):
+    '''
+    Check that all shards are of the same run: identical settings, input
+     file hashes, and markers, and no repeated shard index. If dataFile is
+     given, its inputs (with relative PDF paths resolved from workDir) must
+     also match those of the shards. Missing shards
+     are reported, since the merged results are valid but have fewer picks.
+    Returns the list of missing shard indices.
+    '''
+    first = shards[0]
+
+    for shard in shards[1:]:
+        for name in shardSettings:
+            if shard['settings'][name] != first['settings'][name]:
+                print('Shard {:d} setting {:s} ({}) differs from that of shard {:d} ({})'.format(shard['shard'],
+                    name, shard['settings'][name], first['shard'], first['settings'][name]))
+                exit()
+        if shard['hashes'] != first['hashes'] or shard['markers'] != first['markers']:
+            print('Inputs of shard {:d} differ from those of shard {:d}'.format(shard['shard'], first['shard']))
+            exit()
+
+    indices = [shard['shard'] for shard in shards]
+    if len(set(indices)) < len(indices):
+        print('Shard indices are repeated: {}'.format(indices))
+        exit()
+
+    if dataFile is not None and inputHashes(dataFile, workDir) != first['hashes']:
+        print('Inputs of {:s} differ from those of the shards'.format(dataFile))
+        exit()
+
+    missing = sorted(set(range(first['shards']))-set(indices))
+    if len(missing) > 0:
+        print('WARNING! Missing shards: {}'.format(missing))
+
+    return missing
+
+
+def mergeShards(resultFiles, verbose=False):
+    '''
+    Combine the partial results of the shards of a run into the results of
+     a single run, in the format returned by the sampling engines: picks are
+     concatenated in shard order, accumulators and reservoirs are merged, and
+     counters are summed.
+
+    INPUTS
+        resultFiles is the list of <outName>_Shard<i>_Result.pkl files
+    OUTPUTS
+        args is the argparse namespace of the run (of the first shard)
+        results is the dictionary of merged results, including the summed
+         'Counters'
+        missing is the list of missing shard indices
+    '''
+    shards = loadShards(resultFiles)
+    args = argparse.Namespace(**shards[0]['args'])
+    args.shard = None
+
+    if verbose == True:
+        print('*'*32)
+        print('Merging {:d} of {:d} shards'.format(len(shards), shards[0]['shards']))
+
+    missing = checkShards(shards, dataFile=args.dataFile, workDir=args.workDir)
+
+    results = {}
+
+    # Concatenate picks in shard order
+    for name in ['AgePicks', 'DspPicks', 'RatePicks']:
+        picks = []
+        for shard in shards:
+            if shard['picksFile'] is None: break
+            with np.load(shard['picksFile']) as shardPicks:
+                if name not in shardPicks.files: break
+                picks.append(shardPicks[name])
+        results[name] = np.concatenate(picks, axis=1) if len(picks) == len(shards) else None
+
+    # Merge accumulators
+    if args.onlineStats == True:
+        accumulators = None
+        for shard in shards:
+            shardAccumulators = shard['Accumulators']
+            if shardAccumulators is None:
+                with np.load(shard['picksFile']) as shardPicks:
+                    RatePicks = shardPicks['RatePicks']
+                shardAccumulators = rateAccumulators(RatePicks.shape[0], args.rateStep, args.sketchAccuracy)
+                shardAccumulators.update(RatePicks)
+            if accumulators is None: accumulators = shardAccumulators.emptyCopy()
+            accumulators.merge(shardAccumulators)
+        results['Accumulators'] = accumulators
+
+    # Merge reservoirs
+    if all([shard['Reservoir'] is not None for shard in shards]):
+        results['Reservoir'] = pickReservoir(len(shards[0]['markers']), args.maxPicks2plot, seedValue=args.seed)
+        results['Reservoir'].merge([shard['Reservoir'] for shard in shards])
+
+    # Sum counters
+    counters = {'shards': len(shards), 'elapsed': sum([shard['counters']['elapsed'] for shard in shards]),
+        'maxElapsed': max([shard['counters']['elapsed'] for shard in shards])}
+    for key in ['picks', 'candidates']:
+        if all([key in shard['counters'].keys() for shard in shards]):
+            counters[key] = sum([shard['counters'][key] for shard in shards])
+    results['Counters'] = counters
+
+    return args, results, missing
+
+
+def reportShards(txtFile, results, missing, nShards):
+    '''
+    Append the shard counters to the slip rate report.
+    '''
+    counters = results['Counters']
+
+    shardStr = '\nMerged {:d} of {:d} shards'.format(counters['shards'], nShards)
+    if len(missing) > 0:
+        shardStr += ' (missing: {:s})'.format(', '.join([str(shard) for shard in missing]))
+    shardStr += '\n\t{:d} picks'.format(counters['picks'])
+    if 'candidates' in counters.keys():
+        shardStr += ' of {:d} candidates (acceptance rate {:.4f})'.format(counters['candidates'],
+            counters['picks']/max(counters['candidates'], 1))
+    shardStr += '\n\tsampling time {:.1f} s in total, {:.1f} s for the longest shard\n'.\
+        format(counters['elapsed'], counters['maxElapsed'])
+
+    txtFile.append(shardStr)
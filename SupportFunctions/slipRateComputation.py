@@ -7,6 +7,7 @@ Rob Zinke 2019-2021
 '''
 
 ### IMPORT MODULES ---
+import copy
 import matplotlib.pyplot as plt
 from dataLoading import loadDspAgeInputs
 from resultSaving import confirmOutputDir, slipRateTxtFile, printIncSlipRates
@@ -15,7 +16,7 @@ from plottingFunctions import plotRawData, plotIncSlipRates
 
 
 ### GENERIC WRAPPER FOR SLIP RATE COMPUTATION ---
-def computeIncrRates(scheme, args):
+def computeIncrRates(scheme, args, results=None):
     '''
     This function acts to ensure consistency in slip rate formatting and output
      structure between the two methods for computation: MCMC, and analytical
@@ -24,11 +25,30 @@ def computeIncrRates(scheme, args):
         scheme is the type of method to be used (MCMC, analytical)
         args come directly from argparse, and is an object comprising all
          input arguments
+        results are MC results already sampled (e.g., for a scenario; see
+         computeScenarioRates), in the format returned by the sampling
+         engines. If given, no sampling engine is run.
+    OUTPUTS
+        Rates is the dictionary of incremental slip rates
     '''
     ## Setup
     # Determine workflow
     scheme = scheme.lower()  # format
 
+    # Compare alternative scenarios, or leave-one-marker-out variants
+    if scheme in ['mcmc'] and results is None and args.scenarios is not None and args.jackknife == True:
+        print('Scenarios and jackknife analysis cannot be combined')
+        exit()
+    elif scheme in ['mcmc'] and results is None and args.scenarios is not None:
+        return computeScenarioRates(args)
+    elif scheme in ['mcmc'] and results is None and args.jackknife == True:
+        return computeJackknifeRates(args)
+
+    # Sample one shard of a larger run (see mergeShards)
+    if scheme in ['mcmc'] and results is None and args.shard is not None:
+        from shards import runShard
+        return runShard(args)
+
     # Check output directory exists
     outName = confirmOutputDir(args.outName, verbose=args.verbose)
 
@@ -37,9 +57,11 @@ def computeIncrRates(scheme, args):
 
 
     ## Load input data
-    # Load data from YAML file
+    # Load data from YAML file, with relative PDF paths resolved from the working directory of the run (e.g., of
+    #  merged shards)
     DspAgeData = loadDspAgeInputs(args.dataFile, 
-        verbose=args.verbose, printDetails=args.xtrVerbose, plotInputs=args.plotInputs)
+        verbose=args.verbose, printDetails=args.xtrVerbose, plotInputs=args.plotInputs,
+        workDir=getattr(args, 'workDir', None))
 
     # Plot raw data
     figNb = 1  # start figure counter
@@ -54,7 +76,7 @@ def computeIncrRates(scheme, args):
 
     elif scheme in ['mcmc']:
         # Compute rates using MC wrapper function below
-        Rates = computeMCMCrates(DspAgeData, args, txtFile)
+        Rates = computeMCMCrates(DspAgeData, args, txtFile, results=results)
 
         # Update figure counter
         figNb += 1
@@ -75,6 +97,8 @@ def computeIncrRates(scheme, args):
     if args.plotOutputs == True or args.plotInputs == True:
         plt.show()
 
+    return Rates
+
 
 
 ### ANALYTICAL SLIP RATES ---
@@ -95,32 +119,74 @@ def computeAnalyticalRates(DspAgeData, args, txtFile):
 
 
 ### MONTE CARLO SLIP RATES ---
-def computeMCMCrates(DspAgeData, args, txtFile):
+def computeMCMCrates(DspAgeData, args, txtFile, results=None):
     '''
-    Wrapper function to compute slip rates using Monte Carlo methods.
+    Wrapper function to compute slip rates using Monte Carlo methods. If
+     results are given, they are used instead of running a sampling engine.
     '''
     # Import appropriate modules
-    from MCresampling import MCMCresample, picks2PDF, rawPercentiles
+    from MCresampling import picks2PDF, rawPercentiles, reportMCerror
+    from samplingEngines import engines, selectEngine
+    from rateAccumulators import rateAccumulators
+    from pickStore import pickReservoir
     from plottingFunctions import plotMCresults
 
-    # Use Markov chain Monte Carlo method
-    AgePicks, DspPicks, RatePicks = MCMCresample(DspAgeData,
-        Nsamples=args.Nsamples, condition='standard',
-        maxRate=args.maxRate, bound=args.MCbound,
-        seedValue=args.seed,
-        verbose=args.verbose,
-        outName=args.outName)
+    if results is None:
+        # Determine sampling engine
+        engineName = args.engine.lower()
+        if args.fromPool is not None:
+            engineName = 'pool'  # reject against a saved candidate pool
+        elif engineName in ['auto']:
+            engineName = selectEngine(DspAgeData, args, txtFile)
+
+        if engineName not in engines.keys():
+            print('Choose sampling engine: {:s}'.format('/'.join(['\'{:s}\''.format(name) for name in engines]+['\'auto\''])))
+            exit()
+
+        # Sample using the selected engine
+        results = engines[engineName](DspAgeData, args, txtFile)
+
+    # Some engines return rate PDFs directly
+    if 'Rates' in results.keys():
+        return results['Rates']
+
+    AgePicks = results['AgePicks']
+    DspPicks = results['DspPicks']
+    RatePicks = results['RatePicks']
+
+    # Online accumulators, for engines that do not update them during sampling
+    if args.onlineStats == True and 'Accumulators' not in results.keys():
+        results['Accumulators'] = rateAccumulators(RatePicks.shape[0], args.rateStep, args.sketchAccuracy)
+        results['Accumulators'].update(RatePicks)
+
+    # Statistics from accumulators or picks
+    if args.onlineStats == True:
+        rateSource = results['Accumulators']
+        rateSource.save(args.outName)
+    else:
+        rateSource = RatePicks
 
     # Compute raw percentiles
-    rawPercentiles(DspAgeData, RatePicks, txtFile, args.rateConfidence, verbose=args.verbose)
+    rawPercentiles(DspAgeData, rateSource, txtFile, args.rateConfidence, verbose=args.verbose)
+
+    # Report achieved Monte Carlo error
+    if args.mcTolerance is not None:
+        reportMCerror(DspAgeData, RatePicks, txtFile, args.rateConfidence, verbose=args.verbose)
+
+    # Uniform subset of picks, for engines that do not keep a reservoir during sampling
+    if 'Reservoir' not in results.keys():
+        results['Reservoir'] = pickReservoir(len(DspAgeData.keys()), args.maxPicks2plot, seedValue=args.seed)
+        results['Reservoir'].update(AgePicks[:,:], DspPicks[:,:])
+    reservoir = results['Reservoir']
 
     # Plot MC results
     figNb = 2
-    plotMCresults(DspAgeData, AgePicks, DspPicks, figNb, maxPicks=args.maxPicks2plot,
+    plotAges, plotDsps = reservoir.picks()
+    plotMCresults(DspAgeData, plotAges, plotDsps, figNb, maxPicks=args.maxPicks2plot, nTotal=reservoir.nSeen,
         ageUnits=args.ageUnits, dspUnits=args.dspUnits, outName=args.outName)
 
     # Convert MC results to PDFs
-    Rates = picks2PDF(DspAgeData, RatePicks, 
+    Rates = picks2PDF(DspAgeData, rateSource, 
         method=args.pdfMethod,
         stepSize=args.rateStep,
         smoothingKernel=args.smoothingKernel, kernelWidth=args.kernelWidth,
@@ -130,6 +196,116 @@ def computeMCMCrates(DspAgeData, args, txtFile):
 
 
 
+### SCENARIO COMPARISON ---
+def computeScenarioRates(args):
+    '''
+    Wrapper function to compare alternative marker correlations. The data
+     file and the scenario files (args.scenarios) are sampled together with
+     common random numbers (see scenarioResample), then the rates of each
+     scenario are computed and reported as for a single data file, with
+     outputs named <outName>_<scenario>. A table comparing the scenarios is
+     written to <outName>_Scenario_Report.txt. Scenarios without feasible
+     histories are only listed in the report.
+    '''
+    from MCresampling import savePicks, randomGenerator
+    from samplingEngines import defaultBlockSize
+    from scenarios import loadScenarios, scenarioResample, reportScenarios
+
+    confirmOutputDir(args.outName, verbose=args.verbose)
+
+    # Load scenarios
+    fnames = [args.dataFile]+list(args.scenarios)
+    names, scenarios, constraints = loadScenarios(fnames, args.constraints, verbose=args.verbose)
+
+    # Sample all scenarios with common random numbers
+    results = scenarioResample(scenarios, args.Nsamples,
+        maxRate=args.maxRate, bound=args.MCbound,
+        blockSize=args.blockSize if args.blockSize is not None else defaultBlockSize,
+        constraints=constraints,
+        seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+        verbose=args.verbose)
+
+    # Compute and report rates of each scenario
+    scenarioRates = []
+    for fname, name, result in zip(fnames, names, results):
+        if result['RatePicks'].shape[1] == 0:
+            scenarioRates.append(None)  # no feasible histories
+            continue
+
+        scenarioArgs = copy.copy(args)
+        scenarioArgs.dataFile = fname
+        scenarioArgs.outName = '{:s}_{:s}'.format(args.outName, name)
+        scenarioArgs.plotOutputs = False
+        scenarioArgs.plotInputs = False
+
+        savePicks(scenarioArgs.outName, result['AgePicks'], result['DspPicks'], result['RatePicks'])
+        scenarioRates.append(computeIncrRates('MCMC', scenarioArgs, results=dict(result)))
+        plt.close('all')
+
+    # Compare scenarios
+    reportScenarios(names, scenarioRates, results, args.outName,
+        analysisMethod=args.pdfAnalysis, confidence=args.rateConfidence, rateUnits=args.rateUnits)
+
+    return scenarioRates
+
+
+
+### JACKKNIFE ANALYSIS ---
+def computeJackknifeRates(args):
+    '''
+    Wrapper function for the leave-one-marker-out analysis. The full data
+     set and the m variants with one marker dropped are sampled from common
+     candidates (see jackknifeResample). The rates of the full data set are
+     computed and reported as usual, the rate PDFs of each variant are saved,
+     and a table of the variants is written to <outName>_Jackknife_Report.txt.
+     The full data set and variants without feasible histories are only
+     listed in the table.
+    Rate constraints are not supported, since intervals differ between
+     variants.
+    '''
+    from MCresampling import savePicks, randomGenerator
+    from samplingEngines import defaultBlockSize
+    from constraints import loadConstraints, parseConstraints
+    from jackknife import jackknifeResample, jackknifeRates, reportJackknife
+
+    confirmOutputDir(args.outName, verbose=args.verbose)
+
+    # Load input data
+    DspAgeData = loadDspAgeInputs(args.dataFile, verbose=args.verbose)
+
+    if len(loadConstraints(args.dataFile)+parseConstraints(args.constraints)) > 0:
+        print('Rate constraints cannot be used with the jackknife analysis')
+        exit()
+
+    # Sample full data set and variants from common candidates
+    results = jackknifeResample(DspAgeData, args.Nsamples,
+        maxRate=args.maxRate, bound=args.MCbound,
+        blockSize=args.blockSize if args.blockSize is not None else defaultBlockSize,
+        seedValue=args.seed, rng=randomGenerator(args.seed, args.bitGenerator),
+        verbose=args.verbose)
+
+    # Rates of full data set
+    if results[0]['RatePicks'].shape[1] > 0:
+        fullResults = {name: results[0][name] for name in ['AgePicks', 'DspPicks', 'RatePicks']}
+        savePicks(args.outName, *fullResults.values())
+        Rates = computeIncrRates('MCMC', args, results=fullResults)
+    else:
+        Rates = None  # no feasible histories
+
+    # Rates of variants
+    variantRates = jackknifeRates(DspAgeData, results,
+        method=args.pdfMethod, stepSize=args.rateStep,
+        smoothingKernel=args.smoothingKernel, kernelWidth=args.kernelWidth,
+        analysisMethod=args.pdfAnalysis, confidence=args.rateConfidence,
+        verbose=args.verbose, outName=args.outName)
+
+    reportJackknife(Rates, results, variantRates, args.outName,
+        analysisMethod=args.pdfAnalysis, confidence=args.rateConfidence, rateUnits=args.rateUnits)
+
+    return Rates
+
+
+
 ### PDF ANALYSIS ---
 def analyzePDFs(Rates, method, confidence, verbose=False, outName=None):
     '''
@@ -10,7 +10,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 from scipy.integrate import cumtrapz
 from PDFanalysis import *
-from array2pdf import arrayHist, arrayKDE
+from array2pdf import arrayHist, arrayKDE, streamHist, streamKDE
 from PDFanalysis import IQRpdf, HPDpdf
 
 
@@ -101,13 +101,19 @@ class ageDatum:
 
     def __buildPIT__(self):
         '''
-        Build probability inverse transform (PIT) function.
+        Build probability inverse transform (PIT) function, and the
+         corresponding forward CDF function.
         '''
         # Inverse interpolation function
         #    use cdf as 'x' value for inverse interpolation
         #    leave kind as linear to avoid values < 0 or > 1
         self.InvCDF = interp1d(self.cdf, self.ages, kind='linear')
 
+        # Forward interpolation function
+        #    used to find the CDF level of a given value
+        self.CDF = interp1d(self.ages, self.cdf, kind='linear', bounds_error=False,
+            fill_value=(self.cdf[0], self.cdf[-1]))
+
     def __computeStats__(self):
         '''
         Compute basic statistics.
@@ -230,13 +236,19 @@ class dspDatum:
 
     def __buildPIT__(self):
         '''
-        Build probability inverse transform (PIT) function.
+        Build probability inverse transform (PIT) function, and the
+         corresponding forward CDF function.
         '''
         # Inverse interpolation function
         #    use cdf as 'x' value for inverse interpolation
         #    leave kind as linear to avoid values < 0 or > 1
         self.InvCDF = interp1d(self.cdf, self.dsps, kind='linear')
 
+        # Forward interpolation function
+        #    used to find the CDF level of a given value
+        self.CDF = interp1d(self.dsps, self.cdf, kind='linear', bounds_error=False,
+            fill_value=(self.cdf[0], self.cdf[-1]))
+
     def __computeStats__(self):
         '''
         Compute basic statistics.
@@ -300,6 +312,25 @@ class incrSlipRate:
             print('Choose PDF conversion method: \'histogram\'/\'kde\'')
             exit()
 
+    # Convert chunked picks to PDF
+    def chunks2PDF(self, chunks, vmin, vmax, method, stepSize, smoothingKernel=None, kernelWidth=2,
+        verbose=False):
+        '''
+        Convert slip rate picks read in chunks (e.g., from a pickStore) to PDF
+         using streamHist or streamKDE methods.
+        '''
+        # Use histogram method
+        if method.lower() in ['hist', 'histogram']:
+            self.rates, self.probs = streamHist(chunks, vmin, vmax, stepSize,
+                smoothingKernel, kernelWidth, verbose)
+        # Use kernel density method
+        elif method.lower() in ['kde', 'kernel']:
+            self.rates, self.probs = streamKDE(chunks, vmin, vmax, stepSize,
+                smoothingKernel, kernelWidth, verbose)
+        else:
+            print('Choose PDF conversion method: \'histogram\'/\'kde\'')
+            exit()
+
     # Analyze PDF
     def analyzePDF(self, method='IQR', confidence=68.27):
         '''
@@ -37,6 +37,11 @@ Where T2/T3 is younger and less-offset than T1/T2. Change the .txt filenames to
 files, accordingly.
 
 Note: More than one entry must be present to calculate incremental slip rates.
+
+Optionally, constraints on the incremental slip rates may be listed under the key 'constraints' (see --constraint).
+For example:
+constraints:
+ - {type: rate, interval: 0, min: 0.5, max: 4.0}
 '''
 
 Examples = '''EXAMPLES
@@ -71,14 +76,135 @@ the top; oldest, most-offset features at the bottom.')
 
     # Fine-tuning
     detailMCargs = parser.add_argument_group('DETAILED MC ARGUMENTS')
+    detailMCargs.add_argument('--engine', dest='engine', type=str, default='rejection',
+        help='Sampling engine. ([\'rejection\'] draws all markers independently and rejects histories that \
+violate the no-negative-rate and max-rate conditions; \'vectorized\' is rejection sampling in blocks of \
+candidates; \'sequential\' draws markers in order from truncated PDFs with importance weights, then \
+resamples the weighted histories; \'gibbs\' runs Markov chains that update each marker within the limits \
+set by its neighbors; \'grid\' uses the analytical formulation, which is exact only if no markers overlap; \
+\'auto\' picks the cheapest engine based on the number of markers and their measured overlap.)')
     detailMCargs.add_argument('-n','--Nsamples', dest='Nsamples', type=int, default=1E4,
         help='Number of samples picked in MC run [default = 10,000; more is often better].')
     detailMCargs.add_argument('--max-rate', dest='maxRate', type=float, default=1E3,
         help='Maximum rate considered in MC analysis. Units are <dispalcement units> per <age units>. [Default = 1,000].')
     detailMCargs.add_argument('-b','--MCbound', dest='MCbound', type=int, default=None,
-        help='Upper bound at which to stop sampling, even if specified number of samples has not been achieved. [Default = 4 x Nsamples].')
+        help='Upper bound at which to stop sampling, even if specified number of samples has not been achieved. \
+For the sequential engine, the number of weighted histories drawn. [Default = 4 x Nsamples].')
+    detailMCargs.add_argument('--time-budget', dest='timeBudget', type=float, default=None,
+        help='Wall-clock time (seconds) after which sampling stops, as an alternative to -b. Outputs are trimmed to \
+the picks accepted, and the achieved number of picks and throughput are written to the slip rate report. \
+Applies to the rejection engines. [Default = None].')
+    detailMCargs.add_argument('--checkpoint-interval', dest='checkpointInterval', type=float, default=None,
+        help='Wall-clock time (seconds) between checkpoints of the accepted picks, counters, and random number \
+generator state, written to <outName>_checkpoint.pkl (one per worker or marker block). The checkpoint is deleted \
+once the run completes. Applies to the rejection engines. [Default = None, no checkpoints].')
+    detailMCargs.add_argument('--resume', dest='resume', action='store_true',
+        help='Continue an interrupted run from its checkpoint. The same data file and sampling arguments must be \
+given. Results are identical to those of an uninterrupted run (unless --time-budget is used). Applies to the \
+rejection engines.')
+    detailMCargs.add_argument('--pick-store', dest='pickStore', action='store_true',
+        help='Write picks to disk in chunks as sampling proceeds, in the directory <outName>_PickStore, instead of \
+holding them in memory. Percentiles and PDFs are computed by reading the chunks one at a time, such that memory \
+use is bounded by the chunk size. Applies to the rejection engines without --decompose or --mc-tolerance.')
+    detailMCargs.add_argument('--chunk-size', dest='chunkSize', type=int, default=100000,
+        help='Number of picks per chunk of the pick store. [Default = 100,000].')
+    detailMCargs.add_argument('--keep', dest='keep', type=str, default='ages,dsps,rates',
+        help='Comma-separated list of the picks held in memory and saved to <outName>_Picks.npz (or the pick \
+store): ages, dsps, rates. Rates are required unless --online-stats is used; the MC picks figure is drawn from a \
+reservoir of picks kept separately. Applies to the rejection engines. [Default = ages,dsps,rates].')
+    detailMCargs.add_argument('--float32', dest='float32', action='store_true',
+        help='Hold and save picks as single-precision (float32) values, halving memory and disk use. Applies to \
+the rejection engines.')
+    detailMCargs.add_argument('--online-stats', dest='onlineStats', action='store_true',
+        help='Update a histogram on the --rate-step grid and a quantile sketch of the rates of each interval as \
+sampling proceeds, and compute the raw percentiles and PDFs from those, without holding picks in memory. The \
+accumulators are saved to <outName>_Accumulators.pkl, and can be merged across runs. Not compatible with \
+--mc-tolerance.')
+    detailMCargs.add_argument('--sketch-accuracy', dest='sketchAccuracy', type=float, default=0.0005,
+        help='Relative accuracy of the percentiles from the quantile sketch of --online-stats. [Default = 0.0005].')
+    detailMCargs.add_argument('--seed-replay', dest='seedReplay', action='store_true',
+        help='Instead of saving the picks to <outName>_Picks.npz, save the random number generator state of each \
+batch of candidates and a mask of the accepted candidates to <outName>_Replay.pkl. Any subset of the picks is \
+regenerated exactly on demand with MCresampling.regeneratePicks. Applies to the rejection engines without \
+--decompose.')
+    detailMCargs.add_argument('--constraint', dest='constraints', type=str, action='append', default=None,
+        help='Rate constraint, in addition to those under the key \'constraints\' of the data file, given in YAML \
+flow format. May be repeated. Types are \'rate\' (min and/or max rate of an interval), \'ratio\' (max ratio of \
+the rates of an interval and the next), and \'custom\' (module.function of the ages, dsps, and rates returning a \
+boolean mask). Intervals are numbered from 0, youngest first. E.g., --constraint "{type: rate, interval: 0, max: 4}". \
+Applies to the rejection and sequential engines.')
+    detailMCargs.add_argument('--save-pool', dest='savePool', action='store_true',
+        help='Sample -n candidates that satisfy the no-negative-rate condition, without the max rate and rate \
+constraints, and save them to <outName>_Pool.npz. The max rate and constraints are then applied to the pool. \
+Applies to the rejection engines without --pick-store, --seed-replay, --decompose, --online-stats, or \
+--mc-tolerance.')
+    detailMCargs.add_argument('--from-pool', dest='fromPool', type=str, default=None,
+        help='Instead of sampling, apply the max rate and rate constraints of this run to the candidates of a pool \
+saved with --save-pool (<outName>_Pool.npz) from the same data file and PDF files (checked by hash), and compute \
+the rates from the accepted candidates. Use to test stricter max rates or constraints in seconds. [Default = None].')
+    detailMCargs.add_argument('--scenarios', dest='scenarios', type=str, nargs='+', default=None,
+        help='Alternative data files (e.g., other correlations of displacements with ages) compared with the data \
+file using common random numbers: each distinct age and displacement PDF file is sampled once per candidate, \
+and the condition of each scenario is evaluated on the shared candidates, in blocks of --block-size. Outputs of \
+each scenario are named <outName>_<scenario>, and a comparison table is written to \
+<outName>_Scenario_Report.txt. --engine and the other sampling options of the rejection engine do not apply. \
+[Default = None].')
+    detailMCargs.add_argument('--jackknife', dest='jackknife', action='store_true',
+        help='Leave-one-marker-out analysis. The full data set and the variants with each marker dropped in turn \
+are sampled from common candidates, in blocks of --block-size; each variant only re-evaluates the new pair of \
+markers on either side of the dropped marker. The full data set is reported as usual; the rate PDFs of each \
+variant are saved to <outName>_Jackknife_<marker>_Incr_slip_rate_<interval>.txt, and a table of the changes \
+in rates to <outName>_Jackknife_Report.txt. Requires three or more markers; rate constraints and the other \
+sampling options of the rejection engine do not apply.')
+    detailMCargs.add_argument('--shard', dest='shard', type=int, default=None,
+        help='Index (0 to --shards - 1) of the shard of a run split across independent jobs. The shard samples its \
+share of -n (and -b) with its own random number stream spawned from --seed, and saves a partial result to \
+<outName>_Shard<i>_Result.pkl, along with its picks and report (<outName>_Shard<i>_*). No rates are computed; \
+combine the shards with mergeShards.py. All shards must be given the same data file and arguments, except \
+--shard. Not compatible with --engine auto/grid, --pick-store, --seed-replay, or candidate pools. [Default = None].')
+    detailMCargs.add_argument('--shards', dest='shards', type=int, default=None,
+        help='Total number of shards of the run (see --shard).')
     detailMCargs.add_argument('--seed', dest='seed', type=float, default=0,
-        help='Seed value for random number generator. [Default = 0].')
+        help='Seed value for random number generator. Random numbers are drawn from a numpy Generator (see \
+--bit-generator) seeded through np.random.SeedSequence, from which the streams of workers and marker blocks are \
+spawned. No global random state is used. Results are reproducible for a given seed, bit generator, and number of \
+workers. [Default = 0].')
+    detailMCargs.add_argument('--bit-generator', dest='bitGenerator', type=str, default='PCG64',
+        help='Bit generator of the random number generator. ([\'PCG64\'], \'Philox\').')
+    detailMCargs.add_argument('--block-size', dest='blockSize', type=int, default=None,
+        help='Number of candidate histories drawn and evaluated at once in vectorized block sampling mode. \
+Much faster than drawing candidates one at a time. [Default = None, one at a time].')
+    detailMCargs.add_argument('--sampler', dest='sampler', type=str, default='random',
+        help='Method for generating uniform numbers fed to the inverse CDFs. ([\'random\'] pseudo-random numbers; \
+\'sobol\' scrambled Sobol\' quasi-random points, which give more precise percentiles for the same number of \
+samples; \'lhs\' Latin hypercube points, which stratify every marker PDF across each block of candidates). \
+Quasi-random points are generated in blocks; use a power of 2 for --block-size with Sobol\' sampling. \
+Applies to the rejection engine.')
+    detailMCargs.add_argument('--prune', dest='prune', action='store_true',
+        help='Draw samples only within the window of each marker PDF that can satisfy the no-negative-rate and \
+max-rate conditions. The posterior is unchanged, but fewer samples are rejected. Applies to the rejection engine.')
+    detailMCargs.add_argument('--decompose', dest='decompose', action='store_true',
+        help='Split the markers into blocks that cannot reject one another (no overlap in age or displacement, \
+and within the max rate), and sample each block separately. Blocks are sampled in parallel if more \
+than one worker is specified. Applies to the rejection engine.')
+    detailMCargs.add_argument('--mc-tolerance', dest='mcTolerance', type=float, default=None,
+        help='Stop sampling once the Monte Carlo standard error of the median and confidence bounds of every \
+interval falls below this value (rate units, e.g., 0.01). -n is then the maximum number of samples. The achieved \
+error is written to the slip rate report. Applies to the rejection engines without --decompose. [Default = None].')
+    detailMCargs.add_argument('--no-pilot', dest='pilot', action='store_false',
+        help='Skip the short pilot run used to estimate the acceptance rate, wall time, and whether the sampling \
+bound will be exhausted. Applies to the rejection engine.')
+    detailMCargs.add_argument('--pilot-size', dest='pilotSize', type=int, default=10000,
+        help='Number of candidate histories drawn in the pilot run. [Default = 10,000].')
+    detailMCargs.add_argument('--chains', dest='Nchains', type=int, default=8,
+        help='Number of Markov chains for the Gibbs engine. [Default = 8].')
+    detailMCargs.add_argument('--burn-in', dest='burnIn', type=int, default=500,
+        help='Number of sweeps discarded at the start of each Gibbs chain. [Default = 500].')
+    detailMCargs.add_argument('--thin', dest='thin', type=int, default=1,
+        help='Record every <thin> sweeps of each Gibbs chain. [Default = 1].')
+    detailMCargs.add_argument('--workers', dest='workers', type=int, default=1,
+        help='Number of processes across which sampling is split. Each worker uses an independent random number \
+stream spawned from the seed; results are reproducible for a given seed and number of workers. [Default = 1].')
 
 
     detailAnalysisArgs = parser.add_argument_group('DETAILED SLIP RATE ANALYSIS ARGUMENTS')
@@ -97,7 +223,8 @@ the top; oldest, most-offset features at the bottom.')
 
     detailFigureArgs = parser.add_argument_group('DETAILED SLIP RATE PLOT ARGUMENTS')
     detailFigureArgs.add_argument('--max-picks2plot', dest='maxPicks2plot', type=int, default=500,
-        help='Max number of picks to plot on MC results figure. [Default = 500].')
+        help='Max number of picks to plot on MC results figure. The picks plotted are a uniform random subset of \
+all picks, kept by reservoir sampling as sampling proceeds. [Default = 500].')
     detailFigureArgs.add_argument('--max-rate2plot', dest='maxRate2plot', type=float, default=None,
         help='Maximum spreading rate to plot (unlike -max-rate, this will not affect calculations). [Default = None].')
     detailFigureArgs.add_argument('--age-units', dest='ageUnits', type=str, default=None,
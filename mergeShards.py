@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+'''
+** RISeR Incremental Slip Rate Calculator **
+Merge the partial results of the shards of a Monte Carlo run (see the --shard
+ option of calcSlipRates_MCMC.py) into a single set of slip rate results.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import argparse
+from shards import mergeShards, reportShards
+from MCresampling import savePicks
+from resultSaving import confirmOutputDir, slipRateTxtFile
+from slipRateComputation import computeIncrRates
+
+
+### PARSER ---
+Description = '''Merge the shards of a Monte Carlo slip rate run into one posterior and slip rate report. Each shard
+is an independent job of calcSlipRates_MCMC.py run with --shard <i> --shards <N>, which writes
+<outName>_Shard<i>_Result.pkl. The shards are checked to have been run with identical settings and identical input
+files (by hash), and the input files of the data file must still be available at the same absolute paths (relative
+PDF paths in the data file are resolved from the working directory of the shards), but mergeShards may be run from
+any directory. Picks are concatenated in shard
+order, and online accumulators and plotting reservoirs are merged. The rates are then computed and reported as for a
+single run, using the analysis and plotting arguments of the shards.
+
+Missing shards are reported, but the remaining shards are merged.'''
+
+Examples = '''EXAMPLES
+From the Examples/ComplexExample folder, with each command run as a separate job
+
+calcSlipRates_MCMC.py Dsp-AgeList.yaml -n 1000000 --engine vectorized --online-stats --shard 0 --shards 4 -o Shards/Run
+...
+calcSlipRates_MCMC.py Dsp-AgeList.yaml -n 1000000 --engine vectorized --online-stats --shard 3 --shards 4 -o Shards/Run
+
+mergeShards.py Shards/Run_Shard*_Result.pkl -o Merged
+'''
+
+def createParser():
+    parser = argparse.ArgumentParser(description=Description,
+        formatter_class=argparse.RawTextHelpFormatter, epilog=Examples)
+    parser.add_argument(dest='resultFiles', nargs='+',
+        help='Partial result files of the shards (<outName>_Shard<i>_Result.pkl).')
+    parser.add_argument('-o','--outName', dest='outName', type=str, required=True,
+        help='Head name for outputs (no extension).')
+    parser.add_argument('-v','--verbose', dest='verbose', action='store_true',
+        help='Verbose mode.')
+    parser.add_argument('-p','--plot-outputs', dest='plotOutputs', action='store_true',
+        help='Plot outputs.')
+    return parser
+
+def cmdParser(inps_args=None):
+    parser = createParser()
+    return parser.parse_args(inps_args)
+
+
+
+### MAIN ---
+if __name__ == '__main__':
+    ## Gather arguments
+    inps = cmdParser()
+
+
+    ## Merge shards
+    args, results, missing = mergeShards(inps.resultFiles, verbose=inps.verbose)
+
+    # Outputs of the merged run
+    args.outName = inps.outName
+    args.verbose = inps.verbose
+    args.plotOutputs = inps.plotOutputs
+    args.plotInputs = False
+
+    confirmOutputDir(args.outName, verbose=args.verbose)
+    if results['RatePicks'] is not None or results['AgePicks'] is not None:
+        savePicks(args.outName, results['AgePicks'], results['DspPicks'], results['RatePicks'])
+
+
+    ## Compute and report rates
+    computeIncrRates('MCMC', args, results=results)
+
+    # Shard counters
+    txtFile = slipRateTxtFile(args.outName, 'mcmc', start=False)
+    reportShards(txtFile, results, missing, args.shards)
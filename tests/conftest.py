@@ -0,0 +1,64 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Shared setup of the behavior tests. The repository root and SupportFunctions
+ are added to the Python path, as for the scripts (see README), and the
+ example data are copied to a temporary working directory.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import sys
+import glob
+import shutil
+import matplotlib
+matplotlib.use('Agg')
+import pytest
+
+
+### PATHS ---
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repoDir)
+sys.path.insert(0, os.path.join(repoDir, 'SupportFunctions'))
+
+exampleDir = os.path.join(repoDir, 'Examples', 'SimpleExample')
+
+
+
+### FIXTURES ---
+@pytest.fixture
+def workDir(tmp_path, monkeypatch):
+    '''
+    Working directory holding a copy of the Simple Example data file
+     (DspAgeList.yaml) and PDFs.
+    '''
+    for fname in glob.glob(os.path.join(exampleDir, '*.txt'))+glob.glob(os.path.join(exampleDir, '*.yaml')):
+        shutil.copy(fname, tmp_path)
+    monkeypatch.chdir(tmp_path)
+
+    return tmp_path
+
+
+@pytest.fixture
+def DspAgeData(workDir):
+    '''
+    Markers of the Simple Example.
+    '''
+    from dataLoading import loadDspAgeInputs
+
+    return loadDspAgeInputs('DspAgeList.yaml')
+
+
+@pytest.fixture
+def runArgs(workDir):
+    '''
+    Function returning the arguments of calcSlipRates_MCMC for the Simple
+     Example data file, with the given command line options.
+    '''
+    from calcSlipRates_MCMC import cmdParser
+
+    def parseArgs(*options):
+        return cmdParser(['DspAgeList.yaml', '-o', 'Out', '--no-pilot']+list(options))
+
+    return parseArgs
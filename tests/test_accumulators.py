@@ -0,0 +1,121 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of the online rate accumulators: the quantile sketch agrees
+ with np.percentile within its relative accuracy, and merged accumulators
+ equal the accumulators of the concatenated picks.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import sys
+import subprocess
+import numpy as np
+import pytest
+from rateAccumulators import fixedHistogram, quantileSketch, rateAccumulators
+
+
+### QUANTILE SKETCH ---
+percentiles = [0, 2.5, 15.865, 50, 84.135, 97.5, 100]
+
+@pytest.mark.parametrize('values', [np.array([1., 2., 3., 4.]),
+    np.random.default_rng(0).lognormal(0, 1, 10**5),
+    np.random.default_rng(1).normal(0.5, 1, 10**5)])
+def test_sketch_accuracy(values):
+    '''
+    Percentiles are within the relative accuracy of np.percentile.
+    '''
+    sketch = quantileSketch(0.0005)
+    sketch.update(values)
+
+    exact = np.percentile(values, percentiles)
+    assert np.allclose(sketch.percentiles(percentiles), exact, rtol=0.0005, atol=1E-12)
+
+
+def test_sketch_merge():
+    values = np.random.default_rng(2).normal(1, 2, 10**4)
+    sketches = [quantileSketch() for k in range(3)]
+    sketches[0].update(values[:3000])
+    sketches[1].update(values[3000:])
+    sketches[0].merge(sketches[1])
+    sketches[2].update(values)
+
+    assert sketches[0].n == sketches[2].n
+    assert np.array_equal(sketches[0].percentiles(percentiles), sketches[2].percentiles(percentiles))
+
+
+def test_merge_accuracy():
+    with pytest.raises(SystemExit):
+        quantileSketch(0.0005).merge(quantileSketch(0.001))
+
+
+
+### HISTOGRAM ---
+def test_histogram_merge():
+    values = np.random.default_rng(3).normal(1, 2, 10**4)
+    histograms = [fixedHistogram(0.01) for k in range(3)]
+    histograms[0].update(values[values > 0])
+    histograms[1].update(values[values <= 0])
+    histograms[0].merge(histograms[1])
+    histograms[2].update(values)
+
+    assert np.array_equal(histograms[0].edges, histograms[2].edges)
+    assert np.array_equal(histograms[0].counts, histograms[2].counts)
+
+
+def test_histogram_step_size():
+    histogram = fixedHistogram(0.01)
+    histogram.update(np.array([1., 2.]))
+    other = fixedHistogram(0.02)
+    other.update(np.array([1., 2.]))
+
+    with pytest.raises(SystemExit):
+        histogram.merge(other)
+
+
+
+### INTERVAL ACCUMULATORS ---
+def test_accumulators_merge():
+    '''
+    Merged accumulators have the histograms, percentiles, and moments of the
+     concatenated picks.
+    '''
+    RatePicks = np.random.default_rng(4).lognormal(0, 0.5, (2, 5000))
+    accumulators = [rateAccumulators(2, 0.01) for k in range(3)]
+    accumulators[0].update(RatePicks[:,:1234])
+    accumulators[1].update(RatePicks[:,1234:])
+    accumulators[0].merge(accumulators[1])
+    accumulators[2].update(RatePicks)
+
+    assert np.array_equal(accumulators[0].n, accumulators[2].n)
+    assert np.allclose(accumulators[0].mean, RatePicks.mean(axis=1))
+    assert np.allclose(accumulators[0].M2/(accumulators[0].n-1), RatePicks.var(axis=1, ddof=1))
+    for i in range(2):
+        assert np.array_equal(accumulators[0].histograms[i].counts, accumulators[2].histograms[i].counts)
+        assert np.array_equal(accumulators[0].percentiles(i, percentiles), accumulators[2].percentiles(i, percentiles))
+
+
+def test_accumulators_non_finite():
+    '''
+    Non-finite rates (e.g., of markers of equal age) are left out of the
+     histograms, sketches, and moments alike.
+    '''
+    RatePicks = np.array([[1., np.inf, 3., np.nan], [2., 4., -np.inf, 6.]])
+    accumulators = rateAccumulators(2, 0.01)
+    accumulators.update(RatePicks)
+
+    assert np.array_equal(accumulators.n, [2, 3])
+    assert np.allclose(accumulators.mean, [2., 4.])
+    assert np.allclose(accumulators.M2, [2., 8.])
+    assert [accumulators.sketches[i].n for i in range(2)] == [2, 3]
+    assert [accumulators.histograms[i].counts.sum() for i in range(2)] == [2, 3]
+
+
+def test_import():
+    '''
+    The accumulators can be imported on their own, outside the import cycle
+     of array2pdf and slipRateObjects.
+    '''
+    supportDir = os.path.dirname(sys.modules['rateAccumulators'].__file__)
+    subprocess.run([sys.executable, '-c', 'import rateAccumulators'], cwd=supportDir, check=True)
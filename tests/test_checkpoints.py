@@ -0,0 +1,73 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of checkpointing: a run interrupted (here by its time
+ budget) and resumed from its checkpoint gives the same picks as an
+ uninterrupted run.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import numpy as np
+from MCresampling import MCMCresample, samplerSettings
+from pickStore import pickStore
+
+
+### CHECKPOINT AND RESUME ---
+Nsamples = 4000
+runArgs = dict(maxRate=10., bound=10**6, seedValue=3)
+
+def interruptedRun(DspAgeData, **options):
+    '''
+    Sample until the (negligible) time budget is exceeded, keeping the
+     checkpoint, then resume from the checkpoint.
+    '''
+    settings = samplerSettings(blockSize=250, checkpointName='Run', checkpointInterval=0, **options)
+    partial = MCMCresample(DspAgeData, Nsamples, settings=settings.copy(timeBudget=1E-6, keepCheckpoint=True),
+        **runArgs)
+    assert os.path.exists('Run_checkpoint.pkl')
+
+    return partial, MCMCresample(DspAgeData, Nsamples, settings=settings.copy(resume=True), **runArgs)
+
+
+def test_resume(DspAgeData):
+    full = MCMCresample(DspAgeData, Nsamples, settings=samplerSettings(blockSize=250), **runArgs)
+    partial, resumed = interruptedRun(DspAgeData)
+
+    assert partial[0].shape[1] < Nsamples
+    assert all([np.array_equal(a, b) for a, b in zip(full, resumed)])
+
+    # Checkpoint and pick files are removed once the run is complete
+    assert not any([fname.startswith('Run_checkpoint') for fname in os.listdir('.')])
+
+
+def test_resume_partial_save(DspAgeData):
+    '''
+    Picks appended to the checkpoint pick files after the state file was
+     written (e.g., by an interrupted save) are discarded on resuming.
+    '''
+    full = MCMCresample(DspAgeData, Nsamples, settings=samplerSettings(blockSize=250), **runArgs)
+
+    settings = samplerSettings(blockSize=250, checkpointName='Run', checkpointInterval=0)
+    MCMCresample(DspAgeData, Nsamples, settings=settings.copy(timeBudget=1E-6, keepCheckpoint=True), **runArgs)
+    with open('Run_checkpoint_AgePicks.bin', 'ab') as picksFile:
+        picksFile.write(np.ones(3*10).tobytes())
+    resumed = MCMCresample(DspAgeData, Nsamples, settings=settings.copy(resume=True), **runArgs)
+
+    assert all([np.array_equal(a, b) for a, b in zip(full, resumed)])
+
+
+def test_resume_store(DspAgeData):
+    '''
+    Picks written to a pick store are resumed from the store.
+    '''
+    MCMCresample(DspAgeData, Nsamples, settings=samplerSettings(blockSize=250, storeName='Full', chunkSize=300),
+        **runArgs)
+    interruptedRun(DspAgeData, storeName='Resumed', chunkSize=300)
+
+    full = pickStore('Full', mode='r')
+    resumed = pickStore('Resumed', mode='r')
+    assert full.nPicks == resumed.nPicks == Nsamples
+    for kind in pickStore.kinds:
+        assert np.array_equal(full.view(kind)[:,:], resumed.view(kind)[:,:])
@@ -0,0 +1,118 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of the rate constraints: the masks of each type of
+ constraint, the declaration of constraints in the data file and on the
+ command line, and custom functions passed to the workers of a parallel
+ run.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import pickle
+import numpy as np
+import pytest
+from constraints import loadConstraints, parseConstraints, rateConstraints
+from dataLoading import loadDspAgeInputs
+from MCresampling import parallelResample, samplerSettings
+
+
+### CANDIDATES ---
+# Four markers, three intervals
+rates = np.array([[1., 2., 5., 0.5, 3.],
+                  [2., 2., 1., 4.0, 3.],
+                  [1., 9., 1., 1.0, 3.]])
+ages = np.cumsum(np.ones((4, 5)), axis=0)
+dsps = np.concatenate([np.zeros((1, 5)), np.cumsum(rates, axis=0)], axis=0)
+
+def writeCustomModule():
+    '''
+    Module of custom constraint functions in the working directory.
+    '''
+    with open('siteConstraints.py', 'w') as moduleFile:
+        moduleFile.write('def slowingOnly(ages, dsps, rates):\n')
+        moduleFile.write('    return (rates[1:] <= rates[:-1]).all(axis=0)\n')
+
+
+
+### MASKS ---
+def test_rate():
+    constraints = rateConstraints([{'type': 'rate', 'interval': 0, 'min': 0.8, 'max': 4},
+        {'type': 'rate', 'interval': 2, 'max': 5}], 4)
+    assert constraints.mask(ages, dsps, rates).tolist() == [True, False, False, False, True]
+
+
+def test_ratio():
+    constraints = rateConstraints([{'type': 'ratio', 'interval': 0, 'max': 2}], 4)
+    assert constraints.mask(ages, dsps, rates).tolist() == [True, True, False, False, True]
+
+
+def test_custom(workDir):
+    '''
+    Custom functions given as callables, or by name from a module in the
+     working directory.
+    '''
+    writeCustomModule()
+    constraints = rateConstraints([{'type': 'custom', 'function': 'siteConstraints.slowingOnly'},
+        {'type': 'custom', 'function': lambda ages, dsps, rates: dsps[-1] > 5}], 4)
+    assert constraints.mask(ages, dsps, rates).tolist() == [False, False, True, False, True]
+    assert constraints.describe()[0] == 'custom: siteConstraints.slowingOnly'
+
+
+@pytest.mark.parametrize('constraint', [{'type': 'slip'}, {'type': 'rate', 'interval': 3, 'max': 1},
+    {'type': 'ratio', 'interval': 2, 'max': 1}, {'type': 'custom'}])
+def test_invalid(constraint):
+    with pytest.raises(SystemExit):
+        rateConstraints([constraint], 4)
+
+
+
+### DECLARATIONS ---
+def test_parse():
+    assert parseConstraints(None) == []
+    assert parseConstraints(['{type: rate, interval: 0, max: 4}', '{type: ratio, interval: 1, max: 3.5}']) == \
+        [{'type': 'rate', 'interval': 0, 'max': 4}, {'type': 'ratio', 'interval': 1, 'max': 3.5}]
+
+
+def test_load(workDir):
+    '''
+    Constraints under the key 'constraints' of the data file are loaded,
+     and are not taken for a marker.
+    '''
+    with open('DspAgeList.yaml', 'a') as dataFile:
+        dataFile.write('\nconstraints:\n')
+        dataFile.write('  - {type: rate, interval: 0, min: 0.5, max: 4.0}\n')
+        dataFile.write('  - {type: custom, function: siteConstraints.slowingOnly}\n')
+
+    assert loadConstraints('DspAgeList.yaml') == [{'type': 'rate', 'interval': 0, 'min': 0.5, 'max': 4.0},
+        {'type': 'custom', 'function': 'siteConstraints.slowingOnly'}]
+    assert len(loadDspAgeInputs('DspAgeList.yaml')) == 3
+
+
+
+### WORKERS ---
+def test_pickle(workDir):
+    '''
+    Custom functions named by string are imported again when unpickled.
+    '''
+    writeCustomModule()
+    constraints = rateConstraints([{'type': 'rate', 'interval': 0, 'max': 4},
+        {'type': 'custom', 'function': 'siteConstraints.slowingOnly'}], 4)
+    unpickled = pickle.loads(pickle.dumps(constraints))
+
+    assert len(unpickled.functions) == 1
+    assert np.array_equal(unpickled.mask(ages, dsps, rates), constraints.mask(ages, dsps, rates))
+
+
+def test_parallel(DspAgeData):
+    '''
+    Every pick of a parallel run satisfies a custom constraint sent to the
+     workers by name.
+    '''
+    writeCustomModule()
+    constraints = rateConstraints([{'type': 'custom', 'function': 'siteConstraints.slowingOnly'}], 3)
+    AgePicks, DspPicks, RatePicks = parallelResample(DspAgeData, 1000, 2, maxRate=10., seedValue=15,
+        settings=samplerSettings(blockSize=500, constraints=constraints))
+
+    assert RatePicks.shape == (2, 1000)
+    assert np.all(RatePicks[1] <= RatePicks[0])
@@ -0,0 +1,273 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of the sampling engines: every pick satisfies the standard
+ condition and max rate, and results are reproducible for a given seed.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import numpy as np
+import pytest
+from MCresampling import MCMCresample, samplerSettings, randomGenerator, parallelResample, SISresample, \
+    GibbsResample, findMarkerBlocks, blockwiseResample, feasibleWindows, batchMeansError, pilotRun
+from slipRateComputation import computeIncrRates
+
+
+### CHECKS ---
+maxRate = 10.
+
+def checkPicks(AgePicks, DspPicks, RatePicks, Nsamples):
+    '''
+    Check the shapes of the picks, and that every history has positive age
+     and displacement differences and rates below the max rate.
+    '''
+    assert AgePicks.shape == DspPicks.shape == (3, Nsamples)
+    assert RatePicks.shape == (2, Nsamples)
+    assert np.all(np.diff(AgePicks, axis=0) >= 0)
+    assert np.all(np.diff(DspPicks, axis=0) >= 0)
+    assert np.all(RatePicks <= maxRate)
+    assert np.allclose(RatePicks, np.diff(DspPicks, axis=0)/np.diff(AgePicks, axis=0))
+
+
+
+### REJECTION SAMPLING ---
+@pytest.mark.parametrize('options', [{}, {'blockSize': 500}, {'blockSize': 500, 'prune': True},
+    {'sampler': 'sobol'}, {'blockSize': 500, 'sampler': 'lhs'}])
+def test_rejection(DspAgeData, options):
+    picks = MCMCresample(DspAgeData, 2000, maxRate=maxRate, bound=10**6, seedValue=1,
+        settings=samplerSettings(**options))
+    checkPicks(*picks, 2000)
+
+
+@pytest.mark.parametrize('options', [{}, {'blockSize': 500}, {'sampler': 'sobol'},
+    {'blockSize': 500, 'sampler': 'lhs'}])
+def test_rejection_seeded(DspAgeData, options):
+    '''
+    Picks depend only on the seed.
+    '''
+    picks = [MCMCresample(DspAgeData, 1000, maxRate=maxRate, seedValue=seed, settings=samplerSettings(**options))
+        for seed in [2, 2, 3]]
+    assert all([np.array_equal(a, b) for a, b in zip(picks[0], picks[1])])
+    assert not np.array_equal(picks[0][0], picks[2][0])
+
+
+def test_rejection_rng(DspAgeData):
+    '''
+    A generator created with randomGenerator is equivalent to the seed.
+    '''
+    picks = MCMCresample(DspAgeData, 1000, maxRate=maxRate, seedValue=4)
+    rngPicks = MCMCresample(DspAgeData, 1000, maxRate=maxRate, seedValue=4, rng=randomGenerator(4))
+    assert all([np.array_equal(a, b) for a, b in zip(picks, rngPicks)])
+
+
+def test_no_global_state(DspAgeData):
+    '''
+    Picks do not depend on the state of the legacy global generator.
+    '''
+    picks = []
+    for globalSeed in [0, 1]:
+        np.random.seed(globalSeed)
+        picks.append(MCMCresample(DspAgeData, 1000, maxRate=maxRate, seedValue=4))
+    assert all([np.array_equal(a, b) for a, b in zip(picks[0], picks[1])])
+
+
+def test_settings():
+    '''
+    Copies replace only the given options; unknown options are refused.
+    '''
+    settings = samplerSettings(blockSize=500, prune=True)
+    copied = settings.copy(tolerance=0.1)
+    assert (copied.blockSize, copied.prune, copied.tolerance) == (500, True, 0.1)
+    assert settings.tolerance is None
+
+    with pytest.raises(SystemExit):
+        samplerSettings(blocksize=500)
+
+
+### CONVERGENCE ---
+@pytest.mark.parametrize('options', [{}, {'blockSize': 500}])
+def test_tolerance(DspAgeData, options):
+    '''
+    Sampling stops before Nsamples once the batch means error of the
+     percentiles is within the tolerance.
+    '''
+    picks = MCMCresample(DspAgeData, 10**5, maxRate=maxRate, bound=10**7, seedValue=9,
+        settings=samplerSettings(tolerance=0.05, **options))
+    Npicks = picks[2].shape[1]
+    assert 1000 <= Npicks < 10**5
+    checkPicks(*picks, Npicks)
+    assert batchMeansError(picks[2]).max() <= 0.1
+
+
+@pytest.mark.parametrize('Npicks', [3, 10, 19, 40])
+def test_batch_means_small(Npicks):
+    '''
+    Fewer batches are used with fewer than 2 x nBatches picks, and no error
+     is estimated from fewer than four picks.
+    '''
+    RatePicks = np.random.default_rng(0).random((2, Npicks))
+    MCerror = batchMeansError(RatePicks)
+    if Npicks < 4:
+        assert MCerror is None
+    else:
+        assert MCerror.shape == (3, 2)
+        assert np.all(np.isfinite(MCerror))
+
+
+def test_tolerance_bound(runArgs):
+    '''
+    The error is reported for a run stopped by the bound with few picks.
+    '''
+    computeIncrRates('MCMC', runArgs('-n', '1000', '-b', '10', '--mc-tolerance', '0.01', '--max-rate', '10'))
+    with open('Out_Slip_Rate_Report.txt', 'r') as reportFile:
+        report = reportFile.read()
+    assert 'Monte Carlo standard error' in report
+
+
+### TIME BUDGET ---
+@pytest.mark.parametrize('options', [[], ['--block-size', '500']])
+def test_time_budget(runArgs, options):
+    '''
+    A run stopped by the time budget keeps consistent picks, and reports the
+     picks achieved.
+    '''
+    computeIncrRates('MCMC', runArgs('-n', '1000000', '-b', '10000000', '--max-rate', '10',
+        '--time-budget', '0.1', *options))
+
+    picks = np.load('Out_Picks.npz')
+    Npicks = picks['RatePicks'].shape[1]
+    assert 0 < Npicks < 10**6
+    checkPicks(picks['AgePicks'], picks['DspPicks'], picks['RatePicks'], Npicks)
+    with open('Out_Slip_Rate_Report.txt', 'r') as reportFile:
+        assert 'Time-budgeted sampling (0.1 s budget): {:d} picks'.format(Npicks) in reportFile.read()
+
+
+### PILOT RUN ---
+@pytest.mark.parametrize('options', [{}, {'blockSize': 500}, {'prune': True}, {'sampler': 'sobol'}])
+def test_pilot(DspAgeData, options, capsys):
+    '''
+    Every pilot candidate is accepted or rejected for one reason, and Sobol'
+     pilots are drawn in a power of 2 without warning.
+    '''
+    pilot = pilotRun(DspAgeData, 1000, maxRate=1.5, pilotSize=3000, seedValue=10,
+        settings=samplerSettings(**options))
+    fractions = [pilot[name] for name in ['acceptanceRate', 'orderingRejectRate', 'maxRateRejectRate',
+        'constraintRejectRate']]
+
+    assert np.isclose(sum(fractions), 1)
+    assert 0 < pilot['acceptanceRate'] < 1 and pilot['maxRateRejectRate'] > 0
+    assert pilot['candidatesPerSecond'] > 0
+    assert pilot['nCandidates'] == (4096 if options.get('sampler') == 'sobol' else 3000)
+    assert 'WARNING' not in capsys.readouterr().out
+
+
+def test_pilot_stream(runArgs):
+    '''
+    The pilot run does not change the picks of the full run.
+    '''
+    picks = []
+    for pilot in [False, True]:
+        args = runArgs('-n', '1000', '--max-rate', '10', '--seed', '11')
+        args.pilot = pilot
+        computeIncrRates('MCMC', args)
+        picks.append(np.load('Out_Picks.npz'))
+        with open('Out_Slip_Rate_Report.txt', 'r') as reportFile:
+            assert ('Pilot run of' in reportFile.read()) == pilot
+    for name in ['AgePicks', 'DspPicks', 'RatePicks']:
+        assert np.array_equal(picks[0][name], picks[1][name])
+
+
+
+### PARALLEL SAMPLING ---
+def test_parallel(DspAgeData):
+    '''
+    Parallel picks are valid, and reproducible for a given seed and number
+     of workers.
+    '''
+    settings = samplerSettings(blockSize=500)
+    picks = [parallelResample(DspAgeData, 2001, 2, maxRate=maxRate, seedValue=5, settings=settings)
+        for k in range(2)]
+    checkPicks(*picks[0], 2001)
+    assert all([np.array_equal(a, b) for a, b in zip(picks[0], picks[1])])
+
+
+
+### BLOCK DECOMPOSITION ---
+def test_blockwise(DspAgeData):
+    '''
+    Markers sampled by independent blocks are stitched into valid histories.
+    '''
+    blocks = findMarkerBlocks(DspAgeData, maxRate=maxRate)
+    picks = [blockwiseResample(DspAgeData, 2000, blocks, maxRate=maxRate, seedValue=6,
+        settings=samplerSettings(blockSize=500)) for k in range(2)]
+    assert sum([len(block) for block in blocks]) == 3
+    assert all([np.array_equal(a, b) for a, b in zip(picks[0], picks[1])])
+    AgePicks, DspPicks, RatePicks = picks[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        assert np.allclose(RatePicks, np.diff(DspPicks, axis=0)/np.diff(AgePicks, axis=0))
+
+
+def test_blockwise_options(runArgs):
+    '''
+    The convergence tolerance, which concerns the rates between blocks, is
+     refused with block decomposition.
+    '''
+    with pytest.raises(SystemExit):
+        computeIncrRates('MCMC', runArgs('-n', '1000', '--decompose', '--mc-tolerance', '0.01'))
+
+
+def test_blockwise_budget(DspAgeData):
+    '''
+    Blocks sampled within a time budget are trimmed to the same number of
+     picks, here those of the rejection-sampled block.
+    '''
+    names = list(DspAgeData.keys())
+    blocks = [names[:2], names[2:]]
+    picks = blockwiseResample(DspAgeData, 10**6, blocks, maxRate=maxRate, bound=10**7, seedValue=6,
+        settings=samplerSettings(blockSize=500, timeBudget=1E-6))
+    Npicks = picks[0].shape[1]
+    assert Npicks < 10**6
+    assert picks[0].shape == picks[1].shape == (3, Npicks)
+    assert picks[2].shape == (2, Npicks)
+
+
+### SEQUENTIAL IMPORTANCE SAMPLING ---
+def test_sequential(DspAgeData):
+    picks = [SISresample(DspAgeData, 2000, maxRate=maxRate, seedValue=7) for k in range(2)]
+    checkPicks(*picks[0], 2000)
+    assert all([np.array_equal(a, b) for a, b in zip(picks[0], picks[1])])
+
+
+### GIBBS SAMPLING ---
+def test_gibbs(DspAgeData):
+    picks = [GibbsResample(DspAgeData, 2000, maxRate=maxRate, Nchains=4, burnIn=100, seedValue=8)
+        for k in range(2)]
+    checkPicks(*picks[0], 2000)
+    assert all([np.array_equal(a, b) for a, b in zip(picks[0], picks[1])])
+
+
+### FEASIBLE SUPPORT PRUNING ---
+def test_prune_windows(DspAgeData):
+    '''
+    Every pick of an unpruned run lies within the feasible windows.
+    '''
+    ageWindows, dspWindows = feasibleWindows(DspAgeData, maxRate)
+    AgePicks, DspPicks, _ = MCMCresample(DspAgeData, 2000, maxRate=maxRate, seedValue=1)
+    for j, datumName in enumerate(DspAgeData.keys()):
+        ageLevels = DspAgeData[datumName]['Age'].CDF(AgePicks[j])
+        dspLevels = DspAgeData[datumName]['Dsp'].CDF(DspPicks[j])
+        assert np.all((ageLevels >= ageWindows[j,0]-1E-9) & (ageLevels <= ageWindows[j,1]+1E-9))
+        assert np.all((dspLevels >= dspWindows[j,0]-1E-9) & (dspLevels <= dspWindows[j,1]+1E-9))
+
+
+def test_prune_posterior(DspAgeData):
+    '''
+    Pruning does not change the posterior: median rates agree within the
+     Monte Carlo error.
+    '''
+    settings = samplerSettings(blockSize=1000)
+    _, _, RatePicks = MCMCresample(DspAgeData, 10000, maxRate=maxRate, seedValue=1, settings=settings)
+    _, _, prunedPicks = MCMCresample(DspAgeData, 10000, maxRate=maxRate, seedValue=1,
+        settings=settings.copy(prune=True))
+    assert np.allclose(np.median(RatePicks, axis=1), np.median(prunedPicks, axis=1), rtol=0.05)
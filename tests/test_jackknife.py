@@ -0,0 +1,67 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of the jackknife (leave-one-marker-out) analysis: each
+ variant is a valid sample of the data set without the dropped marker, and
+ variants without feasible histories are reported without stopping the
+ analysis.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import numpy as np
+from MCresampling import MCMCresample, samplerSettings
+from jackknife import jackknifeResample, variantData
+from slipRateComputation import computeIncrRates
+
+
+### SAMPLING ---
+maxRate = 3.
+
+def test_leave_one_out(DspAgeData):
+    '''
+    The full data set is sampled as by MCMCresample in block mode, and each
+     variant agrees with a direct MCMCresample of the data set without the
+     dropped marker.
+    '''
+    results = jackknifeResample(DspAgeData, 5000, maxRate=maxRate, bound=10**6, blockSize=500, seedValue=3)
+    settings = samplerSettings(blockSize=500)
+
+    assert [result['dropped'] for result in results] == [None]+list(DspAgeData.keys())
+    directPicks = MCMCresample(DspAgeData, 5000, maxRate=maxRate, bound=10**6, seedValue=3, settings=settings)
+    for name, picks in zip(['AgePicks', 'DspPicks', 'RatePicks'], directPicks):
+        assert np.array_equal(results[0][name], picks)
+
+    for result in results[1:]:
+        AgePicks, DspPicks, RatePicks = MCMCresample(variantData(DspAgeData, result['dropped']), 20000,
+            maxRate=maxRate, bound=10**7, seedValue=4, settings=settings)
+
+        assert result['AgePicks'].shape == result['DspPicks'].shape == (2, 5000)
+        assert np.all(np.diff(result['AgePicks'], axis=0) >= 0)
+        assert np.all(np.diff(result['DspPicks'], axis=0) >= 0)
+        assert np.all(result['RatePicks'] <= maxRate)
+        assert np.allclose(np.percentile(result['RatePicks'], [16, 50, 84], axis=1),
+            np.percentile(RatePicks, [16, 50, 84], axis=1), rtol=0.05)
+
+
+def test_infeasible(workDir, runArgs):
+    '''
+    A full data set without feasible histories, and its infeasible variants,
+     are listed in the report, while the feasible variants are analyzed.
+    '''
+    # T1/T2 is older and more offset than T2/T3
+    with open('Swapped.yaml', 'w') as dataFile:
+        dataFile.write('T3/T4 riser: {"ageFile": "T3T4age.txt", "dspFile": "T3T4dsp.txt"}\n')
+        dataFile.write('T1/T2 riser: {"ageFile": "T1T2age.txt", "dspFile": "T1T2dsp.txt"}\n')
+        dataFile.write('T2/T3 riser: {"ageFile": "T2T3age.txt", "dspFile": "T2T3dsp.txt"}\n')
+
+    args = runArgs('-n', '1000', '--block-size', '500', '--max-rate', '10', '--jackknife')
+    args.dataFile = 'Swapped.yaml'
+    assert computeIncrRates('MCMC', args) is None
+
+    with open('Out_Jackknife_Report.txt', 'r') as reportFile:
+        report = reportFile.read()
+    assert 'None\tno feasible histories' in report
+    assert 'T3/T4 riser\tno feasible histories' in report
+    assert 'T1/T2 riser\tT3/T4 riser-T2/T3 riser' in report
+    assert 'T2/T3 riser\tT3/T4 riser-T1/T2 riser' in report
@@ -0,0 +1,80 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of candidate pools: re-filtering a pool for a max rate gives
+ the picks of a direct run with that max rate, and pools sampled from
+ different inputs are refused.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import numpy as np
+import pytest
+from MCresampling import MCMCresample, samplerSettings, savePool, loadPool, filterPool
+
+
+### POOL FILTERING ---
+settings = samplerSettings(blockSize=500)
+
+def samplePool(DspAgeData, Nsamples=4000):
+    '''
+    Pool of candidates satisfying the standard condition only.
+    '''
+    AgePicks, DspPicks, _ = MCMCresample(DspAgeData, Nsamples, maxRate=None, seedValue=9, settings=settings)
+
+    return AgePicks, DspPicks
+
+
+@pytest.mark.parametrize('maxRate', [1.5, 3.])
+def test_filter(DspAgeData, maxRate):
+    '''
+    Filtered candidates are those a direct run with the same stream accepts.
+    '''
+    AgePicks, DspPicks, RatePicks = filterPool(*samplePool(DspAgeData), maxRate=maxRate, chunkSize=700)
+    nPicks = RatePicks.shape[1]
+    assert 0 < nPicks < 4000
+    assert np.all(RatePicks <= maxRate)
+
+    direct = MCMCresample(DspAgeData, nPicks, maxRate=maxRate, bound=10**6, seedValue=9, settings=settings)
+    assert all([np.array_equal(a, b) for a, b in zip(direct, [AgePicks, DspPicks, RatePicks])])
+
+
+def test_refilter(DspAgeData):
+    '''
+    Filtering a filtered pool for a stricter max rate is the same as
+     filtering the pool once.
+    '''
+    pool = samplePool(DspAgeData)
+    once = filterPool(*pool, maxRate=1.5)
+    twice = filterPool(*filterPool(*pool, maxRate=3.)[:2], maxRate=1.5)
+    assert all([np.array_equal(a, b) for a, b in zip(once, twice)])
+
+
+
+### POOL FILES ---
+def test_load(DspAgeData):
+    pool = samplePool(DspAgeData)
+    savePool('Out', DspAgeData, *pool, dataFile='DspAgeList.yaml')
+
+    loaded = loadPool('Out_Pool.npz', DspAgeData, dataFile='DspAgeList.yaml')
+    assert all([np.array_equal(a, b) for a, b in zip(pool, loaded)])
+
+
+def test_load_edited_inputs(DspAgeData):
+    '''
+    A pool is refused once one of its PDF files is edited.
+    '''
+    savePool('Out', DspAgeData, *samplePool(DspAgeData), dataFile='DspAgeList.yaml')
+
+    with open('T2T3age.txt', 'a') as pdfFile:
+        pdfFile.write('\n')
+    with pytest.raises(SystemExit):
+        loadPool('Out_Pool.npz', DspAgeData, dataFile='DspAgeList.yaml')
+
+
+def test_load_other_markers(DspAgeData):
+    savePool('Out', DspAgeData, *samplePool(DspAgeData), dataFile='DspAgeList.yaml')
+
+    markers = list(DspAgeData.keys())
+    with pytest.raises(SystemExit):
+        loadPool('Out_Pool.npz', {name: DspAgeData[name] for name in markers[:2]})
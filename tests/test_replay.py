@@ -0,0 +1,50 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of seed replay: the picks regenerated from the replay log of
+ a run are those of the run, all of them or any subset, in the order
+ requested.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import numpy as np
+import pytest
+from MCresampling import MCMCresample, samplerSettings, replayLog, regeneratePicks
+from slipRateComputation import computeIncrRates
+
+
+### REGENERATION ---
+@pytest.mark.parametrize('options', [{}, {'blockSize': 500}, {'blockSize': 500, 'prune': True}])
+def test_round_trip(DspAgeData, options):
+    '''
+    All picks, then picks [5, 2999, 0], are regenerated from a log of several
+     segments, one candidate at a time or in block mode.
+    '''
+    settings = samplerSettings(**options)
+    replay = replayLog(DspAgeData.keys(), maxRate=3., prune=settings.prune, segmentSize=1000)
+    picks = MCMCresample(DspAgeData, 3000, maxRate=3., bound=10**6, seedValue=16, settings=settings,
+        replay=replay)
+    replay.save('Out')
+
+    assert len(replay.segments) > 1
+    for requested in [None, [5, 2999, 0]]:
+        regenerated = regeneratePicks('Out_Replay.pkl', DspAgeData, picks=requested)
+        columns = slice(None) if requested is None else requested
+        assert all([np.array_equal(a[:,columns], b) for a, b in zip(picks, regenerated)])
+
+
+def test_run(runArgs):
+    '''
+    Picks of a run with --seed-replay are regenerated from the markers of
+     its data file.
+    '''
+    computeIncrRates('MCMC', runArgs('-n', '3000', '--max-rate', '10', '--seed', '17'))
+    picks = dict(np.load('Out_Picks.npz'))
+
+    computeIncrRates('MCMC', runArgs('-n', '3000', '--max-rate', '10', '--seed', '17', '--seed-replay'))
+    AgePicks, DspPicks, RatePicks = regeneratePicks('Out_Replay.pkl', picks=[5, 2999, 0])
+
+    assert np.array_equal(AgePicks, picks['AgePicks'][:,[5, 2999, 0]])
+    assert np.array_equal(DspPicks, picks['DspPicks'][:,[5, 2999, 0]])
+    assert np.array_equal(RatePicks, picks['RatePicks'][:,[5, 2999, 0]])
@@ -0,0 +1,77 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of the pick reservoir: every position of the stream of picks
+ is kept with the same probability, whether the picks are offered in
+ batches or the reservoirs of disjoint streams are merged.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import numpy as np
+from scipy.stats import chi2
+from pickStore import pickReservoir
+
+
+### INCLUSION FREQUENCIES ---
+nPicks = 100  # length of the stream
+size = 10  # size of the reservoir
+nTrials = 4000
+
+def uniformityPvalue(kept):
+    '''
+    Chi-square test that each of the nPicks positions is kept in size/nPicks
+     of the trials, given the positions kept in each trial.
+    '''
+    counts = np.bincount(np.concatenate(kept).astype(int), minlength=nPicks)
+    p = size/nPicks
+    expected = nTrials*p
+    statistic = np.sum((counts-expected)**2)/(expected*(1-p))
+
+    return chi2.sf(statistic, nPicks-1)
+
+
+def test_algorithm_R():
+    '''
+    Picks offered in batches, part of which fill the reservoir.
+    '''
+    stream = np.arange(nPicks)[np.newaxis,:].astype(float)
+    batches = [0, 7, 37, 63, 64, nPicks]
+
+    kept = []
+    for trial in range(nTrials):
+        reservoir = pickReservoir(1, size, seedValue=trial)
+        for start, stop in zip(batches[:-1], batches[1:]):
+            reservoir.update(stream[:,start:stop], stream[:,start:stop])
+        AgePicks, DspPicks = reservoir.picks()
+
+        assert AgePicks.shape == (1, size)
+        assert len(np.unique(AgePicks)) == size
+        kept.append(AgePicks[0])
+
+    assert uniformityPvalue(kept) > 0.001
+
+
+def test_merge():
+    '''
+    Reservoirs of streams of different lengths, one of which is not full,
+     merged by hypergeometric draws.
+    '''
+    stream = np.arange(nPicks)[np.newaxis,:].astype(float)
+    parts = [0, 6, 56, nPicks]
+
+    kept = []
+    for trial in range(nTrials):
+        reservoirs = []
+        for k, (start, stop) in enumerate(zip(parts[:-1], parts[1:])):
+            reservoirs.append(pickReservoir(1, size, seedValue=[trial, k]))
+            reservoirs[-1].update(stream[:,start:stop], stream[:,start:stop])
+        merged = pickReservoir(1, size, seedValue=trial)
+        merged.merge(reservoirs)
+        AgePicks, DspPicks = merged.picks()
+
+        assert merged.nSeen == nPicks
+        assert len(np.unique(AgePicks)) == size
+        kept.append(AgePicks[0])
+
+    assert uniformityPvalue(kept) > 0.001
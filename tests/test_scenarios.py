@@ -0,0 +1,116 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of scenario comparison: scenarios share common random
+ numbers, and infeasible scenarios are reported without stopping the
+ comparison.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import numpy as np
+import pytest
+from scenarios import loadScenarios, scenarioResample
+from slipRateComputation import computeIncrRates
+
+
+### SCENARIO FILES ---
+@pytest.fixture
+def scenarioFiles(workDir):
+    '''
+    Alternative correlations of the Simple Example: the T2/T3 riser dropped
+     (feasible), and the markers in reverse order (infeasible, since T1/T2
+     is older and more offset than T3/T4).
+    '''
+    with open('Dropped.yaml', 'w') as dataFile:
+        dataFile.write('T3/T4 riser: {"ageFile": "T3T4age.txt", "dspFile": "T3T4dsp.txt"}\n')
+        dataFile.write('T1/T2 riser: {"ageFile": "T1T2age.txt", "dspFile": "T1T2dsp.txt"}\n')
+    with open('Reversed.yaml', 'w') as dataFile:
+        dataFile.write('T1/T2 riser: {"ageFile": "T1T2age.txt", "dspFile": "T1T2dsp.txt"}\n')
+        dataFile.write('T3/T4 riser: {"ageFile": "T3T4age.txt", "dspFile": "T3T4dsp.txt"}\n')
+
+    return ['DspAgeList.yaml', 'Dropped.yaml', 'Reversed.yaml']
+
+
+
+### SAMPLING ---
+def test_common_random_numbers(scenarioFiles):
+    '''
+    A scenario repeated under another name gives the same picks, and a
+     scenario sharing PDF files is drawn from the same candidates.
+    '''
+    names, scenarios, constraints = loadScenarios(['DspAgeList.yaml', 'DspAgeList.yaml', 'Dropped.yaml'])
+    results = scenarioResample(scenarios, 1000, maxRate=10., blockSize=500, seedValue=10)
+
+    assert names == ['DspAgeList', 'DspAgeList1', 'Dropped']
+    for name in ['AgePicks', 'DspPicks', 'RatePicks']:
+        assert np.array_equal(results[0][name], results[1][name])
+
+    # Histories accepted in the full scenario are also accepted without the middle marker, up to the last
+    #  candidate accepted for the dropped scenario
+    inDropped = np.isin(results[0]['AgePicks'][0], results[2]['AgePicks'][0])
+    assert inDropped[0] == True
+    assert np.all(np.diff(inDropped.astype(int)) <= 0)
+
+
+def test_infeasible(scenarioFiles):
+    '''
+    A scenario whose markers cannot be ordered is not sampled, and returns
+     empty picks, while the other scenarios are filled.
+    '''
+    names, scenarios, constraints = loadScenarios(scenarioFiles)
+    results = scenarioResample(scenarios, 1000, maxRate=10., bound=10**6, blockSize=500, seedValue=11)
+
+    assert [result['RatePicks'].shape[1] for result in results] == [1000, 1000, 0]
+    assert results[2]['nCandidates'] == 0
+
+
+def writeGaussPDF(fname, mean, std):
+    '''
+    Write a Gaussian PDF, truncated at 5 standard deviations.
+    '''
+    x = np.linspace(mean-5*std, mean+5*std, 201)
+    np.savetxt(fname, np.column_stack([x, np.exp(-0.5*((x-mean)/std)**2)]), header='Value,\tProbability')
+
+
+def test_low_acceptance(scenarioFiles):
+    '''
+    A scenario with an acceptance rate of about 1E-5 is sampled until filled
+     or until the bound is reached, and is not reported as infeasible
+     because an easy scenario is filled first.
+    '''
+    # Overlapping ages, ordered with probability P(N(0, sqrt(2)) > 6), about 1.1E-5
+    writeGaussPDF('YoungAge.txt', 10., 1.); writeGaussPDF('YoungDsp.txt', 3., 0.5)
+    writeGaussPDF('OldAge.txt', 4., 1.); writeGaussPDF('OldDsp.txt', 10., 0.5)
+    with open('Hard.yaml', 'w') as dataFile:
+        dataFile.write('Young: {"ageFile": "YoungAge.txt", "dspFile": "YoungDsp.txt"}\n')
+        dataFile.write('Old: {"ageFile": "OldAge.txt", "dspFile": "OldDsp.txt"}\n')
+
+    names, scenarios, constraints = loadScenarios(['DspAgeList.yaml', 'Hard.yaml'])
+    results = scenarioResample(scenarios, 5, bound=2*10**6, blockSize=10**5, seedValue=13)
+
+    assert results[0]['RatePicks'].shape[1] == 5
+    assert results[0]['nCandidates'] < 100
+    assert results[1]['RatePicks'].shape[1] == 5
+    assert results[1]['nCandidates'] > 10**5
+    assert np.all(np.diff(results[1]['AgePicks'], axis=0) >= 0)
+
+
+### REPORTING ---
+@pytest.mark.parametrize('order', [[0, 1, 2], [2, 0, 1]])
+def test_report(scenarioFiles, runArgs, order):
+    '''
+    The scenario report is written whether the infeasible scenario is
+     compared or is the base scenario.
+    '''
+    args = runArgs('-n', '1000', '--block-size', '500', '--max-rate', '10')
+    args.dataFile = scenarioFiles[order[0]]
+    args.scenarios = [scenarioFiles[k] for k in order[1:]]
+
+    scenarioRates = computeIncrRates('MCMC', args)
+    assert scenarioRates[order.index(2)] is None
+
+    with open('Out_Scenario_Report.txt', 'r') as reportFile:
+        report = reportFile.read()
+    assert 'Reversed\tno feasible histories' in report
+    assert 'Dropped\tT3/T4 riser-T1/T2 riser' in report
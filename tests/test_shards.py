@@ -0,0 +1,80 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of sharded runs: the merged results concatenate the picks of
+ the shards in shard order, can be merged from any directory, and shards
+ of different runs or edited inputs are refused.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import numpy as np
+import pytest
+from slipRateComputation import computeIncrRates
+from shards import mergeShards
+
+
+### SHARD RUNS ---
+shardOptions = ['-n', '1000', '--block-size', '500', '--max-rate', '10', '--seed', '12']
+
+def runShards(runArgs, shards, nShards=2, options=[]):
+    '''
+    Run the given shards of a run, and return their result files.
+    '''
+    resultFiles = []
+    for shard in shards:
+        computeIncrRates('MCMC', runArgs('--shard', str(shard), '--shards', str(nShards), *shardOptions, *options))
+        resultFiles.append(os.path.abspath('Out_Shard{:d}_Result.pkl'.format(shard)))
+
+    return resultFiles
+
+
+def test_merge(runArgs, workDir, monkeypatch):
+    '''
+    Merged picks are the shard picks in shard order, merged from another
+     directory than that of the run.
+    '''
+    resultFiles = runShards(runArgs, [0, 1])
+    shardPicks = [np.load('Out_Shard{:d}_Picks.npz'.format(shard)) for shard in [0, 1]]
+
+    os.mkdir('Merge')
+    monkeypatch.chdir('Merge')
+    args, results, missing = mergeShards(resultFiles[::-1])
+
+    assert missing == []
+    assert results['Counters']['picks'] == 1000
+    assert args.dataFile == os.path.join(str(workDir), 'DspAgeList.yaml')
+    for name in ['AgePicks', 'DspPicks', 'RatePicks']:
+        assert results[name].shape[1] == 1000
+        assert np.array_equal(results[name], np.concatenate([picks[name] for picks in shardPicks], axis=1))
+
+    # Shards draw from independent streams
+    assert not np.array_equal(shardPicks[0]['AgePicks'][:,:100], shardPicks[1]['AgePicks'][:,:100])
+
+
+def test_missing_shard(runArgs):
+    resultFiles = runShards(runArgs, [1])
+    args, results, missing = mergeShards(resultFiles)
+
+    assert missing == [0]
+    assert results['RatePicks'].shape[1] == 500
+
+
+def test_edited_inputs(runArgs):
+    resultFiles = runShards(runArgs, [0, 1])
+    with open('T1T2dsp.txt', 'a') as pdfFile:
+        pdfFile.write('\n')
+
+    with pytest.raises(SystemExit):
+        mergeShards(resultFiles)
+
+
+def test_other_run(runArgs):
+    '''
+    Shards run with different settings are not merged.
+    '''
+    resultFiles = runShards(runArgs, [0])+runShards(runArgs, [1], options=['--max-rate', '5'])
+
+    with pytest.raises(SystemExit):
+        mergeShards(resultFiles)
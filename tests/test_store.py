@@ -0,0 +1,71 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of the picks kept: only the kinds of picks requested are
+ saved, in memory or in the pick store, and single-precision picks agree
+ with double-precision picks within float32 rounding.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import os
+import numpy as np
+import pytest
+from samplingEngines import parseKeep
+from pickStore import pickStore, streamPercentiles
+from slipRateComputation import computeIncrRates
+
+
+### KINDS OF PICKS ---
+def test_parse_keep():
+    assert parseKeep('ages,dsps,rates') == ['Age', 'Dsp', 'Rate']
+    assert parseKeep(' Rates, ages ,') == ['Rate', 'Age']
+    assert parseKeep('') == []
+
+    with pytest.raises(SystemExit):
+        parseKeep('ages,slips')
+
+
+
+### SINGLE PRECISION ---
+storeOptions = ['-n', '3000', '--max-rate', '10', '--seed', '14']
+percentiles = [15.865, 50, 84.135]
+
+def test_float32(runArgs):
+    '''
+    Picks kept in memory are saved as float32, without the kinds dropped.
+    '''
+    computeIncrRates('MCMC', runArgs(*storeOptions))
+    fullPicks = np.load('Out_Picks.npz')['RatePicks']
+
+    computeIncrRates('MCMC', runArgs(*storeOptions, '--keep', 'rates', '--float32'))
+    picks = np.load('Out_Picks.npz')
+
+    assert list(picks.keys()) == ['RatePicks']
+    assert picks['RatePicks'].dtype == np.float32
+    assert np.allclose(picks['RatePicks'], fullPicks, rtol=1E-6, atol=0)
+
+
+def test_float32_store(runArgs):
+    '''
+    Picks written to the pick store are float32 on disk, only the kinds kept
+     are written, and their percentiles agree with those of float64 picks.
+    '''
+    computeIncrRates('MCMC', runArgs(*storeOptions))
+    fullPicks = np.load('Out_Picks.npz')['RatePicks']
+
+    computeIncrRates('MCMC', runArgs(*storeOptions, '--pick-store', '--chunk-size', '700',
+        '--keep', 'dsps,rates', '--float32'))
+    store = pickStore('Out')
+
+    assert store.kinds == ['Dsp', 'Rate'] and store.dtype == 'float32'
+    assert store.view('Age') is None
+    assert not any(['Age' in fname for fname in os.listdir(store.dirName)])
+    for chunk in store.index['chunks']:
+        assert np.load(os.path.join(store.dirName, chunk['files']['Rate'])).dtype == np.float32
+
+    RatePicks = store.view('Rate')
+    assert RatePicks.shape == fullPicks.shape
+    for i in range(RatePicks.shape[0]):
+        pct = streamPercentiles(RatePicks.rowChunks(i), *RatePicks.range(i), percentiles)
+        assert np.allclose(pct, np.percentile(fullPicks[i], percentiles), rtol=1E-6, atol=0)
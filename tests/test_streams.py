@@ -0,0 +1,75 @@
+'''
+** RISeR Incremental Slip Rate Calculator **
+Behavior tests of the chunked statistics of stored picks: percentiles and
+ PDFs computed from values read chunk by chunk agree with those computed
+ from the full array in memory.
+
+Rob Zinke 2019-2021
+'''
+
+### IMPORT MODULES ---
+import numpy as np
+import pytest
+from pickStore import streamPercentiles
+from array2pdf import arrayHist, arrayKDE, streamHist, streamKDE
+
+
+### VALUES ---
+values = np.random.default_rng(0).lognormal(0.3, 0.4, 20000)
+percentiles = [0, 2.5, 15.865, 50, 84.135, 97.5, 100]
+
+def chunksOf(V, chunkSize):
+    '''
+    Function returning an iterator over chunks of V, as storedPicks.rowChunks.
+    '''
+    return lambda: (V[start:start+chunkSize] for start in range(0, len(V), chunkSize))
+
+
+
+### PERCENTILES ---
+@pytest.mark.parametrize('chunkSize', [1000, 3333, 20000])
+def test_percentiles(chunkSize):
+    pct = streamPercentiles(chunksOf(values, chunkSize), values.min(), values.max(), percentiles)
+    assert np.allclose(pct, np.percentile(values, percentiles), rtol=1E-12, atol=0)
+
+
+def test_percentiles_ties():
+    '''
+    Repeated values, e.g., of float32 picks, fall in the same bins.
+    '''
+    V = np.round(values, 1)
+    pct = streamPercentiles(chunksOf(V, 1000), V.min(), V.max(), percentiles)
+    assert np.allclose(pct, np.percentile(V, percentiles), rtol=1E-12, atol=0)
+
+
+def test_percentiles_non_finite():
+    '''
+    Non-finite values are dropped, also from the given range.
+    '''
+    V = values.copy()
+    V[[10, 5000, 12345]] = [np.inf, np.nan, -np.inf]
+    pct = streamPercentiles(chunksOf(V, 1000), np.nanmin(V), np.nanmax(V), percentiles)
+    assert np.allclose(pct, np.percentile(V[np.isfinite(V)], percentiles), rtol=1E-12, atol=0)
+
+
+
+### PDFS ---
+@pytest.mark.parametrize('smoothingKernel', [None, 'gauss'])
+def test_hist(smoothingKernel):
+    x, px = arrayHist(values, 0.01, smoothingKernel=smoothingKernel)
+    xStream, pxStream = streamHist(chunksOf(values, 3333), values.min(), values.max(), 0.01,
+        smoothingKernel=smoothingKernel)
+
+    assert np.allclose(x, xStream)
+    assert np.allclose(px, pxStream)
+
+
+def test_kde():
+    '''
+    The binned KDE agrees with gaussian_kde within the binning error.
+    '''
+    x, px = arrayKDE(values, 0.01)
+    xStream, pxStream = streamKDE(chunksOf(values, 3333), values.min(), values.max(), 0.01)
+
+    assert np.allclose(x, xStream)
+    assert np.abs(px-pxStream).max() < 0.005*px.max()